@@ -2,7 +2,7 @@ from datetime import datetime, timedelta
 from typing import Optional, Union
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from app.config import get_settings
@@ -62,7 +62,11 @@ def get_current_user(
     Get the current authenticated user from the JWT token.
     Returns either a Student or Employee object.
     """
-    token = credentials.credentials
+    return get_user_from_token(credentials.credentials, db)
+
+
+def get_user_from_token(token: str, db: Session) -> Union[Student, Employee]:
+    """Resolve a raw JWT to its Student or Employee."""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -130,6 +134,21 @@ def get_current_student(current_user: Union[Student, Employee] = Depends(get_cur
 
 def get_current_admin(current_user: Union[Student, Employee] = Depends(get_current_user)) -> Employee:
     """Get current user and ensure it's an admin/warden."""
+    return ensure_admin(current_user)
+
+
+def get_current_admin_from_query(
+    token: str = Query(..., description="JWT access token"),
+    db: Session = Depends(get_db)
+) -> Employee:
+    """
+    Admin/warden check for endpoints opened by the browser's EventSource,
+    which cannot send an Authorization header.
+    """
+    return ensure_admin(get_user_from_token(token, db))
+
+
+def ensure_admin(current_user: Union[Student, Employee]) -> Employee:
     if not isinstance(current_user, Employee) or current_user.role not in [UserRole.ADMIN, UserRole.WARDEN]:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -18,6 +18,45 @@ class Settings(BaseSettings):
     # QR Code Configuration
     QR_CODE_EXPIRY_MINUTES: int = 5
     QR_CODE_SIZE: int = 10
+    QR_CODE_VERSION: int = 3  # Fixed symbol size (29x29) that fits issued tokens; longer data falls back to best fit
+    QR_CODE_MASK_PATTERN: int = 0  # Fixed mask (0-7) instead of scoring all eight per render
+    QR_CACHE_MAX_ENTRIES: int = 4096  # Students whose current QR code is kept for reuse
+    QR_REAPER_INTERVAL_SECONDS: int = 300  # How often expired QR tokens are pruned; 0 disables the reaper
+    QR_REAPER_GRACE_SECONDS: int = 600  # Keep tokens this long after expiry before pruning; raised to GATE_BATCH_MAX_AGE_HOURS with offline uploads
+    QR_REAPER_BATCH_SIZE: int = 1000  # Rows per DELETE
+    QR_REAPER_MAX_BATCHES: int = 100  # DELETE batches per run; the rest waits for the next run
+    QR_PARTITION_DAYS_AHEAD: int = 3  # Daily QR_TOKENS partitions kept ready (partitioned tables only)
+    QR_TOKEN_MODE: str = "database"  # "database" (QR_TOKENS rows) or "signed" (stateless HMAC tokens)
+    QR_TOKEN_SECRET: str = ""  # Signing key for signed tokens; empty derives one from JWT_SECRET_KEY
+    QR_REPLAY_WINDOW_SECONDS: int = 60  # A signed token scanned again within this window is rejected
+    SCAN_GROUP_COMMIT_MAX: int = 256  # Live scans written per group commit; 1 commits every scan on its own
+    SCAN_COMMIT_TIMEOUT_SECONDS: float = 10.0  # How long a scan request waits for its commit
+    GATE_OFFLINE_UPLOADS: bool = False  # Accept offline scanner uploads on /attendance/scan-batch (admin/warden login)
+    GATE_BATCH_MAX_AGE_HOURS: int = 72  # Offline scans older than this are rejected
+    GATE_CLOCK_SKEW_SECONDS: int = 120  # Tolerance for terminal clocks when checking scan times
+    
+    # Face Recognition Configuration
+    FACE_WORKERS: int = 2  # Processes used for decode/encode
+    FACE_MAX_PENDING: int = 8  # Requests allowed in flight before returning 429
+    FACE_TASK_TIMEOUT_SECONDS: float = 10.0
+    FACE_INDEX_MODE: str = "exact"  # "exact" or "ivf" (approximate, for large galleries)
+    FACE_INDEX_PATH: str = "data/face_index.npz"  # Persisted index; empty string disables
+    FACE_INDEX_REFRESH_SECONDS: float = 5.0  # How often a worker checks STUDENT_FACES for faces added by other workers
+    FACE_IVF_MIN_SIZE: int = 5000  # Smaller galleries are always searched exactly
+    FACE_IVF_NLIST: int = 0  # Number of IVF buckets; 0 means sqrt(gallery size)
+    FACE_IVF_NPROBE: int = 8  # Buckets scanned per query (higher = better recall, slower)
+    FACE_ANN_TOP_K: int = 32  # Candidates re-ranked with exact distances
+    FACE_ANN_PROJECTION_DIM: int = 32
+    
+    # Dashboard Configuration
+    DASHBOARD_CACHE_TTL_SECONDS: float = 5.0  # Shared snapshot lifetime; writes invalidate it early
+    
+    # Room picker occupancy map; 0 disables it and reads the database every time
+    ROOM_OCCUPANCY_CACHE_TTL_SECONDS: float = 60.0
+    
+    # Analytics Cache Configuration
+    ANALYTICS_CACHE_TTL_SECONDS: int = 300  # Default lifetime of a cached analytics result
+    ANALYTICS_CACHE_MAX_ENTRIES: int = 256  # In-process LRU tier in front of ANALYTICS_CACHE
     
     # Application Settings
     APP_NAME: str = "SmartHostel"
@@ -1,4 +1,5 @@
-from sqlalchemy import create_engine
+from functools import lru_cache
+from sqlalchemy import create_engine, func
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.config import get_settings
@@ -30,3 +31,57 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+@lru_cache(maxsize=None)
+def _upsert_statement(table, dialect, update_columns, increment_columns, max_columns, conflict_columns):
+    # Built once per table/column set and executed with the rows as
+    # parameters, so SQLAlchemy compiles it once and reuses the cached SQL.
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(table)
+        new = stmt.inserted
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(table)
+        new = stmt.excluded
+
+    changes = {c: new[c] for c in update_columns}
+    changes.update({c: table.c[c] + new[c] for c in increment_columns})
+    # GREATEST()/max() return NULL if either side is NULL, so fall back to the other
+    greatest = func.greatest if dialect == "mysql" else func.max
+    changes.update({
+        c: greatest(func.coalesce(table.c[c], new[c]), func.coalesce(new[c], table.c[c]))
+        for c in max_columns
+    })
+
+    if dialect == "mysql":
+        return stmt.on_duplicate_key_update(**changes)
+    return stmt.on_conflict_do_update(
+        index_elements=conflict_columns or [c.name for c in table.primary_key.columns],
+        set_=changes
+    )
+
+
+def upsert(db, model, rows, update_columns=(), increment_columns=(), max_columns=(), conflict_columns=None):
+    """
+    Insert rows, or update the existing row on primary/unique key conflict,
+    in a single statement. update_columns take the new value;
+    increment_columns are added to the stored value; max_columns keep the
+    larger of the stored and new value (ignoring NULLs). conflict_columns names
+    the unique key to match on (default: the primary key); MySQL ignores it
+    and matches any unique key. Every row must have the same keys.
+    Supports MySQL (ON DUPLICATE KEY UPDATE) and SQLite (ON CONFLICT).
+    """
+    if not rows:
+        return
+
+    stmt = _upsert_statement(
+        model.__table__,
+        db.get_bind().dialect.name,
+        tuple(update_columns),
+        tuple(increment_columns),
+        tuple(max_columns),
+        tuple(conflict_columns) if conflict_columns else None
+    )
+    db.execute(stmt, list(rows))
@@ -1,11 +1,22 @@
-from fastapi import FastAPI
+import asyncio
+from fastapi import FastAPI, Depends, Request
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from app.config import get_settings
+from app.database import SessionLocal
+from app.services.face_index import face_index, histogram_index
+from app.services.face_pipeline import face_pipeline
+from app.services.qr_reaper import qr_reaper
+from app.services.scan_service import scan_committer
+from app.services.event_hub import event_hub
+from app.auth import get_current_admin_from_query
 from app.routes import auth, attendance, student, mess, admin, analytics, face_recognition
 
 settings = get_settings()
 
+EVENT_HEARTBEAT_SECONDS = 15
+
 # Create FastAPI application
 app = FastAPI(
     title=settings.APP_NAME,
@@ -22,6 +33,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Content-Disposition"],
 )
 
 # Include routers
@@ -58,6 +70,35 @@ def health_check():
     return {"status": "healthy", "timestamp": "2026-01-31T23:47:20"}
 
 
+@app.get("/events")
+async def live_events(request: Request, current_admin=Depends(get_current_admin_from_query)):
+    """
+    Server-sent events stream for admin dashboards.
+    Emits attendance, violation, opt_out, student and room_assignment
+    events as they are committed, plus "resync" when the client should
+    reload. Authenticate with ?token=<JWT> since EventSource cannot set headers.
+    """
+    queue = event_hub.subscribe()
+    
+    async def stream():
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    yield await asyncio.wait_for(queue.get(), timeout=EVENT_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    # Comment line keeps proxies from closing an idle connection
+                    yield ": keep-alive\n\n"
+        finally:
+            event_hub.unsubscribe(queue)
+    
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 # Startup event
 @app.on_event("startup")
 async def startup_event():
@@ -66,6 +107,22 @@ async def startup_event():
     print(f"📚 API Documentation: http://localhost:8000/docs")
     print(f"🔐 JWT Authentication enabled")
     print(f"📊 Database: {settings.DB_NAME}")
+    
+    # Preload face encodings so the first recognition doesn't pay for the table scan
+    db = SessionLocal()
+    try:
+        face_index.load(db)
+        histogram_index.load(db)
+        print(f"🙂 Face index loaded: {face_index.size} encodings, {histogram_index.size} histograms")
+    except Exception as e:
+        print(f"WARNING: Could not preload face index: {e}")
+    finally:
+        db.close()
+    
+    face_pipeline.start()
+    event_hub.start(asyncio.get_running_loop())
+    qr_reaper.start()
+    scan_committer.start()
 
 
 # Shutdown event
@@ -73,6 +130,10 @@ async def startup_event():
 async def shutdown_event():
     """Run on application shutdown."""
     print(f"👋 {settings.APP_NAME} is shutting down...")
+    face_pipeline.shutdown()
+    qr_reaper.shutdown()
+    scan_committer.shutdown()
+    face_index.save()
 
 
 if __name__ == "__main__":
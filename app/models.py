@@ -1,8 +1,8 @@
 from sqlalchemy import (
     Column, Integer, String, Boolean, Date, DateTime,
-    ForeignKey, Enum, Text, Float, JSON, LargeBinary, and_
+    ForeignKey, Enum, Text, Float, JSON, LargeBinary, Index, and_
 )
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy.sql import func
 from app.database import Base
 import enum
@@ -167,12 +167,54 @@ class Attendance(Base):
     remarks = Column(String(255))
     location = Column(String(50), default="Main Gate")
     verified_by = Column(String(11), ForeignKey("EMPLOYEES.ssn", ondelete="SET NULL"))
+    scan_key = Column(String(64))  # Offline gate scans: hash of (token, scan time), for idempotent uploads
+    
+    __table_args__ = (
+        # Matches schema.sql; serves per-student timestamp range filters
+        Index("idx_attendance_student_time", "student_id", "timestamp"),
+        # Daily listings filtered by IN/OUT; type alone has two values
+        Index("idx_attendance_type_time", "type", "timestamp"),
+        Index("idx_attendance_scan_key", "scan_key", unique=True),
+    )
     
     # Relationships
     student = relationship("Student", back_populates="attendance_records")
     verifier = relationship("Employee", back_populates="verified_attendance")
 
 
+class AttendanceStatus(Base):
+    """Current IN/OUT status per student, maintained on every attendance write."""
+    __tablename__ = "ATTENDANCE_STATUS"
+    
+    student_id = Column(Integer, ForeignKey("STUDENTS.student_id", ondelete="CASCADE"), primary_key=True)
+    status = Column(Enum(AttendanceType), nullable=False, index=True)
+    last_timestamp = Column(DateTime, nullable=False)
+    
+    # Relationships
+    student = relationship("Student")
+
+
+class AttendanceHourly(Base):
+    """IN/OUT counts per hour, maintained on every attendance write."""
+    __tablename__ = "ATTENDANCE_HOURLY"
+    
+    bucket = Column(DateTime, primary_key=True)  # Start of the hour
+    in_count = Column(Integer, nullable=False, default=0)
+    out_count = Column(Integer, nullable=False, default=0)
+
+
+class AttendanceDailyStudent(Base):
+    """Per-student IN/OUT counts per day; distinct students per day are counted from here."""
+    __tablename__ = "ATTENDANCE_DAILY_STUDENTS"
+    
+    day = Column(Date, primary_key=True)
+    student_id = Column(Integer, ForeignKey("STUDENTS.student_id", ondelete="CASCADE"), primary_key=True)
+    in_count = Column(Integer, nullable=False, default=0)
+    out_count = Column(Integer, nullable=False, default=0)
+    late_out_count = Column(Integer, nullable=False, default=0)  # OUTs at or after the curfew hour
+    last_late_out = Column(DateTime, nullable=True)  # Latest of those OUTs
+
+
 class MenuPool(Base):
     __tablename__ = "MENU_POOLS"
     
@@ -264,8 +306,10 @@ class StudentFace(Base):
     
     face_id = Column(Integer, primary_key=True, autoincrement=True)
     student_id = Column(Integer, ForeignKey("STUDENTS.student_id", ondelete="CASCADE"), nullable=False, index=True)
-    image_data = Column(LargeBinary(length=(2**24)-1), nullable=False) # MediumBlob equivalent
-    encoding = Column(JSON, nullable=True) # To store face encoding vector if we use a library
+    image_data = deferred(Column(LargeBinary(length=(2**24)-1), nullable=False)) # MediumBlob equivalent, loaded only on access
+    encoding = Column(JSON, nullable=True) # Legacy JSON encoding; superseded by encoding_vector
+    encoding_vector = Column(LargeBinary, nullable=True) # 128-d float32 face encoding (512 bytes)
+    histogram = Column(LargeBinary, nullable=True) # Normalized 8x8x8 colour histogram (float32) for the OpenCV fallback
     created_at = Column(DateTime, server_default=func.now())
     
     # Relationships
@@ -0,0 +1,112 @@
+import base64
+import json
+from datetime import datetime, date
+from typing import Optional, List, Sequence
+from fastapi import HTTPException, Query, Response, status
+from fastapi.responses import JSONResponse
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import and_, or_
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class PageParams:
+    """
+    Common query parameters for keyset-paginated listings:
+    ?limit=<page size>&cursor=<X-Next-Cursor from the previous page>&fields=a,b,c
+    """
+
+    def __init__(
+        self,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Page size"),
+        cursor: Optional[str] = Query(None, description="Value of X-Next-Cursor from the previous page"),
+        fields: Optional[str] = Query(None, description="Comma-separated fields to return")
+    ):
+        self.limit = limit
+        self.cursor = cursor
+        self.fields = {f.strip() for f in fields.split(",") if f.strip()} if fields else None
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    if isinstance(value, date):
+        return {"d": value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if "dt" in value:
+            return datetime.fromisoformat(value["dt"])
+        if "d" in value:
+            return date.fromisoformat(value["d"])
+    return value
+
+
+def encode_cursor(values: Sequence) -> str:
+    raw = json.dumps([_encode_value(v) for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = [_decode_value(v) for v in json.loads(raw)]
+    except (ValueError, TypeError):
+        values = None
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor"
+        )
+    return values
+
+
+def _after(columns: Sequence, values: Sequence, descending: bool):
+    """
+    Rows strictly after values in (columns) order, written as nested
+    OR/AND comparisons so MySQL can still range-scan the leading column.
+    """
+    column, value = columns[0], values[0]
+    beyond = column < value if descending else column > value
+    if len(columns) == 1:
+        return beyond
+    return or_(beyond, and_(column == value, _after(columns[1:], values[1:], descending)))
+
+
+def paginate(query, page: PageParams, key_columns: Sequence, descending: bool = False):
+    """
+    Apply keyset pagination to a query ordered by key_columns (which must
+    end in a unique column). Returns (rows, next_cursor); next_cursor is
+    None on the last page.
+    """
+    if page.cursor:
+        query = query.filter(_after(key_columns, decode_cursor(page.cursor, len(key_columns)), descending))
+
+    order = [c.desc() for c in key_columns] if descending else list(key_columns)
+    rows = query.order_by(*order).limit(page.limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > page.limit:
+        rows = rows[:page.limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, c.key) for c in key_columns])
+    return rows, next_cursor
+
+
+def page_response(response: Response, items: List, next_cursor: Optional[str], page: PageParams):
+    """
+    Return a page of response models, with the next cursor in the
+    X-Next-Cursor header. With ?fields=, only those fields are serialized.
+    """
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else {}
+    if page.fields:
+        return JSONResponse(
+            jsonable_encoder([item.model_dump(include=page.fields) for item in items]),
+            headers=headers
+        )
+    response.headers.update(headers)
+    return items
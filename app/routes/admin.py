@@ -1,20 +1,38 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
+from sqlalchemy.orm import Session, selectinload, joinedload
 from datetime import date, datetime
 from typing import List
 from app.database import get_db
 from app.models import Student, Employee, RoomAssignment, Room, Violation, AttendanceType
 from app.schemas import (
     StudentResponse, StudentCreate, RoomAssignmentCreate, RoomAssignmentResponse,
-    ViolationResponse, DashboardSummary, StudentRegistrationRequest, AvailableRoom
+    ViolationResponse, DashboardSummary, StudentRegistrationRequest, AvailableRoom,
+    BulkAllotmentRequest, BulkAllotmentResponse, RoomAllotment, QRReaperStats
 )
 from app.auth import get_current_admin, get_password_hash
-from app.services.attendance_service import detect_frequent_absence, get_students_by_status, detect_students_out_past_curfew
-from sqlalchemy import func, and_
+from app.services.attendance_service import detect_frequent_absence, detect_students_out_past_curfew, violation_event
+from app.services.event_hub import event_hub
+from app.services.qr_reaper import qr_reaper
+from app.services import dashboard_service, room_service
+from sqlalchemy import func, and_, or_
+from app.pagination import PageParams, paginate, page_response
 
 router = APIRouter(prefix="/admin", tags=["Admin/Warden"])
 
 
+def student_response_options():
+    """
+    Eager-load everything map_student_to_response touches: the active room
+    assignment with its room, and phone numbers. A listing then costs three
+    queries in total instead of several per student.
+    """
+    return (
+        selectinload(Student.room_assignments.and_(RoomAssignment.is_active == True))
+            .joinedload(RoomAssignment.room),
+        selectinload(Student.phone_numbers),
+    )
+
+
 def map_student_to_response(student):
     active_assignment = next((ra for ra in student.room_assignments if ra.is_active), None)
     room_no = active_assignment.room_no if active_assignment else None
@@ -46,24 +64,35 @@ def map_student_to_response(student):
 
 @router.get("/students", response_model=List[StudentResponse])
 def get_all_students(
+    response: Response,
     department: str = Query(None),
     year: int = Query(None),
+    search: str = Query(None, description="Match on name or roll number"),
+    page: PageParams = Depends(),
     current_admin: Employee = Depends(get_current_admin),
     db: Session = Depends(get_db)
 ):
-    """Get list of all students with optional filters."""
-    query = db.query(Student)
+    """
+    Get list of all students with optional filters, ordered by student ID.
+    Paginated: pass the X-Next-Cursor header back as ?cursor= for the next page.
+    """
+    query = db.query(Student).options(*student_response_options())
     
     if department:
         query = query.filter(Student.department == department)
     if year:
         query = query.filter(Student.year == year)
+    if search:
+        pattern = f"%{search}%"
+        query = query.filter(or_(
+            Student.first_name.ilike(pattern),
+            Student.last_name.ilike(pattern),
+            Student.roll_number.ilike(pattern)
+        ))
     
-    students = query.all()
-    
-    students = query.all()
+    students, next_cursor = paginate(query, page, (Student.student_id,))
     
-    return [map_student_to_response(s) for s in students]
+    return page_response(response, [map_student_to_response(s) for s in students], next_cursor, page)
 
 
 @router.post("/students", response_model=StudentResponse, status_code=status.HTTP_201_CREATED)
@@ -113,9 +142,9 @@ def create_student(
         db.add(phone_entry)
     
     db.commit()
+    dashboard_service.invalidate_dashboard()
     db.refresh(student)
-    
-    db.refresh(student)
+    event_hub.publish("student", {"student_id": student.student_id})
     
     return map_student_to_response(student)
 
@@ -135,46 +164,27 @@ def assign_room(
             detail="Student not found"
         )
     
-    # Validate room exists
-    room = db.query(Room).filter(Room.room_no == request.room_no).first()
-    if not room:
+    # Lock the room, re-check capacity and move the student in
+    try:
+        assignment, previous_rooms = room_service.allocate_room(
+            db, request.student_id, request.room_no, request.assigned_date
+        )
+    except room_service.RoomNotFound:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Room not found"
         )
-    
-    # Check room capacity
-    current_occupants = db.query(RoomAssignment).filter(
-        and_(
-            RoomAssignment.room_no == request.room_no,
-            RoomAssignment.is_active == True
-        )
-    ).count()
-    
-    if current_occupants >= room.capacity:
+    except room_service.RoomFull as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Room is at full capacity ({room.capacity})"
-        )
-    
-    # Deactivate any existing active assignment
-    db.query(RoomAssignment).filter(
-        and_(
-            RoomAssignment.student_id == request.student_id,
-            RoomAssignment.is_active == True
+            detail=f"Room is at full capacity ({e.capacity})"
         )
-    ).update({"is_active": False, "vacated_date": date.today()})
     
-    # Create new assignment
-    assignment = RoomAssignment(
-        student_id=request.student_id,
-        room_no=request.room_no,
-        assigned_date=request.assigned_date,
-        is_active=True
-    )
-    db.add(assignment)
     db.commit()
+    dashboard_service.invalidate_dashboard()
+    room_service.record_room_change(added_to=request.room_no, removed_from=previous_rooms)
     db.refresh(assignment)
+    event_hub.publish("room_assignment", {"student_id": assignment.student_id, "room_no": assignment.room_no})
     
     return RoomAssignmentResponse(
         assignment_id=assignment.assignment_id,
@@ -193,33 +203,52 @@ def get_available_rooms(
     db: Session = Depends(get_db)
 ):
     """Get list of rooms with vacancy."""
-    query = db.query(Room)
-    if block:
-        query = query.filter(Room.block == block)
-    
-    rooms = query.all()
-    results = []
+    return room_service.get_available_rooms(db, block)
+
+
+@router.post("/rooms/allot", response_model=BulkAllotmentResponse)
+def allot_rooms(
+    request: BulkAllotmentRequest,
+    current_admin: Employee = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """
+    Assign rooms to many students at once (e.g. at semester start).
+    Students are packed into free beds in the selected block/floor/room type,
+    all in one transaction: if the beds run out, nothing is assigned.
+    Students who already have a room are skipped.
+    """
+    try:
+        allotments, skipped = room_service.allot_rooms(
+            db,
+            request.student_ids,
+            request.assigned_date or date.today(),
+            block=request.block,
+            floor=request.floor,
+            room_type=request.room_type
+        )
+    except room_service.StudentsNotFound as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Students not found: {e.student_ids}"
+        )
+    except room_service.InsufficientCapacity as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Not enough free beds: need {e.needed}, {e.free} available"
+        )
     
-    for room in rooms:
-        occupied_count = db.query(RoomAssignment).filter(
-            and_(
-                RoomAssignment.room_no == room.room_no,
-                RoomAssignment.is_active == True
-            )
-        ).count()
-        
-        if occupied_count < room.capacity:
-            results.append(AvailableRoom(
-                room_no=room.room_no,
-                block=room.block,
-                floor=room.floor,
-                room_type=room.room_type.value,
-                capacity=room.capacity,
-                occupied=occupied_count,
-                available=room.capacity - occupied_count
-            ))
-            
-    return results
+    db.commit()
+    if allotments:
+        dashboard_service.invalidate_dashboard()
+        room_service.room_occupancy.invalidate()
+        event_hub.publish("room_assignment", {"count": len(allotments)})
+    
+    return BulkAllotmentResponse(
+        allotted=[RoomAllotment(student_id=s, room_no=r) for s, r in allotments],
+        skipped=skipped,
+        rooms_used=len({r for _, r in allotments})
+    )
 
 
 @router.post("/register-student", response_model=StudentResponse, status_code=status.HTTP_201_CREATED)
@@ -229,22 +258,7 @@ def register_student_with_room(
     db: Session = Depends(get_db)
 ):
     """Register a new student and assign a room in one transaction."""
-    # 1. Validate Room Availability
-    room = db.query(Room).filter(Room.room_no == request.room_no).first()
-    if not room:
-        raise HTTPException(status_code=404, detail="Room not found")
-        
-    occupied_count = db.query(RoomAssignment).filter(
-        and_(
-            RoomAssignment.room_no == request.room_no,
-            RoomAssignment.is_active == True
-        )
-    ).count()
-    
-    if occupied_count >= room.capacity:
-        raise HTTPException(status_code=400, detail="Selected room is full")
-
-    # 2. Create Student (Reuse Create logic logic or call function if refactored, here duplicating for transaction safety)
+    # 1. Create Student (Reuse Create logic logic or call function if refactored, here duplicating for transaction safety)
     if db.query(Student).filter(Student.email == request.email).first():
         raise HTTPException(status_code=400, detail="Email already exists")
 
@@ -274,32 +288,43 @@ def register_student_with_room(
             phone_type=phone.phone_type
         ))
 
-    # 3. Assign Room
-    assignment = RoomAssignment(
-        student_id=student.student_id,
-        room_no=request.room_no,
-        assigned_date=date.today(),
-        is_active=True
-    )
-    db.add(assignment)
+    # 2. Assign Room (locks the room, so concurrent registrations can't overfill it)
+    try:
+        room_service.allocate_room(db, student.student_id, request.room_no, date.today())
+    except room_service.RoomNotFound:
+        raise HTTPException(status_code=404, detail="Room not found")
+    except room_service.RoomFull:
+        raise HTTPException(status_code=400, detail="Selected room is full")
     
     db.commit()
+    dashboard_service.invalidate_dashboard()
+    room_service.record_room_change(added_to=request.room_no)
     db.refresh(student)
+    event_hub.publish("student", {"student_id": student.student_id})
+    event_hub.publish("room_assignment", {"student_id": student.student_id, "room_no": request.room_no})
     return map_student_to_response(student)
 
 
 @router.get("/violations", response_model=List[ViolationResponse])
 def get_violations(
+    response: Response,
     resolved: bool = Query(False),
+    page: PageParams = Depends(),
     current_admin: Employee = Depends(get_current_admin),
     db: Session = Depends(get_db)
 ):
-    """Get list of violations (curfew, frequent absence, etc.)."""
-    violations = db.query(Violation).filter(
-        Violation.resolved == resolved
-    ).order_by(Violation.created_at.desc()).limit(100).all()
+    """
+    Get list of violations (curfew, frequent absence, etc.), newest first.
+    Paginated: pass the X-Next-Cursor header back as ?cursor= for the next page.
+    """
+    violations, next_cursor = paginate(
+        db.query(Violation).options(joinedload(Violation.student)).filter(Violation.resolved == resolved),
+        page,
+        (Violation.violation_id,),
+        descending=True
+    )
     
-    return [
+    return page_response(response, [
         ViolationResponse(
             violation_id=v.violation_id,
             student_id=v.student_id,
@@ -311,7 +336,7 @@ def get_violations(
             resolved=v.resolved
         )
         for v in violations
-    ]
+    ], next_cursor, page)
 
 
 @router.get("/students/absent", response_model=List[StudentResponse])
@@ -335,60 +360,13 @@ def get_dashboard_summary(
     current_admin: Employee = Depends(get_current_admin),
     db: Session = Depends(get_db)
 ):
-    """Get comprehensive dashboard summary for admin/warden."""
-    from app.models import OptOut
-    
-    # Total students
-    total_students = db.query(Student).count()
-    
-    # Students currently IN
-    present_students = get_students_by_status(db, AttendanceType.IN)
-    present_count = len(present_students)
-    
-    # Students currently OUT
-    out_students = get_students_by_status(db, AttendanceType.OUT)
-    out_count = len(out_students)
-    
-    # Total rooms
-    total_rooms = db.query(Room).count()
-    
-    # Occupied rooms
-    occupied_rooms = db.query(func.count(func.distinct(RoomAssignment.room_no))).filter(
-        RoomAssignment.is_active == True
-    ).scalar()
-    
-    # Pending violations
-    pending_violations = db.query(Violation).filter(Violation.resolved == False).count()
-    
-    # Today's meal attendance (expected counts)
-    today = date.today()
-    meal_summary = {}
-    
-    from app.models import MealTime
-    for meal in MealTime:
-        # Count only records with opt='N' (Not eating)
-        opted_out = db.query(OptOut).filter(
-            and_(
-                OptOut.date == today,
-                OptOut.meal_time == meal,
-                OptOut.opt == 'N'
-            )
-        ).count()
-        
-        meal_summary[meal.value] = {
-            "expected": total_students - opted_out,
-            "opted_out": opted_out
-        }
-    
-    return DashboardSummary(
-        total_students=total_students,
-        present_students=present_count,
-        out_students=out_count,
-        total_rooms=total_rooms,
-        occupied_rooms=occupied_rooms or 0,
-        pending_violations=pending_violations,
-        today_meal_attendance=meal_summary
-    )
+    """
+    Get comprehensive dashboard summary for admin/warden.
+    Served from a shared snapshot that is refreshed at most every few
+    seconds and dropped whenever attendance, opt-outs, violations,
+    students or room assignments change.
+    """
+    return dashboard_service.get_dashboard_summary(db)
 
 
 @router.put("/violations/{violation_id}/resolve")
@@ -409,8 +387,11 @@ def resolve_violation(
     violation.resolved = True
     violation.resolved_by = current_admin.ssn
     violation.resolved_at = datetime.utcnow()
+    event = violation_event(violation)
     
     db.commit()
+    dashboard_service.invalidate_dashboard()
+    event_hub.publish("violation", event)
     
     return {"message": "Violation marked as resolved"}
 
@@ -432,3 +413,8 @@ def check_curfew_violations(
         "violations": violations
     }
 
+
+@router.get("/maintenance/qr-tokens", response_model=QRReaperStats)
+def get_qr_reaper_stats(current_admin: Employee = Depends(get_current_admin)):
+    """Expired QR token pruning metrics for this worker: runs, rows reclaimed, last error."""
+    return qr_reaper.stats()
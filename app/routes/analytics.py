@@ -1,14 +1,22 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from datetime import datetime, date
 from typing import List
-from app.database import get_db
-from app.models import MealTime
+from io import StringIO
+import csv
+from app.database import get_db, SessionLocal
+from app.models import MealTime, Attendance, Student
 from app.schemas import (
     PeakHoursData, DailyTrendData, MonthlyStats, LateOutStudent,
     MealUtilization, OccupancyData, AnomalyData
 )
-from app.auth import get_current_user
+from app.auth import get_current_user, get_current_admin
+from app.services.date_range import days_range, in_range
+from app.services.export_service import (
+    DATASETS, FORMATS, ARROW_FORMATS, HAS_ARROW, stream_export, stream_partitioned_export
+)
 from app.services.analytics_service import (
     get_peak_hours, get_daily_trends, get_monthly_stats,
     get_late_out_students, get_meal_utilization, get_occupancy_by_block,
@@ -17,6 +25,8 @@ from app.services.analytics_service import (
 
 router = APIRouter(prefix="/analytics", tags=["Analytics"])
 
+CSV_BATCH_SIZE = 1000
+
 
 @router.get("/peak-hours", response_model=List[PeakHoursData])
 def get_peak_hours_analysis(
@@ -123,46 +133,112 @@ def get_anomaly_detection(
 def export_analytics_csv(
     start_date: date = Query(...),
     end_date: date = Query(...),
-    current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user = Depends(get_current_user)
 ):
     """
     Export attendance analytics as CSV.
     Useful for external analysis and reporting.
+    Rows are streamed in batches, so memory use does not grow with the date range.
     """
-    from app.models import Attendance
-    from sqlalchemy import func
-    import csv
-    from io import StringIO
+    start, end = days_range(start_date, end_date)
     
-    # Get attendance data
-    records = db.query(Attendance).filter(
-        func.date(Attendance.timestamp).between(start_date, end_date)
-    ).order_by(Attendance.timestamp).all()
-    
-    # Create CSV
+    return StreamingResponse(
+        _stream_attendance_csv(start, end),
+        media_type="text/csv",
+        headers={"Content-Disposition": f"attachment; filename=attendance_{start_date}_to_{end_date}.csv"}
+    )
+
+
+def _stream_attendance_csv(start: datetime, end: datetime):
+    """
+    Yield the attendance CSV one batch of rows at a time.
+    Reads through a server-side cursor with the roll number joined in, and
+    uses its own session because the request session is closed before streaming starts.
+    """
     output = StringIO()
     writer = csv.writer(output)
-    
-    # Write header
     writer.writerow(['Date', 'Time', 'Student ID', 'Roll Number', 'Type', 'Location'])
     
-    # Write data
-    for r in records:
-        writer.writerow([
-            r.timestamp.date(),
-            r.timestamp.time(),
-            r.student_id,
-            r.student.roll_number,
-            r.type.value,
-            r.location
-        ])
+    db = SessionLocal()
+    try:
+        rows = db.execute(
+            select(
+                Attendance.timestamp,
+                Attendance.student_id,
+                Student.roll_number,
+                Attendance.type,
+                Attendance.location
+            ).outerjoin(Student, Student.student_id == Attendance.student_id).where(
+                in_range(Attendance.timestamp, start, end)
+            ).order_by(Attendance.timestamp),
+            execution_options={"stream_results": True, "yield_per": CSV_BATCH_SIZE}
+        )
+        
+        for batch in rows.partitions():
+            for r in batch:
+                writer.writerow([
+                    r.timestamp.date(),
+                    r.timestamp.time(),
+                    r.student_id,
+                    r.roll_number,
+                    r.type.value,
+                    r.location
+                ])
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate()
+        
+        if output.tell():
+            yield output.getvalue()
+    finally:
+        db.close()
+
+
+@router.get("/export/{dataset}")
+def export_dataset(
+    dataset: str,
+    start_date: date = Query(...),
+    end_date: date = Query(...),
+    format: str = Query("ndjson", pattern="^(ndjson|arrow|parquet)$"),
+    partition: str = Query("none", pattern="^(none|day|month)$"),
+    current_admin = Depends(get_current_admin)
+):
+    """
+    Export attendance, opt_out or violations data in a columnar or line format.
+    Admin/warden only: rows are per student.
+    - ndjson (default): one JSON object per line
+    - arrow: Arrow IPC stream (needs the optional pyarrow package)
+    - parquet: snappy-compressed Parquet, one row group per batch (needs pyarrow)
+    With partition=day|month the response is a zip holding one file per
+    partition (<dataset>/<date column>=<key>/part-0.<ext>).
+    Data is read and encoded in batches, so large ranges stream with flat memory.
+    """
+    export = DATASETS.get(dataset)
+    if export is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Unknown dataset. Must be one of: {list(DATASETS)}"
+        )
+    
+    if format in ARROW_FORMATS and not HAS_ARROW:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Arrow and Parquet exports require pyarrow to be installed"
+        )
     
-    from fastapi.responses import StreamingResponse
-    output.seek(0)
+    filename = f"{dataset}_{start_date}_to_{end_date}"
+    if partition == "none":
+        writer = FORMATS[format]
+        body = stream_export(export, format, start_date, end_date)
+        media_type = writer.media_type
+        filename += f".{writer.extension}"
+    else:
+        body = stream_partitioned_export(export, format, start_date, end_date, partition)
+        media_type = "application/zip"
+        filename += f"_by_{partition}.zip"
     
     return StreamingResponse(
-        iter([output.getvalue()]),
-        media_type="text/csv",
-        headers={"Content-Disposition": f"attachment; filename=attendance_{start_date}_to_{end_date}.csv"}
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
@@ -1,98 +1,104 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from sqlalchemy.orm import Session, joinedload
 from datetime import datetime, date
 from typing import List, Optional
 from app.database import get_db
-from app.models import Student, AttendanceType
+from app.models import Student, Employee, Attendance, AttendanceType
 from app.schemas import (
-    QRScanRequest, QRGenerateResponse, AttendanceRecord, AttendanceStats
-)
-from app.auth import get_current_user, get_current_student
-from app.services.qr_service import generate_qr_token, generate_qr_image, validate_qr_token
-from app.services.attendance_service import (
-    auto_detect_attendance_type, check_duplicate_scan, mark_attendance,
-    get_attendance_history, calculate_attendance_stats
+    QRScanRequest, QRGenerateResponse, AttendanceRecord, AttendanceStats,
+    ScanBatchRequest, ScanBatchResponse
 )
+from app.auth import get_current_user, get_current_student, get_current_admin
+from app.services.date_range import day_range, in_range
+from app.services.qr_service import issue_qr_code
+from app.services.scan_service import process_scan, process_scan_batch, ScanRejected, ScanBatchConflict
+from app.services.attendance_service import attendance_history_query, calculate_attendance_stats
+from app.pagination import PageParams, paginate, page_response
+from app.config import get_settings
+
+settings = get_settings()
 
 router = APIRouter(prefix="/attendance", tags=["Attendance"])
 
 
-@router.post("/generate-qr", response_model=QRGenerateResponse)
-def generate_qr_code(current_student: Student = Depends(get_current_student), db: Session = Depends(get_db)):
+@router.post("/generate-qr", response_model=QRGenerateResponse, response_model_exclude_none=True)
+def generate_qr_code(
+    format: str = Query("png", pattern="^(png|svg|matrix|none)$", description="png, svg, matrix, or none to render from the token"),
+    refresh: bool = Query(False, description="Issue a new code even if the current one can be reused"),
+    current_student: Student = Depends(get_current_student),
+    db: Session = Depends(get_db)
+):
     """
     Generate a time-limited QR code for the current student.
-    QR code is valid for 5 minutes.
+    QR code is valid for 5 minutes. A code issued less than half its
+    lifetime ago is returned again unless refresh is set.
     """
-    token, expires_at = generate_qr_token(db, current_student.student_id)
-    qr_image = generate_qr_image(token)
-    
-    return QRGenerateResponse(
-        token=token,
-        qr_image_base64=qr_image,
-        expires_at=expires_at
-    )
+    return QRGenerateResponse(**issue_qr_code(db, current_student.student_id, format, refresh))
 
 
 @router.post("/scan", response_model=AttendanceRecord)
-def scan_qr_code(request: QRScanRequest, db: Session = Depends(get_db)):
+def scan_qr_code(request: QRScanRequest):
     """
     Process QR code scan for attendance marking.
     Automatically detects IN or OUT based on last status.
-    Prevents duplicate scans within 5 minutes.
+    Validation, the attendance record, status and any curfew violation are
+    written in a single transaction, shared with scans arriving at the
+    same time.
     """
-    # Validate QR token
-    student = validate_qr_token(db, request.token)
-    
-    if not student:
+    try:
+        return process_scan(request.token, requested_type=request.type)
+    except ScanRejected:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid, expired, or already used QR code"
         )
+
+
+@router.post("/scan-batch", response_model=ScanBatchResponse)
+def scan_qr_batch(
+    request: ScanBatchRequest,
+    current_admin: Employee = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """
+    Upload scans queued by a scanner page while it was offline.
+    Admin/warden only, like the scanner page itself; disabled unless
+    GATE_OFFLINE_UPLOADS is set.
+    Each scan is recorded at its original time; scans already uploaded are
+    reported as duplicates, so a batch can safely be sent again. Every
+    scan gets a result, and the terminal can drop the whole batch from its
+    queue once this returns.
+    """
+    if not settings.GATE_OFFLINE_UPLOADS:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Offline scan uploads are not enabled"
+        )
     
-    # Check for duplicate scan
-    # if check_duplicate_scan(db, student.student_id, cooldown_minutes=1.0):
-    #     raise HTTPException(
-    #         status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-    #         detail="Attendance already marked recently. Please wait 1 minute."
-    #     )
-    
-    # Determine attendance type: use manual if provided, otherwise auto-detect
-    if request.type:
-        attendance_type = request.type
-    else:
-        attendance_type = auto_detect_attendance_type(db, student.student_id)
-    
-    # Mark attendance
-    attendance = mark_attendance(
-        db,
-        student_id=student.student_id,
-        attendance_type=attendance_type,
-        location="Main Gate",
-        remarks="QR Code Scan"
-    )
-    
-    return AttendanceRecord(
-        attendance_id=attendance.attendance_id,
-        student_id=attendance.student_id,
-        timestamp=attendance.timestamp,
-        type=attendance.type.value,
-        remarks=attendance.remarks,
-        location=attendance.location
-    )
+    try:
+        return process_scan_batch(db, request.terminal_id, request.scans)
+    except ScanBatchConflict:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Some of these scans are being recorded by another upload; retry the batch"
+        )
 
 
 @router.get("/student/{student_id}", response_model=List[AttendanceRecord])
 def get_student_attendance(
     student_id: int,
+    response: Response,
     start_date: Optional[date] = Query(None),
     end_date: Optional[date] = Query(None),
+    page: PageParams = Depends(),
     current_user = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
-    Get attendance history for a specific student.
+    Get attendance history for a specific student, newest first.
     Students can only view their own records.
     Admins/Wardens can view any student's records.
+    Paginated: pass the X-Next-Cursor header back as ?cursor= for the next page.
     """
     # Authorization check
     if isinstance(current_user, Student) and current_user.student_id != student_id:
@@ -102,9 +108,14 @@ def get_student_attendance(
         )
     
     # Get attendance history
-    records = get_attendance_history(db, student_id, start_date, end_date)
+    records, next_cursor = paginate(
+        attendance_history_query(db, student_id, start_date, end_date),
+        page,
+        (Attendance.timestamp, Attendance.attendance_id),
+        descending=True
+    )
     
-    return [
+    return page_response(response, [
         AttendanceRecord(
             attendance_id=r.attendance_id,
             student_id=r.student_id,
@@ -114,7 +125,7 @@ def get_student_attendance(
             location=r.location
         )
         for r in records
-    ]
+    ], next_cursor, page)
 
 
 @router.get("/student/{student_id}/stats", response_model=AttendanceStats)
@@ -150,14 +161,19 @@ def get_student_attendance_stats(
 @router.get("/daily/{target_date}", response_model=List[AttendanceRecord])
 def get_daily_attendance(
     target_date: date,
+    response: Response,
+    student_id: Optional[int] = Query(None),
+    attendance_type: Optional[AttendanceType] = Query(None, alias="type"),
+    page: PageParams = Depends(),
     current_user = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
-    Get all attendance records for a specific date.
-    Admin/Warden access only.
+    Get attendance records for a specific date, newest first.
+    Admin/Warden access only. Optionally filtered by student and IN/OUT.
+    Paginated: pass the X-Next-Cursor header back as ?cursor= for the next page.
     """
-    from app.models import Employee, Attendance
+    from app.models import Employee
     
     # Check if user is admin or warden
     if not isinstance(current_user, Employee):
@@ -166,13 +182,19 @@ def get_daily_attendance(
             detail="Admin or Warden access required"
         )
     
-    # Get all attendance for the date
-    from sqlalchemy import func
-    records = db.query(Attendance).options(joinedload(Attendance.student)).filter(
-        func.date(Attendance.timestamp) == target_date
-    ).order_by(Attendance.timestamp.desc()).all()
+    # Get attendance for the date
+    start, end = day_range(target_date)
+    query = db.query(Attendance).options(joinedload(Attendance.student)).filter(
+        in_range(Attendance.timestamp, start, end)
+    )
+    if student_id:
+        query = query.filter(Attendance.student_id == student_id)
+    if attendance_type:
+        query = query.filter(Attendance.type == attendance_type)
+    
+    records, next_cursor = paginate(query, page, (Attendance.timestamp, Attendance.attendance_id), descending=True)
     
-    return [
+    return page_response(response, [
         AttendanceRecord(
             attendance_id=r.attendance_id,
             student_id=r.student_id,
@@ -184,4 +206,4 @@ def get_daily_attendance(
             student_name=f"{r.student.first_name} {r.student.last_name}" if r.student else "Unknown"
         )
         for r in records
-    ]
+    ], next_cursor, page)
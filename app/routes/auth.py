@@ -8,6 +8,8 @@ from app.auth import (
     authenticate_employee, get_current_user
 )
 from typing import Union
+from app.services.dashboard_service import invalidate_dashboard
+from app.services.event_hub import event_hub
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
@@ -59,7 +61,9 @@ def register(request: RegisterRequest, db: Session = Depends(get_db)):
         )
         db.add(user)
         db.commit()
+        invalidate_dashboard()
         db.refresh(user)
+        event_hub.publish("student", {"student_id": user.student_id})
         
         user_id = user.student_id
         user_type = "student"
@@ -1,10 +1,20 @@
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
+from typing import List
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from datetime import date
-from app.database import get_db
+from datetime import date, datetime
+from app.database import get_db, SessionLocal
 from app.models import Student, StudentFace, Attendance, AttendanceType
 from app.auth import get_current_admin
-from sqlalchemy import func
+from app.services.face_index import face_index, histogram_index, histogram_to_bytes, encoding_to_bytes
+from app.services.face_pipeline import face_pipeline, PipelineSaturated, PipelineTimeout
+from app.services.dashboard_service import invalidate_dashboard
+from app.services.event_hub import event_hub
+from app.services.rollup_service import record_rollups
+from app.services.attendance_service import (
+    auto_detect_attendance_type, mark_attendance, get_current_statuses, update_current_status
+)
+from sqlalchemy import func, insert
 import base64
 import json
 import numpy as np
@@ -26,6 +36,74 @@ except ImportError:
 
 router = APIRouter(prefix="/admin/face", tags=["Face Recognition"])
 
+IMAGE_CHUNK_SIZE = 256 * 1024
+MAX_BATCH_IMAGES = 32
+
+
+def _sniff_image_type(header: bytes) -> str:
+    """Guess the media type of a stored face image from its magic bytes."""
+    if header.startswith(b"\x89PNG"):
+        return "image/png"
+    if header.startswith(b"\xff\xd8"):
+        return "image/jpeg"
+    return "application/octet-stream"
+
+
+async def _analyze_upload(image_data: bytes) -> dict:
+    """Run decode/encode in the face worker pool, mapping pool pressure to HTTP errors."""
+    try:
+        return await face_pipeline.analyze(image_data)
+    except PipelineSaturated:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Face recognition is busy. Please retry shortly.",
+            headers={"Retry-After": "1"}
+        )
+    except PipelineTimeout:
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="Face processing timed out"
+        )
+
+
+async def _analyze_many_uploads(images: List[bytes]) -> List[dict]:
+    """Batch variant of _analyze_upload."""
+    try:
+        return await face_pipeline.analyze_many(images)
+    except PipelineSaturated:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Face recognition is busy. Please retry shortly.",
+            headers={"Retry-After": "1"}
+        )
+    except PipelineTimeout:
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="Face processing timed out"
+        )
+
+
+def _stream_face_image(face_id: int, total_length: int):
+    """
+    Yield a stored face image in fixed-size chunks using SUBSTRING on the blob,
+    so the full image is never held in Python memory at once.
+    Uses its own session because the request session is closed before streaming starts.
+    """
+    db = SessionLocal()
+    try:
+        offset = 1  # SQL SUBSTRING is 1-based
+        while offset <= total_length:
+            chunk = db.query(
+                func.substring(StudentFace.image_data, offset, IMAGE_CHUNK_SIZE)
+            ).filter(StudentFace.face_id == face_id).scalar()
+            if not chunk:
+                break
+            yield bytes(chunk)
+            offset += IMAGE_CHUNK_SIZE
+    finally:
+        db.close()
+
+
 @router.post("/register")
 async def register_face(
     student_id: int = Form(...),
@@ -42,23 +120,12 @@ async def register_face(
     image_data = await image.read()
     
     encoding = None
+    analysis = await _analyze_upload(image_data)
+    histogram = analysis["histogram"]
     
     if HAS_CV2 and HAS_FACE_REC:
-        try:
-            # Convert bytes to numpy array
-            nparr = np.frombuffer(image_data, np.uint8)
-            img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            rgb_img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-            
-            # Get encoding
-            encodings = face_recognition.face_encodings(rgb_img)
-            if len(encodings) > 0:
-                encoding = encodings[0].tolist() # Convert to list for JSON storage
-            else:
-                pass 
-        except Exception as e:
-            print(f"Face processing error: {e}")
-            pass
+        if len(analysis["encodings"]) > 0:
+            encoding = analysis["encodings"][0]
     elif not HAS_FACE_REC:
         # Mock encoding for testing without library
         encoding = [0.1] * 128 
@@ -67,12 +134,22 @@ async def register_face(
     face_record = StudentFace(
         student_id=student_id,
         image_data=image_data,
-        encoding=encoding
+        encoding_vector=encoding_to_bytes(encoding) if encoding is not None else None,
+        histogram=histogram_to_bytes(histogram) if histogram is not None else None
     )
     db.add(face_record)
     db.commit()
     
-    return {"message": "Face registered successfully", "has_encoding": encoding is not None}
+    if encoding is not None:
+        face_index.add(face_record.face_id, student_id, encoding)
+    if histogram is not None:
+        histogram_index.add(face_record.face_id, student_id, histogram)
+    
+    return {
+        "message": "Face registered successfully",
+        "has_encoding": encoding is not None,
+        "timings_ms": analysis["timings"]
+    }
 
 @router.post("/recognize")
 async def recognize_face(
@@ -86,90 +163,46 @@ async def recognize_face(
     student = None
     confidence = 0.0
     note = ""
+    
+    analysis = await _analyze_upload(image_data)
+    timings = analysis["timings"]
 
     # Strategy 1: Use face_recognition (Dlib) - Best Accuracy
-    if HAS_FACE_REC:
+    if HAS_FACE_REC and len(analysis["encodings"]) > 0:
         try:
-            nparr = np.frombuffer(image_data, np.uint8)
-            img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            rgb_img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-            
-            unknown_encodings = face_recognition.face_encodings(rgb_img)
+            unknown_encoding = analysis["encodings"][0]
+            face_index.ensure_loaded(db)
+            best_match = await face_pipeline.match(face_index.match, unknown_encoding, 0.6, timings=timings)
             
-            if len(unknown_encodings) > 0:
-                unknown_encoding = unknown_encodings[0]
-                known_faces = db.query(StudentFace).filter(StudentFace.encoding.isnot(None)).all()
-                
-                best_match = None
-                min_dist = 0.6
-                
-                for face in known_faces:
-                     if not face.encoding: continue
-                     known_encoding = np.array(face.encoding)
-                     dist = face_recognition.face_distance([known_encoding], unknown_encoding)[0]
-                     if dist < min_dist:
-                        min_dist = dist
-                        best_match = face
-                
-                if best_match:
-                    student = best_match.student
-                    confidence = 1 - min_dist
+            if best_match:
+                _, student_id, min_dist = best_match
+                student = db.query(Student).filter(Student.student_id == student_id).first()
+                confidence = 1 - min_dist
         except Exception as e:
             print(f"Face Rec Error: {e}")
 
     # Strategy 2: Use OpenCV Histogram - Fallback
-    if not student and HAS_CV2:
+    if not student and analysis["histogram"] is not None:
         try:
-            nparr = np.frombuffer(image_data, np.uint8)
-            target_img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+            # Correlate against every stored histogram in one batched operation
+            histogram_index.ensure_loaded(db)
+            best_match = await face_pipeline.match(
+                histogram_index.match, analysis["histogram"], 0.6,
+                timings=timings, label="histogram_match_ms"
+            )
             
-            if target_img is not None:
-                # Calculate Histogram
-                target_hist = cv2.calcHist([target_img], [0, 1, 2], None, [8, 8, 8], [0, 256, 0, 256, 0, 256])
-                cv2.normalize(target_hist, target_hist)
-                
-                best_score = 0
-                best_face = None
-                
-                known_faces = db.query(StudentFace).all()
-                for face in known_faces:
-                    if not face.image_data: continue
-                    face_arr = np.frombuffer(face.image_data, np.uint8)
-                    stored_img = cv2.imdecode(face_arr, cv2.IMREAD_COLOR)
-                    if stored_img is None: continue
-                    
-                    stored_hist = cv2.calcHist([stored_img], [0, 1, 2], None, [8, 8, 8], [0, 256, 0, 256, 0, 256])
-                    cv2.normalize(stored_hist, stored_hist)
-                    
-                    score = cv2.compareHist(target_hist, stored_hist, cv2.HISTCMP_CORREL)
-                    if score > best_score:
-                        best_score = score
-                        best_face = face
-                
-                if best_score > 0.6 and best_face:
-                    student = best_face.student
-                    confidence = best_score
-                    note = "OpenCV Histogram Match"
+            if best_match:
+                _, student_id, best_score = best_match
+                student = db.query(Student).filter(Student.student_id == student_id).first()
+                confidence = best_score
+                note = "OpenCV Histogram Match"
         except Exception as e:
             print(f"CV2 Error: {e}")
 
     if student:
         # Mark Attendance
-        last_attendance = db.query(Attendance).filter(
-            Attendance.student_id == student.student_id
-        ).order_by(Attendance.timestamp.desc()).first()
-        
-        new_status = AttendanceType.IN
-        if last_attendance and last_attendance.type == AttendanceType.IN:
-            new_status = AttendanceType.OUT
-            
-        attendance = Attendance(
-            student_id=student.student_id,
-            type=new_status,
-            timestamp=func.now()
-        )
-        db.add(attendance)
-        db.commit()
+        new_status = auto_detect_attendance_type(db, student.student_id)
+        mark_attendance(db, student_id=student.student_id, attendance_type=new_status)
         
         return {
             "match": True,
@@ -177,7 +210,146 @@ async def recognize_face(
             "name": f"{student.first_name} {student.last_name}",
             "status": new_status.value,
             "confidence": float(confidence),
-            "note": note
+            "note": note,
+            "timings_ms": timings
         }
         
-    return {"message": "Face not recognized", "match": False}
+    return {"message": "Face not recognized", "match": False, "timings_ms": timings}
+
+
+@router.post("/recognize-batch")
+async def recognize_faces_batch(
+    images: List[UploadFile] = File(...),
+    current_admin = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """
+    Recognize every face in a burst of uploads (or a single multi-face frame)
+    and mark attendance for all matched students in one bulk insert.
+    """
+    if len(images) > MAX_BATCH_IMAGES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_BATCH_IMAGES} images per batch"
+        )
+    
+    image_data = [await image.read() for image in images]
+    analyses = await _analyze_many_uploads(image_data)
+    timings = {"analyze_total_ms": analyses[0]["timings"].get("analyze_total_ms") if analyses else 0.0}
+    
+    # Flatten every detected face so the whole batch is matched in one operation
+    probes = [
+        (image_idx, face_idx, encoding)
+        for image_idx, analysis in enumerate(analyses)
+        for face_idx, encoding in enumerate(analysis["encodings"])
+    ]
+    
+    results = []
+    if probes:
+        face_index.ensure_loaded(db)
+        matches = await face_pipeline.match(
+            face_index.match_many, [p[2] for p in probes], 0.6, timings=timings
+        )
+        for (image_idx, face_idx, _), match in zip(probes, matches):
+            results.append({
+                "image": image_idx,
+                "face": face_idx,
+                "student_id": match[1] if match else None,
+                "confidence": float(1 - match[2]) if match else 0.0,
+                "note": ""
+            })
+    
+    # Histogram fallback for images where no face could be encoded
+    images_with_faces = {p[0] for p in probes}
+    for image_idx, analysis in enumerate(analyses):
+        if image_idx in images_with_faces or analysis["histogram"] is None:
+            continue
+        histogram_index.ensure_loaded(db)
+        match = await face_pipeline.match(
+            histogram_index.match, analysis["histogram"], 0.6,
+            timings=timings, label="histogram_match_ms"
+        )
+        results.append({
+            "image": image_idx,
+            "face": None,
+            "student_id": match[1] if match else None,
+            "confidence": float(match[2]) if match else 0.0,
+            "note": "OpenCV Histogram Match" if match else ""
+        })
+    
+    matched_ids = {r["student_id"] for r in results if r["student_id"] is not None}
+    students = {}
+    last_types = {}
+    if matched_ids:
+        students = {
+            s.student_id: s
+            for s in db.query(Student).filter(Student.student_id.in_(matched_ids)).all()
+        }
+        last_types = get_current_statuses(db, matched_ids)
+    
+    # One attendance row per student, even if they appear in several frames
+    rows = []
+    marked = set()
+    now = datetime.now()
+    for result in results:
+        student = students.get(result["student_id"])
+        result["match"] = student is not None
+        if not student:
+            result["student_id"] = None
+            continue
+        
+        result["name"] = f"{student.first_name} {student.last_name}"
+        if student.student_id in marked:
+            result["status"] = None
+            result["note"] = (result["note"] + " (duplicate in batch)").strip()
+            continue
+        
+        new_status = AttendanceType.OUT if last_types.get(student.student_id) == AttendanceType.IN else AttendanceType.IN
+        rows.append({"student_id": student.student_id, "type": new_status, "timestamp": now})
+        result["status"] = new_status.value
+        marked.add(student.student_id)
+    
+    if rows:
+        db.execute(insert(Attendance), rows)
+        records = [Attendance(**row) for row in rows]
+        update_current_status(db, records)
+        record_rollups(db, records)
+        db.commit()
+        invalidate_dashboard()
+        for row in rows:
+            event_hub.publish("attendance", {
+                "student_id": row["student_id"],
+                "type": row["type"],
+                "previous_type": last_types.get(row["student_id"]),
+                "timestamp": row["timestamp"],
+                "location": "Main Gate",
+                "remarks": None
+            })
+    
+    return {
+        "faces_detected": len(probes),
+        "marked": len(rows),
+        "results": results,
+        "timings_ms": timings
+    }
+
+@router.get("/{face_id}/image")
+def get_face_image(
+    face_id: int,
+    current_admin = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """Stream a single registered face image."""
+    face = db.query(
+        func.length(StudentFace.image_data).label("size"),
+        func.substring(StudentFace.image_data, 1, 8).label("header")
+    ).filter(StudentFace.face_id == face_id).first()
+    
+    if not face:
+        raise HTTPException(status_code=404, detail="Face not found")
+    
+    return StreamingResponse(
+        _stream_face_image(face_id, int(face.size or 0)),
+        media_type=_sniff_image_type(bytes(face.header or b"")),
+        headers={"Content-Length": str(int(face.size or 0))}
+    )
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from sqlalchemy.orm import Session
 from datetime import date, datetime
 from typing import List
@@ -7,6 +7,9 @@ from app.models import OptOut, MenuPool, MealTime, Student
 from app.schemas import OptOutCreate, OptOutResponse, DailySummary, DemandForecast, MenuPoolResponse
 from app.auth import get_current_student, get_current_user
 from app.services.analytics_service import predict_meal_demand
+from app.services.dashboard_service import invalidate_dashboard
+from app.services.event_hub import event_hub
+from app.pagination import PageParams, paginate, page_response
 from sqlalchemy import func, and_
 
 router = APIRouter(prefix="/mess", tags=["Mess Management"])
@@ -58,6 +61,14 @@ def opt_out_meal(
         db.commit()
         db.refresh(opt_out)
     
+    invalidate_dashboard()
+    event_hub.publish("opt_out", {
+        "student_id": opt_out.student_id,
+        "date": opt_out.date,
+        "meal_time": opt_out.meal_time,
+        "opt": opt_out.opt
+    })
+    
     return OptOutResponse(
         opt_id=opt_out.opt_id,
         student_id=opt_out.student_id,
@@ -69,18 +80,24 @@ def opt_out_meal(
 
 @router.get("/history", response_model=List[OptOutResponse])
 def get_opt_out_history(
+    response: Response,
+    page: PageParams = Depends(),
     current_student: Student = Depends(get_current_student),
     db: Session = Depends(get_db)
 ):
     """
     Get history of all opt-outs made by the current student.
     Ordered by date descending.
+    Paginated: pass the X-Next-Cursor header back as ?cursor= for the next page.
     """
-    opt_outs = db.query(OptOut).filter(
-        OptOut.student_id == current_student.student_id
-    ).order_by(OptOut.date.desc()).all()
+    opt_outs, next_cursor = paginate(
+        db.query(OptOut).filter(OptOut.student_id == current_student.student_id),
+        page,
+        (OptOut.date, OptOut.opt_id),
+        descending=True
+    )
     
-    return [
+    return page_response(response, [
         OptOutResponse(
             opt_id=o.opt_id,
             student_id=o.student_id,
@@ -90,7 +107,7 @@ def get_opt_out_history(
             reason=o.reason
         )
         for o in opt_outs
-    ]
+    ], next_cursor, page)
 
 
 @router.get("/daily-summary", response_model=List[DailySummary])
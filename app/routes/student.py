@@ -1,11 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Response
 from sqlalchemy.orm import Session
 from typing import List
 from app.database import get_db
-from app.models import Student
+from app.models import Student, Attendance
 from app.schemas import StudentResponse, StudentUpdate, AttendanceRecord
 from app.auth import get_current_student
-from app.services.attendance_service import get_attendance_history
+from app.services.attendance_service import attendance_history_query
+from app.pagination import PageParams, paginate, page_response
 
 router = APIRouter(prefix="/student", tags=["Student"])
 
@@ -80,11 +81,24 @@ def update_profile(
 
 
 @router.get("/attendance", response_model=List[AttendanceRecord])
-def get_my_attendance(current_student: Student = Depends(get_current_student), db: Session = Depends(get_db)):
-    """Get current student's attendance history."""
-    records = get_attendance_history(db, current_student.student_id)
+def get_my_attendance(
+    response: Response,
+    page: PageParams = Depends(),
+    current_student: Student = Depends(get_current_student),
+    db: Session = Depends(get_db)
+):
+    """
+    Get current student's attendance history, newest first.
+    Paginated: pass the X-Next-Cursor header back as ?cursor= for the next page.
+    """
+    records, next_cursor = paginate(
+        attendance_history_query(db, current_student.student_id),
+        page,
+        (Attendance.timestamp, Attendance.attendance_id),
+        descending=True
+    )
     
-    return [
+    return page_response(response, [
         AttendanceRecord(
             attendance_id=r.attendance_id,
             student_id=r.student_id,
@@ -94,7 +108,7 @@ def get_my_attendance(current_student: Student = Depends(get_current_student), d
             location=r.location
         )
         for r in records
-    ]
+    ], next_cursor, page)
 
 
 @router.get("/mess/history")
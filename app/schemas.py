@@ -1,7 +1,7 @@
 from pydantic import BaseModel, EmailStr, Field
 from typing import Optional, List
 from datetime import datetime, date
-from app.models import UserRole, AttendanceType, MealTime, DietaryPreference, ViolationType, ViolationSeverity
+from app.models import UserRole, AttendanceType, MealTime, DietaryPreference, ViolationType, ViolationSeverity, RoomType
 
 
 # =====================================================
@@ -146,12 +146,54 @@ class QRScanRequest(BaseModel):
     type: Optional[AttendanceType] = None
 
 
+class OfflineScan(BaseModel):
+    token: str
+    scanned_at: datetime  # When the terminal read the code; ISO 8601, ideally with a UTC offset
+    type: Optional[AttendanceType] = None
+
+
+class ScanBatchRequest(BaseModel):
+    terminal_id: str = Field(..., min_length=1, max_length=50)  # Recorded as the attendance location
+    scans: List[OfflineScan] = Field(..., min_length=1, max_length=1000)
+
+
+class ScanBatchResult(BaseModel):
+    index: int  # Position in the uploaded scans list
+    status: str  # "recorded", "duplicate" or "rejected"
+    student_id: Optional[int] = None
+    type: Optional[str] = None
+    reason: Optional[str] = None
+
+
+class ScanBatchResponse(BaseModel):
+    recorded: int
+    duplicates: int
+    rejected: int
+    results: List[ScanBatchResult]
+
+
 class QRGenerateResponse(BaseModel):
     token: str
-    qr_image_base64: str
+    qr_image_base64: Optional[str] = None  # format=png
+    qr_svg: Optional[str] = None  # format=svg
+    qr_matrix: Optional[List[str]] = None  # format=matrix: hex rows, MSB first, no quiet zone
     expires_at: datetime
 
 
+class QRReaperStats(BaseModel):
+    enabled: bool
+    mode: Optional[str] = None  # "delete" (batched) or "partition" (daily partition drops)
+    interval_seconds: int
+    grace_seconds: int
+    runs: int
+    errors: int
+    rows_reclaimed: int
+    last_run_at: Optional[datetime] = None
+    last_rows_reclaimed: int
+    last_duration_ms: Optional[float] = None
+    last_error: Optional[str] = None
+
+
 # =====================================================
 # ROOM SCHEMAS
 # =====================================================
@@ -203,6 +245,25 @@ class RoomAssignmentResponse(BaseModel):
         from_attributes = True
 
 
+class BulkAllotmentRequest(BaseModel):
+    student_ids: List[int] = Field(..., min_length=1, max_length=2000)
+    block: Optional[str] = None
+    floor: Optional[int] = None
+    room_type: Optional[RoomType] = None
+    assigned_date: Optional[date] = None  # Defaults to today
+
+
+class RoomAllotment(BaseModel):
+    student_id: int
+    room_no: str
+
+
+class BulkAllotmentResponse(BaseModel):
+    allotted: List[RoomAllotment]
+    skipped: List[int]  # Students who already have an active room
+    rooms_used: int
+
+
 # =====================================================
 # MESS SCHEMAS
 # =====================================================
@@ -0,0 +1,167 @@
+import functools
+import hashlib
+import inspect
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional, get_type_hints
+from pydantic import TypeAdapter
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from app.models import AnalyticsCache
+from app.database import upsert
+from app.config import get_settings
+
+settings = get_settings()
+
+PURGE_INTERVAL_SECONDS = 300
+
+
+class LRUCache:
+    """Small thread-safe LRU of (expires_at, value) pairs, keyed by cache key."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value, ttl_seconds: float):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+memory_cache = LRUCache(settings.ANALYTICS_CACHE_MAX_ENTRIES)
+_last_purge = 0.0
+
+
+def make_cache_key(name: str, params: dict) -> str:
+    """'<function>:<hash of parameters>', kept within the 100-character cache_key column."""
+    digest = hashlib.sha256(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+    return f"{name[:60]}:{digest[:32]}"
+
+
+def purge_expired(db: Session) -> int:
+    """Delete expired ANALYTICS_CACHE rows. Returns the number removed."""
+    removed = db.query(AnalyticsCache).filter(
+        AnalyticsCache.expires_at < datetime.utcnow()
+    ).delete(synchronize_session=False)
+    db.commit()
+    return removed
+
+
+def _maybe_purge(db: Session):
+    global _last_purge
+    now = time.monotonic()
+    if now - _last_purge >= PURGE_INTERVAL_SECONDS:
+        _last_purge = now
+        purge_expired(db)
+
+
+def _cache_session(db: Session) -> Session:
+    """
+    Short-lived session on the caller's engine for ANALYTICS_CACHE I/O, so
+    cache commits and rollbacks never touch the request's own transaction.
+    """
+    return Session(bind=db.get_bind())
+
+
+def _read_row(db: Session, key: str) -> Optional[tuple]:
+    row = db.query(AnalyticsCache.cache_data, AnalyticsCache.expires_at).filter(
+        AnalyticsCache.cache_key == key,
+        AnalyticsCache.expires_at > datetime.utcnow()
+    ).first()
+    return tuple(row) if row else None
+
+
+def _write_row(db: Session, key: str, data, ttl_seconds: int):
+    upsert(
+        db,
+        AnalyticsCache,
+        [{
+            "cache_key": key,
+            "cache_data": data,
+            "expires_at": datetime.utcnow() + timedelta(seconds=ttl_seconds)
+        }],
+        update_columns=("cache_data", "expires_at"),
+        conflict_columns=["cache_key"]
+    )
+    db.commit()
+
+
+def cached_analytics(ttl_seconds: Optional[int] = None):
+    """
+    Cache an analytics function's result, keyed by function name and arguments.
+
+    Two tiers: an in-process LRU, then the shared ANALYTICS_CACHE table (so
+    results survive restarts and are shared between workers). Results are
+    stored as JSON and rebuilt into the function's return type on a table
+    hit. The decorated function must take the Session as its first argument.
+    Cache failures are logged and fall through to computing the result.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+        adapter = TypeAdapter(get_type_hints(func)["return"])
+        ttl = ttl_seconds or settings.ANALYTICS_CACHE_TTL_SECONDS
+
+        @functools.wraps(func)
+        def wrapper(db: Session, *args, **kwargs):
+            bound = signature.bind(db, *args, **kwargs)
+            bound.apply_defaults()
+            params = {k: v for k, v in bound.arguments.items() if k != "db"}
+            key = make_cache_key(func.__name__, params)
+
+            result = memory_cache.get(key)
+            if result is not None:
+                return result
+
+            try:
+                with _cache_session(db) as cache_db:
+                    row = _read_row(cache_db, key)
+            except SQLAlchemyError as e:
+                print(f"WARNING: Analytics cache read failed for {key}: {e}")
+                row = None
+
+            if row is not None:
+                data, expires_at = row
+                result = adapter.validate_python(data)
+                remaining = (expires_at - datetime.utcnow()).total_seconds()
+                memory_cache.set(key, result, max(remaining, 0))
+                return result
+
+            result = func(db, *args, **kwargs)
+            memory_cache.set(key, result, ttl)
+
+            try:
+                with _cache_session(db) as cache_db:
+                    _write_row(cache_db, key, adapter.dump_python(result, mode="json"), ttl)
+                    _maybe_purge(cache_db)
+            except SQLAlchemyError as e:
+                print(f"WARNING: Analytics cache write failed for {key}: {e}")
+
+            return result
+
+        wrapper.uncached = func
+        return wrapper
+
+    return decorator
@@ -3,7 +3,7 @@ from typing import List, Dict, Any
 from sqlalchemy.orm import Session
 from sqlalchemy import func, and_, or_, case, extract, text
 from app.models import (
-    Attendance, AttendanceType, OptOut, Student, RoomAssignment, 
+    AttendanceType, AttendanceStatus, AttendanceDailyStudent, OptOut, Student, RoomAssignment, 
     Room, Violation, MealTime
 )
 from app.schemas import (
@@ -11,6 +11,9 @@ from app.schemas import (
     MealUtilization, OccupancyData, AnomalyData, DemandForecast
 )
 from app.config import get_settings
+from app.services.analytics_cache import cached_analytics
+from app.services.rollup_service import get_hourly_counts, get_daily_student_counts
+from app.services.date_range import month_range, start_of_day
 
 settings = get_settings()
 
@@ -19,65 +22,62 @@ settings = get_settings()
 # ATTENDANCE ANALYTICS
 # =====================================================
 
+@cached_analytics()
 def get_peak_hours(db: Session, days: int = 7) -> List[PeakHoursData]:
     """
     Analyze peak IN/OUT hours over the last N days.
-    Returns hourly distribution of attendance.
+    Returns hourly distribution of attendance, read from the hourly rollup.
     """
     cutoff_date = datetime.utcnow() - timedelta(days=days)
     
-    # Query to count IN and OUT by hour
-    results = db.query(
-        extract('hour', Attendance.timestamp).label('hour'),
-        func.sum(case((Attendance.type == AttendanceType.IN, 1), else_=0)).label('in_count'),
-        func.sum(case((Attendance.type == AttendanceType.OUT, 1), else_=0)).label('out_count')
-    ).filter(Attendance.timestamp > cutoff_date).group_by('hour').order_by('hour').all()
+    # At most 24 * days rollup rows, folded by hour of day
+    by_hour = {}
+    for r in get_hourly_counts(db, cutoff_date):
+        counts = by_hour.setdefault(r.bucket.hour, [0, 0])
+        counts[0] += r.in_count
+        counts[1] += r.out_count
     
     return [
-        PeakHoursData(hour=int(r.hour), in_count=int(r.in_count), out_count=int(r.out_count))
-        for r in results
+        PeakHoursData(hour=hour, in_count=counts[0], out_count=counts[1])
+        for hour, counts in sorted(by_hour.items())
     ]
 
 
+@cached_analytics()
 def get_daily_trends(db: Session, days: int = 30) -> List[DailyTrendData]:
-    """Get daily attendance trends for the last N days."""
-    cutoff_date = datetime.utcnow() - timedelta(days=days)
+    """Get daily attendance trends for the last N days, read from the rollups."""
+    # Whole days for both the counts and unique_students, so they describe the same records
+    cutoff_date = start_of_day((datetime.utcnow() - timedelta(days=days)).date())
     
-    results = db.query(
-        func.date(Attendance.timestamp).label('date'),
-        func.sum(case((Attendance.type == AttendanceType.IN, 1), else_=0)).label('in_count'),
-        func.sum(case((Attendance.type == AttendanceType.OUT, 1), else_=0)).label('out_count'),
-        func.count(func.distinct(Attendance.student_id)).label('unique_students')
-    ).filter(Attendance.timestamp > cutoff_date).group_by('date').order_by('date').all()
+    by_day = {}
+    for r in get_hourly_counts(db, cutoff_date):
+        counts = by_day.setdefault(r.bucket.date(), [0, 0])
+        counts[0] += r.in_count
+        counts[1] += r.out_count
+    
+    unique_students = get_daily_student_counts(db, cutoff_date.date(), date.today() + timedelta(days=1))
     
     return [
         DailyTrendData(
-            date=r.date,
-            in_count=int(r.in_count),
-            out_count=int(r.out_count),
-            unique_students=int(r.unique_students)
+            date=day,
+            in_count=counts[0],
+            out_count=counts[1],
+            unique_students=unique_students.get(day, 0)
         )
-        for r in results
+        for day, counts in sorted(by_day.items())
     ]
 
 
+@cached_analytics()
 def get_monthly_stats(db: Session, year: int, month: int) -> MonthlyStats:
     """Get attendance statistics for a specific month."""
     total_students = db.query(Student).count()
     
-    # Get daily unique student count
-    daily_attendance = db.query(
-        func.date(Attendance.timestamp).label('date'),
-        func.count(func.distinct(Attendance.student_id)).label('count')
-    ).filter(
-        and_(
-            func.year(Attendance.timestamp) == year,
-            func.month(Attendance.timestamp) == month,
-            Attendance.type == AttendanceType.IN
-        )
-    ).group_by('date').all()
+    # Daily count of distinct students with an IN, from the per-student daily rollup
+    month_start, month_end = month_range(year, month)
+    daily_attendance = get_daily_student_counts(db, month_start.date(), month_end.date(), in_only=True)
     
-    avg_daily_attendance = sum(r.count for r in daily_attendance) / len(daily_attendance) if daily_attendance else 0
+    avg_daily_attendance = sum(daily_attendance.values()) / len(daily_attendance) if daily_attendance else 0
     avg_percentage = (avg_daily_attendance / total_students * 100) if total_students > 0 else 0
     
     return MonthlyStats(
@@ -89,28 +89,29 @@ def get_monthly_stats(db: Session, year: int, month: int) -> MonthlyStats:
     )
 
 
+@cached_analytics()
 def get_late_out_students(db: Session, days: int = 30, min_count: int = 3) -> List[LateOutStudent]:
     """
     Get students who frequently exit late (after curfew).
-    Returns students with at least min_count late exits in the last N days.
+    Returns students with at least min_count late exits in the last N days,
+    read from the per-student daily rollup.
     """
-    cutoff_date = datetime.utcnow() - timedelta(days=days)
-    curfew_hour = int(settings.CURFEW_TIME.split(":")[0])
+    cutoff_day = (datetime.utcnow() - timedelta(days=days)).date()
+    late_count = func.sum(AttendanceDailyStudent.late_out_count)
     
     results = db.query(
         Student.student_id,
         func.concat(Student.first_name, ' ', Student.last_name).label('student_name'),
-        func.count(Attendance.attendance_id).label('late_count'),
-        func.max(Attendance.timestamp).label('last_late_time')
-    ).join(Attendance).filter(
+        late_count.label('late_count'),
+        func.max(AttendanceDailyStudent.last_late_out).label('last_late_time')
+    ).join(AttendanceDailyStudent).filter(
         and_(
-            Attendance.timestamp > cutoff_date,
-            Attendance.type == AttendanceType.OUT,
-            extract('hour', Attendance.timestamp) >= curfew_hour
+            AttendanceDailyStudent.day >= cutoff_day,
+            AttendanceDailyStudent.late_out_count > 0
         )
     ).group_by(Student.student_id, 'student_name').having(
-        func.count(Attendance.attendance_id) >= min_count
-    ).order_by(func.count(Attendance.attendance_id).desc()).all()
+        late_count >= min_count
+    ).order_by(late_count.desc()).all()
     
     return [
         LateOutStudent(
@@ -127,6 +128,7 @@ def get_late_out_students(db: Session, days: int = 30, min_count: int = 3) -> Li
 # MESS ANALYTICS
 # =====================================================
 
+@cached_analytics(ttl_seconds=600)
 def get_meal_utilization(db: Session, days: int = 30) -> List[MealUtilization]:
     """Analyze meal utilization patterns over the last N days."""
     cutoff_date = date.today() - timedelta(days=days)
@@ -192,6 +194,7 @@ def predict_meal_demand(db: Session, target_date: date, meal_time: MealTime) ->
 # OCCUPANCY ANALYTICS
 # =====================================================
 
+@cached_analytics(ttl_seconds=60)  # Shown as real-time, so keep it short
 def get_occupancy_by_block(db: Session) -> List[OccupancyData]:
     """Get current hostel occupancy by block."""
     results = db.query(
@@ -238,14 +241,11 @@ def detect_anomalies(db: Session) -> List[AnomalyData]:
     long_out_students = db.query(
         Student.student_id,
         func.concat(Student.first_name, ' ', Student.last_name).label('name'),
-        Attendance.timestamp
-    ).join(Attendance).filter(
+        AttendanceStatus.last_timestamp.label('timestamp')
+    ).join(AttendanceStatus).filter(
         and_(
-            Attendance.type == AttendanceType.OUT,
-            Attendance.timestamp < cutoff_24h,
-            Attendance.attendance_id.in_(
-                db.query(func.max(Attendance.attendance_id)).group_by(Attendance.student_id)
-            )
+            AttendanceStatus.status == AttendanceType.OUT,
+            AttendanceStatus.last_timestamp < cutoff_24h
         )
     ).all()
     
@@ -262,14 +262,15 @@ def detect_anomalies(db: Session) -> List[AnomalyData]:
         )
     
     # Anomaly 2: Students with no attendance in past 7 days
+    # (their latest record is the one in ATTENDANCE_STATUS)
     cutoff_7d = now - timedelta(days=7)
     absent_students = db.query(
         Student.student_id,
         func.concat(Student.first_name, ' ', Student.last_name).label('name')
-    ).outerjoin(Attendance).group_by(Student.student_id, 'name').having(
+    ).outerjoin(AttendanceStatus).filter(
         or_(
-            func.max(Attendance.timestamp) < cutoff_7d,
-            func.max(Attendance.timestamp).is_(None)
+            AttendanceStatus.last_timestamp < cutoff_7d,
+            AttendanceStatus.student_id.is_(None)
         )
     ).all()
     
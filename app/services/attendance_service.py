@@ -2,9 +2,17 @@ from datetime import datetime, timedelta, date
 from typing import Optional, List
 from sqlalchemy.orm import Session
 from sqlalchemy import func, and_, desc
-from app.models import Attendance, AttendanceType, Student, Violation, ViolationType, ViolationSeverity
+from app.models import (
+    Attendance, AttendanceType, AttendanceStatus, AttendanceDailyStudent, Student, Violation,
+    ViolationType, ViolationSeverity
+)
 from app.schemas import AttendanceStats
 from app.config import get_settings
+from app.database import upsert
+from app.services.dashboard_service import invalidate_dashboard
+from app.services.event_hub import event_hub
+from app.services.rollup_service import record_rollups
+from app.services.date_range import days_range, month_range, in_range
 
 settings = get_settings()
 
@@ -16,18 +24,138 @@ def get_last_attendance(db: Session, student_id: int) -> Optional[Attendance]:
     ).order_by(desc(Attendance.timestamp)).first()
 
 
+def get_current_status(db: Session, student_id: int) -> Optional[AttendanceType]:
+    """
+    Get a student's current IN/OUT status.
+    Reads the maintained ATTENDANCE_STATUS row; falls back to the attendance
+    history only for students that have no status row yet.
+    """
+    current = db.get(AttendanceStatus, student_id)
+    if current:
+        return current.status
+    
+    last_attendance = get_last_attendance(db, student_id)
+    return last_attendance.type if last_attendance else None
+
+
+def get_current_statuses(db: Session, student_ids) -> dict:
+    """
+    Bulk variant of get_current_status: {student_id: AttendanceType} for
+    every given student that has any attendance. One query against
+    ATTENDANCE_STATUS, plus one grouped history query for students without a status row.
+    """
+    student_ids = set(student_ids)
+    if not student_ids:
+        return {}
+    
+    statuses = dict(
+        db.query(AttendanceStatus.student_id, AttendanceStatus.status).filter(
+            AttendanceStatus.student_id.in_(student_ids)
+        ).all()
+    )
+    
+    missing = student_ids - statuses.keys()
+    if missing:
+        latest = db.query(
+            Attendance.student_id,
+            func.max(Attendance.attendance_id).label('max_id')
+        ).filter(Attendance.student_id.in_(missing)).group_by(Attendance.student_id).subquery()
+        statuses.update(
+            db.query(Attendance.student_id, Attendance.type).join(
+                latest, Attendance.attendance_id == latest.c.max_id
+            ).all()
+        )
+    
+    return statuses
+
+
+def update_current_status(db: Session, records: List[Attendance]):
+    """
+    Upsert ATTENDANCE_STATUS for newly written attendance records.
+    Does not commit, so it joins the caller's transaction.
+    """
+    latest = {}
+    for record in records:
+        previous = latest.get(record.student_id)
+        if previous is None or record.timestamp >= previous.timestamp:
+            latest[record.student_id] = record
+    
+    upsert(
+        db,
+        AttendanceStatus,
+        [
+            {"student_id": r.student_id, "status": r.type, "last_timestamp": r.timestamp}
+            for r in latest.values()
+        ],
+        update_columns=("status", "last_timestamp")
+    )
+
+
+def attendance_event(record: Attendance, previous_type: Optional[AttendanceType]) -> dict:
+    """
+    Live-dashboard payload for a new attendance record.
+    Built before commit, since committing expires the ORM attributes.
+    """
+    return {
+        "attendance_id": record.attendance_id,
+        "student_id": record.student_id,
+        "type": record.type,
+        "previous_type": previous_type,
+        "timestamp": record.timestamp,
+        "location": record.location,
+        "remarks": record.remarks
+    }
+
+
+def violation_event(violation: Violation) -> dict:
+    """Live-dashboard payload for a created or resolved violation."""
+    return {
+        "violation_id": violation.violation_id,
+        "student_id": violation.student_id,
+        "violation_type": violation.violation_type,
+        "violation_date": violation.violation_date,
+        "severity": violation.severity,
+        "resolved": violation.resolved
+    }
+
+
+def rebuild_attendance_status(db: Session) -> int:
+    """Recompute ATTENDANCE_STATUS from the full attendance history. Returns rows written."""
+    latest = db.query(
+        Attendance.student_id,
+        func.max(Attendance.attendance_id).label('max_id')
+    ).group_by(Attendance.student_id).subquery()
+    
+    rows = db.query(Attendance.student_id, Attendance.type, Attendance.timestamp).join(
+        latest, Attendance.attendance_id == latest.c.max_id
+    ).all()
+    
+    db.query(AttendanceStatus).delete()
+    db.bulk_insert_mappings(AttendanceStatus, [
+        {"student_id": r.student_id, "status": r.type, "last_timestamp": r.timestamp}
+        for r in rows
+    ])
+    db.commit()
+    invalidate_dashboard()
+    event_hub.publish("resync", {})
+    return len(rows)
+
+
 def auto_detect_attendance_type(db: Session, student_id: int) -> AttendanceType:
     """
     Automatically determine if attendance should be IN or OUT.
     Logic: If last status was IN (or no record), next should be OUT.
            If last status was OUT, next should be IN.
     """
-    last_attendance = get_last_attendance(db, student_id)
-    
-    if not last_attendance:
+    return next_attendance_type(get_current_status(db, student_id))
+
+
+def next_attendance_type(current_status: Optional[AttendanceType]) -> AttendanceType:
+    """IN for students with no status or who are OUT; OUT for students who are IN."""
+    if not current_status:
         return AttendanceType.IN
     
-    return AttendanceType.OUT if last_attendance.type == AttendanceType.IN else AttendanceType.IN
+    return AttendanceType.OUT if current_status == AttendanceType.IN else AttendanceType.IN
 
 
 def check_duplicate_scan(db: Session, student_id: int, cooldown_minutes: int = 5) -> bool:
@@ -63,8 +191,18 @@ def mark_attendance(
         verified_by=verified_by
     )
     db.add(attendance)
+    db.flush()
+    db.refresh(attendance)  # Load the server-side timestamp
+    
+    # Usually already in the session from auto_detect_attendance_type
+    previous = db.get(AttendanceStatus, student_id)
+    event = attendance_event(attendance, previous.status if previous else None)
+    
+    update_current_status(db, [attendance])
+    record_rollups(db, [attendance])
     db.commit()
-    db.refresh(attendance)
+    invalidate_dashboard()
+    event_hub.publish("attendance", event)
     
     # Check for curfew violation
     check_curfew_violation(db, attendance)
@@ -74,13 +212,13 @@ def mark_attendance(
 
 
 
-def check_curfew_violation(db: Session, attendance: Attendance):
+def curfew_violation(attendance: Attendance) -> Optional[Violation]:
     """
-    Check for curfew violation when student goes IN after curfew.
-    This means they were OUT past curfew and are just returning.
+    The curfew violation for an IN scan after curfew (the student was out
+    past curfew and is just returning), or None. Not added to the session.
     """
     if attendance.type != AttendanceType.IN:
-        return
+        return None
     
     # Parse curfew time (e.g., "22:00")
     curfew_hour = int(settings.CURFEW_TIME.split(":")[0])
@@ -89,17 +227,31 @@ def check_curfew_violation(db: Session, attendance: Attendance):
     # Check if they're checking IN after curfew (meaning they were out past curfew)
     if attendance.timestamp.hour > curfew_hour or \
        (attendance.timestamp.hour == curfew_hour and attendance.timestamp.minute >= curfew_minute):
-        
-        # Create violation record
-        violation = Violation(
+        return Violation(
             student_id=attendance.student_id,
             violation_type=ViolationType.CURFEW,
             violation_date=attendance.timestamp.date(),
             description=f"Returned after curfew at {attendance.timestamp.strftime('%H:%M')}",
             severity=ViolationSeverity.HIGH
         )
-        db.add(violation)
-        db.commit()
+    return None
+
+
+def check_curfew_violation(db: Session, attendance: Attendance):
+    """
+    Check for curfew violation when student goes IN after curfew.
+    This means they were OUT past curfew and are just returning.
+    """
+    violation = curfew_violation(attendance)
+    if violation is None:
+        return
+    
+    db.add(violation)
+    db.flush()
+    event = violation_event(violation)
+    db.commit()
+    invalidate_dashboard()
+    event_hub.publish("violation", event)
 
 
 def detect_students_out_past_curfew(db: Session) -> List[dict]:
@@ -118,29 +270,19 @@ def detect_students_out_past_curfew(db: Session) -> List[dict]:
     if not is_night_time:
         return []
     
-    # Get all students whose last attendance is OUT
-    subquery = db.query(
-        Attendance.student_id,
-        func.max(Attendance.attendance_id).label('max_id')
-    ).group_by(Attendance.student_id).subquery()
-    
-    # Find students who are currently OUT
+    # Get all students whose current status is OUT
     students_out = db.query(
         Student,
-        Attendance
+        AttendanceStatus
     ).join(
-        Attendance,
-        Student.student_id == Attendance.student_id
-    ).join(
-        subquery,
-        and_(
-            Attendance.student_id == subquery.c.student_id,
-            Attendance.attendance_id == subquery.c.max_id,
-            Attendance.type == AttendanceType.OUT
-        )
+        AttendanceStatus,
+        Student.student_id == AttendanceStatus.student_id
+    ).filter(
+        AttendanceStatus.status == AttendanceType.OUT
     ).all()
     
     violations = []
+    created = []
     today = current_time.date()
     
     for student, last_out in students_out:
@@ -156,24 +298,30 @@ def detect_students_out_past_curfew(db: Session) -> List[dict]:
         
         if not existing:
             # Create new violation
-            hours_out = (current_time - last_out.timestamp).total_seconds() / 3600
+            hours_out = (current_time - last_out.last_timestamp).total_seconds() / 3600
             violation = Violation(
                 student_id=student.student_id,
                 violation_type=ViolationType.CURFEW,
                 violation_date=today,
-                description=f"Student out since {last_out.timestamp.strftime('%H:%M')}, hasn't returned by curfew ({settings.CURFEW_TIME})",
+                description=f"Student out since {last_out.last_timestamp.strftime('%H:%M')}, hasn't returned by curfew ({settings.CURFEW_TIME})",
                 severity=ViolationSeverity.HIGH
             )
             db.add(violation)
+            created.append(violation)
             violations.append({
                 'student_id': student.student_id,
                 'student_name': f"{student.first_name} {student.last_name}",
-                'last_out': last_out.timestamp,
+                'last_out': last_out.last_timestamp,
                 'hours_out': round(hours_out, 1)
             })
     
     if violations:
+        db.flush()
+        events = [violation_event(v) for v in created]
         db.commit()
+        invalidate_dashboard()
+        for event in events:
+            event_hub.publish("violation", event)
     
     return violations
 
@@ -186,48 +334,54 @@ def get_attendance_history(
     end_date: Optional[date] = None
 ) -> List[Attendance]:
     """Get attendance history for a student within date range."""
-    query = db.query(Attendance).filter(Attendance.student_id == student_id)
-    
-    if start_date:
-        query = query.filter(func.date(Attendance.timestamp) >= start_date)
-    if end_date:
-        query = query.filter(func.date(Attendance.timestamp) <= end_date)
+    return attendance_history_query(db, student_id, start_date, end_date).order_by(
+        desc(Attendance.timestamp)
+    ).all()
+
+
+def attendance_history_query(
+    db: Session,
+    student_id: int,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None
+):
+    """Unordered query for a student's attendance within a date range, for callers that paginate."""
+    start, end = days_range(start_date, end_date)
     
-    return query.order_by(desc(Attendance.timestamp)).all()
+    return db.query(Attendance).filter(
+        Attendance.student_id == student_id,
+        in_range(Attendance.timestamp, start, end)
+    )
 
 
 def calculate_attendance_stats(db: Session, student_id: int, year: int, month: int) -> AttendanceStats:
     """Calculate attendance statistics for a student for a specific month."""
     # Get all attendance records for the month
+    start, end = month_range(year, month)
     records = db.query(Attendance).filter(
-        and_(
-            Attendance.student_id == student_id,
-            func.year(Attendance.timestamp) == year,
-            func.month(Attendance.timestamp) == month
-        )
+        Attendance.student_id == student_id,
+        in_range(Attendance.timestamp, start, end)
     ).all()
     
     in_count = sum(1 for r in records if r.type == AttendanceType.IN)
     out_count = sum(1 for r in records if r.type == AttendanceType.OUT)
     
     # Get current status
-    last_attendance = get_last_attendance(db, student_id)
-    current_status = last_attendance.type.value if last_attendance else None
-    last_updated = last_attendance.timestamp if last_attendance else None
+    current = db.get(AttendanceStatus, student_id)
+    if current:
+        current_status = current.status.value
+        last_updated = current.last_timestamp
+    else:
+        last_attendance = get_last_attendance(db, student_id)
+        current_status = last_attendance.type.value if last_attendance else None
+        last_updated = last_attendance.timestamp if last_attendance else None
     
     # Calculate monthly percentage (days present / total days in month)
     from calendar import monthrange
     total_days = monthrange(year, month)[1]
     
-    # Count unique dates with IN records
-    unique_dates = db.query(func.date(Attendance.timestamp)).distinct().filter(
-        and_(
-            Attendance.student_id == student_id,
-            Attendance.type == AttendanceType.IN,
-            func.year(Attendance.timestamp) == year,
-            func.month(Attendance.timestamp) == month
-        )
-    ).count()
+    # Count unique dates with IN records (already loaded above)
+    unique_dates = len({r.timestamp.date() for r in records if r.type == AttendanceType.IN})
     
     monthly_percentage = (unique_dates / total_days) * 100
     
@@ -244,26 +398,20 @@ def calculate_attendance_stats(db: Session, student_id: int, year: int, month: i
 
 def get_students_by_status(db: Session, status: AttendanceType) -> List[Student]:
     """Get all students currently with a specific status (IN or OUT)."""
-    # Subquery to get latest attendance for each student
-    subquery = db.query(
-        Attendance.student_id,
-        func.max(Attendance.attendance_id).label('max_id')
-    ).group_by(Attendance.student_id).subquery()
-    
-    # Join to get students with the specified status
-    # We join Student -> Subquery -> Attendance to ensure we get the latest record
-    students = db.query(Student).join(
-        subquery,
-        Student.student_id == subquery.c.student_id
-    ).join(
-        Attendance,
-        and_(
-            Attendance.attendance_id == subquery.c.max_id,
-            Attendance.type == status
-        )
-    ).all()
+    return db.query(Student).join(
+        AttendanceStatus,
+        Student.student_id == AttendanceStatus.student_id
+    ).filter(AttendanceStatus.status == status).all()
+
+
+def count_students_by_status(db: Session) -> dict:
+    """Count students per current status, e.g. {AttendanceType.IN: 120, AttendanceType.OUT: 14}."""
+    counts = db.query(
+        AttendanceStatus.status,
+        func.count(AttendanceStatus.student_id)
+    ).group_by(AttendanceStatus.status).all()
     
-    return students
+    return {status: count for status, count in counts}
 
 
 def detect_frequent_absence(db: Session, days: int = 30, threshold: int = 10) -> List[Student]:
@@ -273,14 +421,14 @@ def detect_frequent_absence(db: Session, days: int = 30, threshold: int = 10) ->
     """
     cutoff_date = datetime.utcnow() - timedelta(days=days)
     
-    # Count days with OUT status
-    students = db.query(Student).join(Attendance).filter(
+    # Count days with OUT status from the per-student daily rollup
+    students = db.query(Student).join(AttendanceDailyStudent).filter(
         and_(
-            Attendance.timestamp > cutoff_date,
-            Attendance.type == AttendanceType.OUT
+            AttendanceDailyStudent.day >= cutoff_date.date(),
+            AttendanceDailyStudent.out_count > 0
         )
     ).group_by(Student.student_id).having(
-        func.count(func.distinct(func.date(Attendance.timestamp))) > threshold
+        func.count(AttendanceDailyStudent.day) > threshold
     ).all()
     
     return students
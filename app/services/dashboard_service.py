@@ -0,0 +1,119 @@
+import threading
+import time
+from datetime import date
+from typing import Optional
+from sqlalchemy import func, select, and_
+from sqlalchemy.orm import Session
+from app.models import (
+    Student, Room, RoomAssignment, Violation, OptOut, MealTime, AttendanceType, AttendanceStatus
+)
+from app.schemas import DashboardSummary
+from app.config import get_settings
+
+settings = get_settings()
+
+
+def compute_dashboard_summary(db: Session) -> DashboardSummary:
+    """Build the admin dashboard numbers in three queries."""
+    totals = db.execute(select(
+        select(func.count(Student.student_id)).scalar_subquery().label("students"),
+        select(func.count(Room.room_no)).scalar_subquery().label("rooms"),
+        select(func.count(func.distinct(RoomAssignment.room_no))).where(
+            RoomAssignment.is_active == True
+        ).scalar_subquery().label("occupied_rooms"),
+        select(func.count(Violation.violation_id)).where(
+            Violation.resolved == False
+        ).scalar_subquery().label("pending_violations"),
+    )).one()
+
+    # Students currently IN / OUT
+    status_counts = dict(
+        db.query(AttendanceStatus.status, func.count()).group_by(AttendanceStatus.status).all()
+    )
+
+    # Today's opt-outs (opt='N') for every meal in one grouped query
+    opted_out = dict(
+        db.query(OptOut.meal_time, func.count()).filter(
+            and_(
+                OptOut.date == date.today(),
+                OptOut.opt == 'N'
+            )
+        ).group_by(OptOut.meal_time).all()
+    )
+
+    meal_summary = {
+        meal.value: {
+            "expected": totals.students - opted_out.get(meal, 0),
+            "opted_out": opted_out.get(meal, 0)
+        }
+        for meal in MealTime
+    }
+
+    return DashboardSummary(
+        total_students=totals.students,
+        present_students=status_counts.get(AttendanceType.IN, 0),
+        out_students=status_counts.get(AttendanceType.OUT, 0),
+        total_rooms=totals.rooms,
+        occupied_rooms=totals.occupied_rooms or 0,
+        pending_violations=totals.pending_violations,
+        today_meal_attendance=meal_summary
+    )
+
+
+class DashboardCache:
+    """
+    Shared dashboard snapshot.
+    Every admin tab polls the dashboard, so the summary is computed at most
+    once per TTL and concurrent requests wait for the one refresh in flight
+    instead of each querying the database. Writes that change the numbers
+    call invalidate(); a refresh that started before an invalidation is not
+    cached.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._snapshot: Optional[DashboardSummary] = None
+        self._expires_at = 0.0
+        self._day: Optional[date] = None
+        self._version = 0
+
+    def _fresh(self) -> bool:
+        return (
+            self._snapshot is not None
+            and time.monotonic() < self._expires_at
+            and self._day == date.today()  # meal counts are per day
+        )
+
+    def get(self, db: Session) -> DashboardSummary:
+        if self._fresh():
+            return self._snapshot
+
+        with self._lock:
+            # Another request may have refreshed while we waited
+            if self._fresh():
+                return self._snapshot
+
+            version = self._version
+            snapshot = compute_dashboard_summary(db)
+            if version == self._version:
+                self._snapshot = snapshot
+                self._expires_at = time.monotonic() + self.ttl_seconds
+                self._day = date.today()
+            return snapshot
+
+    def invalidate(self):
+        self._version += 1
+        self._snapshot = None
+
+
+dashboard_cache = DashboardCache(ttl_seconds=settings.DASHBOARD_CACHE_TTL_SECONDS)
+
+
+def get_dashboard_summary(db: Session) -> DashboardSummary:
+    return dashboard_cache.get(db)
+
+
+def invalidate_dashboard():
+    """Drop the cached dashboard snapshot after a write that affects it."""
+    dashboard_cache.invalidate()
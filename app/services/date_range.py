@@ -0,0 +1,42 @@
+from datetime import datetime, date, timedelta
+from typing import Optional, Tuple
+from sqlalchemy import and_, true
+
+# Filters on DATE(col), YEAR(col) or MONTH(col) can't use an index on col.
+# These helpers turn calendar filters into half-open [start, end) ranges on
+# the raw column instead, so MySQL can range-scan idx_attendance_timestamp
+# or (student_id, timestamp).
+
+
+def start_of_day(day: date) -> datetime:
+    return datetime.combine(day, datetime.min.time())
+
+
+def day_range(day: date) -> Tuple[datetime, datetime]:
+    """[00:00 of day, 00:00 of the next day)."""
+    start = start_of_day(day)
+    return start, start + timedelta(days=1)
+
+
+def days_range(start_date: Optional[date], end_date: Optional[date]) -> Tuple[Optional[datetime], Optional[datetime]]:
+    """Timestamp range covering the inclusive dates start_date..end_date; either end may be open (None)."""
+    start = start_of_day(start_date) if start_date else None
+    end = start_of_day(end_date) + timedelta(days=1) if end_date else None
+    return start, end
+
+
+def month_range(year: int, month: int) -> Tuple[datetime, datetime]:
+    """[first day of the month, first day of the next month)."""
+    start = datetime(year, month, 1)
+    end = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+    return start, end
+
+
+def in_range(column, start: Optional[datetime], end: Optional[datetime]):
+    """SQL condition start <= column < end, skipping an open bound."""
+    conditions = []
+    if start is not None:
+        conditions.append(column >= start)
+    if end is not None:
+        conditions.append(column < end)
+    return and_(*conditions) if conditions else true()
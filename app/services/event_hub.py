@@ -0,0 +1,69 @@
+import asyncio
+import json
+from datetime import date, datetime
+from enum import Enum
+from typing import Optional, Set
+
+SUBSCRIBER_QUEUE_SIZE = 256
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+class EventHub:
+    """
+    In-process fan-out of live updates to connected dashboards.
+
+    Writes happen in sync route handlers (thread pool) and services, so
+    publish() is thread-safe: it hands the event to the event loop, which
+    copies it into every subscriber's bounded queue. A subscriber that
+    falls too far behind has its backlog replaced by a single "resync"
+    event, telling the client to reload instead of slowing everyone down.
+    Only works within one server process; events are not persisted.
+    """
+
+    def __init__(self, queue_size: int = SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._subscribers: Set[asyncio.Queue] = set()
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+
+    def subscribe(self) -> asyncio.Queue:
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def publish(self, event: str, data: dict):
+        """Queue an event for every subscriber. Safe to call from any thread; a no-op with no listeners."""
+        if self._loop is None or not self._subscribers or self._loop.is_closed():
+            return
+        message = f"event: {event}\ndata: {json.dumps(data, default=_default)}\n\n"
+        self._loop.call_soon_threadsafe(self._fan_out, message)
+
+    def _fan_out(self, message: str):
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait("event: resync\ndata: {}\n\n")
+
+
+event_hub = EventHub()
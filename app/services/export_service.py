@@ -0,0 +1,254 @@
+import io
+import json
+import zipfile
+from datetime import datetime, date, timedelta
+from enum import Enum
+from itertools import groupby
+from typing import Optional
+from sqlalchemy import select
+from app.database import SessionLocal
+from app.models import Attendance, OptOut, Violation, Student
+from app.services.date_range import days_range, in_range
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    HAS_ARROW = True
+except ImportError:
+    HAS_ARROW = False
+
+EXPORT_BATCH_SIZE = 5000
+
+
+class ExportDataset:
+    """A table that can be exported: its columns, and which date column bounds and partitions it."""
+
+    def __init__(self, name: str, model, date_field: str, columns: list):
+        self.name = name
+        self.model = model
+        self.columns = columns  # (name, SQL expression, kind); kind is int/str/bool/date/timestamp
+        self.date_field = date_field
+        self.date_column = next(expr for field, expr, _ in columns if field == date_field)
+
+    def query(self, start_date: date, end_date: date):
+        start, end = days_range(start_date, end_date)
+        if self.date_column.type.python_type is date:
+            start, end = start.date(), end.date()
+        return select(
+            *[expr.label(name) for name, expr, _ in self.columns]
+        ).select_from(self.model).outerjoin(
+            Student, Student.student_id == self.model.student_id
+        ).where(
+            in_range(self.date_column, start, end)
+        ).order_by(self.date_column)
+
+
+DATASETS = {
+    "attendance": ExportDataset("attendance", Attendance, "timestamp", [
+        ("attendance_id", Attendance.attendance_id, "int"),
+        ("student_id", Attendance.student_id, "int"),
+        ("roll_number", Student.roll_number, "str"),
+        ("timestamp", Attendance.timestamp, "timestamp"),
+        ("type", Attendance.type, "str"),
+        ("location", Attendance.location, "str"),
+        ("remarks", Attendance.remarks, "str"),
+    ]),
+    "opt_out": ExportDataset("opt_out", OptOut, "date", [
+        ("opt_id", OptOut.opt_id, "int"),
+        ("student_id", OptOut.student_id, "int"),
+        ("roll_number", Student.roll_number, "str"),
+        ("date", OptOut.date, "date"),
+        ("meal_time", OptOut.meal_time, "str"),
+        ("opt", OptOut.opt, "str"),
+        ("reason", OptOut.reason, "str"),
+    ]),
+    "violations": ExportDataset("violations", Violation, "violation_date", [
+        ("violation_id", Violation.violation_id, "int"),
+        ("student_id", Violation.student_id, "int"),
+        ("roll_number", Student.roll_number, "str"),
+        ("violation_date", Violation.violation_date, "date"),
+        ("violation_type", Violation.violation_type, "str"),
+        ("severity", Violation.severity, "str"),
+        ("resolved", Violation.resolved, "bool"),
+        ("resolved_at", Violation.resolved_at, "timestamp"),
+        ("description", Violation.description, "str"),
+    ]),
+}
+
+
+def _plain(value):
+    return value.value if isinstance(value, Enum) else value
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+class _DrainableSink(io.RawIOBase):
+    """
+    Write-only, non-seekable buffer whose contents can be taken out as they
+    are produced. tell() keeps counting absolute bytes written, which the
+    Parquet and zip writers use for their offsets.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._buffer.extend(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+class NDJSONWriter:
+    extension = "ndjson"
+    media_type = "application/x-ndjson"
+
+    def __init__(self, dataset: ExportDataset):
+        pass
+
+    def begin(self) -> bytes:
+        return b""
+
+    def write(self, rows: list) -> bytes:
+        return "".join(json.dumps(row, default=_json_default) + "\n" for row in rows).encode()
+
+    def end(self) -> bytes:
+        return b""
+
+
+class _ArrowWriterBase:
+    def __init__(self, dataset: ExportDataset):
+        types = {
+            "int": pa.int64(),
+            "str": pa.string(),
+            "bool": pa.bool_(),
+            "date": pa.date32(),
+            "timestamp": pa.timestamp("s"),
+        }
+        self.schema = pa.schema([(name, types[kind]) for name, _, kind in dataset.columns])
+        self.sink = _DrainableSink()
+        self.writer = None
+
+    def begin(self) -> bytes:
+        self.writer = self._open()
+        return self.sink.drain()
+
+    def write(self, rows: list) -> bytes:
+        self._write_table(pa.Table.from_pylist(rows, schema=self.schema))
+        return self.sink.drain()
+
+    def end(self) -> bytes:
+        self.writer.close()
+        return self.sink.drain()
+
+
+class ArrowStreamWriter(_ArrowWriterBase):
+    extension = "arrows"
+    media_type = "application/vnd.apache.arrow.stream"
+
+    def _open(self):
+        return pa.ipc.new_stream(self.sink, self.schema)
+
+    def _write_table(self, table):
+        self.writer.write_table(table)
+
+
+class ParquetWriter(_ArrowWriterBase):
+    """One Parquet row group per DB batch; only the footer waits for the end of the export."""
+    extension = "parquet"
+    media_type = "application/vnd.apache.parquet"
+
+    def _open(self):
+        return pq.ParquetWriter(self.sink, self.schema, compression="snappy")
+
+    def _write_table(self, table):
+        self.writer.write_table(table)
+
+
+FORMATS = {
+    "ndjson": NDJSONWriter,
+    "arrow": ArrowStreamWriter,
+    "parquet": ParquetWriter,
+}
+ARROW_FORMATS = {"arrow", "parquet"}
+
+PARTITIONS = {
+    "day": lambda value: value.strftime("%Y-%m-%d"),
+    "month": lambda value: value.strftime("%Y-%m"),
+}
+
+
+def _iter_batches(dataset: ExportDataset, start_date: date, end_date: date):
+    """Yield lists of row dicts from a server-side cursor, in its own session."""
+    db = SessionLocal()
+    try:
+        result = db.execute(
+            dataset.query(start_date, end_date),
+            execution_options={"stream_results": True, "yield_per": EXPORT_BATCH_SIZE}
+        )
+        for batch in result.mappings().partitions():
+            yield [{k: _plain(v) for k, v in row.items()} for row in batch]
+    finally:
+        db.close()
+
+
+def stream_export(dataset: ExportDataset, fmt: str, start_date: date, end_date: date):
+    """Yield the export as one file in the requested format, batch by batch."""
+    writer = FORMATS[fmt](dataset)
+    yield writer.begin()
+    for rows in _iter_batches(dataset, start_date, end_date):
+        yield writer.write(rows)
+    yield writer.end()
+
+
+def stream_partitioned_export(dataset: ExportDataset, fmt: str, start_date: date, end_date: date, partition: str):
+    """
+    Yield a zip with one file per day or month, laid out as
+    <dataset>/<date column>=<key>/part-0.<ext> so it can be read as a
+    partitioned dataset. Rows arrive ordered by the date column, so each
+    partition is written start to finish before the next one begins.
+    """
+    date_field = dataset.date_field
+    partition_key = PARTITIONS[partition]
+    compression = zipfile.ZIP_STORED if fmt in ARROW_FORMATS else zipfile.ZIP_DEFLATED
+
+    sink = _DrainableSink()
+    archive = zipfile.ZipFile(sink, mode="w", compression=compression)
+    entry = writer = None
+    current_key: Optional[str] = None
+
+    for rows in _iter_batches(dataset, start_date, end_date):
+        for key, group in groupby(rows, key=lambda row: partition_key(row[date_field])):
+            if key != current_key:
+                if entry is not None:
+                    entry.write(writer.end())
+                    entry.close()
+                writer = FORMATS[fmt](dataset)
+                entry = archive.open(
+                    f"{dataset.name}/{date_field}={key}/part-0.{writer.extension}", mode="w", force_zip64=True
+                )
+                entry.write(writer.begin())
+                current_key = key
+            entry.write(writer.write(list(group)))
+        yield sink.drain()
+
+    if entry is not None:
+        entry.write(writer.end())
+        entry.close()
+    archive.close()
+    yield sink.drain()
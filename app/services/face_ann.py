@@ -0,0 +1,118 @@
+from typing import List, Optional, Tuple
+import numpy as np
+
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE_SIZE = 20000
+
+
+def _squared_distances(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Pairwise squared Euclidean distances between the rows of a and b."""
+    sq = (a ** 2).sum(axis=1)[:, None] + (b ** 2).sum(axis=1)[None, :] - 2 * a @ b.T
+    return np.maximum(sq, 0)
+
+
+class IVFIndex:
+    """
+    Inverted-file approximate nearest-neighbour index over face encodings.
+
+    Vectors are bucketed under their nearest k-means centroid. A query
+    scans only the nprobe closest buckets, scores the candidates cheaply
+    on a random projection of the encodings, and re-ranks the best top_k
+    with exact 128-d distances. nprobe and top_k trade recall for latency.
+    """
+
+    def __init__(self, centroids: np.ndarray, projection: np.ndarray,
+                 assignments: np.ndarray, projected: np.ndarray,
+                 lists: Optional[List[np.ndarray]] = None):
+        self.centroids = centroids
+        self.projection = projection
+        self.assignments = assignments
+        self.projected = projected
+        self.lists = lists if lists is not None else self._build_lists(assignments, len(centroids))
+
+    @staticmethod
+    def _build_lists(assignments: np.ndarray, nlist: int) -> List[np.ndarray]:
+        order = np.argsort(assignments, kind="stable")
+        bounds = np.searchsorted(assignments[order], np.arange(nlist + 1))
+        return [order[bounds[i]:bounds[i + 1]] for i in range(nlist)]
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, encodings: np.ndarray, nlist: int, projection_dim: int, seed: int = 0) -> "IVFIndex":
+        """Train centroids with k-means on (a sample of) the encodings and bucket every vector."""
+        rng = np.random.default_rng(seed)
+        nlist = max(1, min(nlist, len(encodings)))
+
+        sample = encodings
+        if len(encodings) > KMEANS_SAMPLE_SIZE:
+            sample = encodings[rng.choice(len(encodings), KMEANS_SAMPLE_SIZE, replace=False)]
+
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(KMEANS_ITERATIONS):
+            labels = _squared_distances(sample, centroids).argmin(axis=1)
+            for c in range(nlist):
+                members = sample[labels == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+
+        # Johnson-Lindenstrauss style projection used for cheap candidate scoring
+        dim = encodings.shape[1]
+        projection = (rng.standard_normal((dim, projection_dim)) / np.sqrt(projection_dim)).astype(np.float32)
+
+        assignments = _squared_distances(encodings, centroids).argmin(axis=1)
+        projected = (encodings @ projection).astype(np.float32)
+        return cls(centroids, projection, assignments, projected)
+
+    def with_vector(self, encoding: np.ndarray, position: int) -> "IVFIndex":
+        """
+        Return a copy of the index with one new vector (stored at the given
+        gallery row) bucketed under its nearest centroid. Copy-on-write keeps
+        concurrent searches on the old index consistent.
+        """
+        cluster = int(_squared_distances(encoding.reshape(1, -1), self.centroids).argmin())
+        lists = list(self.lists)
+        lists[cluster] = np.append(lists[cluster], position)
+        return IVFIndex(
+            self.centroids,
+            self.projection,
+            np.append(self.assignments, cluster),
+            np.vstack([self.projected, (encoding.reshape(1, -1) @ self.projection).astype(np.float32)]),
+            lists
+        )
+
+    def search(self, gallery: np.ndarray, probe: np.ndarray, nprobe: int, top_k: int) -> Optional[Tuple[int, float]]:
+        """Return (row, exact_distance) of the best candidate, or None if the probed buckets are empty."""
+        nprobe = max(1, min(nprobe, self.nlist))
+        centroid_dist = ((self.centroids - probe) ** 2).sum(axis=1)
+        clusters = np.argpartition(centroid_dist, nprobe - 1)[:nprobe]
+        candidates = np.concatenate([self.lists[c] for c in clusters])
+        if len(candidates) == 0:
+            return None
+
+        if len(candidates) > top_k:
+            approx = ((self.projected[candidates] - probe @ self.projection) ** 2).sum(axis=1)
+            candidates = candidates[np.argpartition(approx, top_k - 1)[:top_k]]
+
+        exact = np.linalg.norm(gallery[candidates] - probe, axis=1)
+        best = int(np.argmin(exact))
+        return int(candidates[best]), float(exact[best])
+
+    def to_arrays(self) -> dict:
+        return {
+            "ivf_centroids": self.centroids,
+            "ivf_projection": self.projection,
+            "ivf_assignments": self.assignments,
+            "ivf_projected": self.projected,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays) -> "IVFIndex":
+        return cls(
+            arrays["ivf_centroids"],
+            arrays["ivf_projection"],
+            arrays["ivf_assignments"],
+            arrays["ivf_projected"],
+        )
@@ -0,0 +1,516 @@
+import os
+import tempfile
+import threading
+import time
+from typing import List, NamedTuple, Optional, Tuple
+import numpy as np
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+from app.config import get_settings
+from app.models import StudentFace
+from app.services.face_ann import IVFIndex
+
+try:
+    import cv2
+    HAS_CV2 = True
+except ImportError:
+    HAS_CV2 = False
+
+settings = get_settings()
+
+ENCODING_SIZE = 128
+HISTOGRAM_BINS = [8, 8, 8]
+HISTOGRAM_SIZE = 8 * 8 * 8
+
+
+def histogram_from_image(img: np.ndarray) -> np.ndarray:
+    """Compute the normalized 8x8x8 BGR histogram of a decoded image as a flat float32 vector."""
+    hist = cv2.calcHist([img], [0, 1, 2], None, HISTOGRAM_BINS, [0, 256, 0, 256, 0, 256])
+    cv2.normalize(hist, hist)
+    return hist.astype(np.float32).ravel()
+
+
+def compute_histogram(image_data: bytes) -> Optional[np.ndarray]:
+    """
+    Decode an image and compute its fallback-matcher histogram.
+    Returns None if OpenCV is unavailable or the image can't be decoded.
+    """
+    if not HAS_CV2 or not image_data:
+        return None
+
+    img = cv2.imdecode(np.frombuffer(image_data, np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        return None
+
+    return histogram_from_image(img)
+
+
+def encoding_to_bytes(encoding) -> bytes:
+    """Serialize a face encoding for the StudentFace.encoding_vector column."""
+    return np.asarray(encoding, dtype=np.float32).tobytes()
+
+
+def histogram_to_bytes(hist: np.ndarray) -> bytes:
+    """Serialize a histogram for the StudentFace.histogram column."""
+    return np.asarray(hist, dtype=np.float32).tobytes()
+
+
+def _center_rows(hists: np.ndarray) -> np.ndarray:
+    """
+    Mean-center and L2-normalize each row so that a dot product equals
+    OpenCV's HISTCMP_CORREL correlation.
+    """
+    centered = hists - hists.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(centered, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (centered / norms).astype(np.float32)
+
+
+def _table_signature(db: Session) -> Tuple[int, int]:
+    """(row count, max face_id) of STUDENT_FACES; changes whenever faces are added or removed."""
+    count, max_id = db.query(func.count(StudentFace.face_id), func.max(StudentFace.face_id)).one()
+    return int(count or 0), int(max_id or 0)
+
+
+class _IndexState(NamedTuple):
+    encodings: np.ndarray
+    face_ids: np.ndarray
+    student_ids: np.ndarray
+    ivf: Optional[IVFIndex]
+
+
+def _empty_state() -> _IndexState:
+    return _IndexState(
+        np.empty((0, ENCODING_SIZE), dtype=np.float32),
+        np.empty(0, dtype=np.int64),
+        np.empty(0, dtype=np.int64),
+        None
+    )
+
+
+class FaceIndex:
+    """
+    Process-wide in-memory index of face encodings.
+    Keeps all known encodings stacked in one (N, 128) matrix with
+    parallel face_id / student_id arrays so a probe is matched with a
+    single vectorized distance computation instead of a Python loop.
+
+    In "ivf" mode, galleries of at least ivf_min_size faces are searched
+    through an approximate IVFIndex instead, trained on a background thread
+    so searches never wait for k-means. The whole index is persisted to
+    index_path so other workers and restarts can skip the rebuild.
+
+    Each worker process has its own copy. Faces registered through another
+    worker are picked up by refresh(), which compares the table signature
+    at most every refresh_seconds and appends the new rows.
+    """
+
+    def __init__(self, mode: str = "exact", index_path: str = "", ivf_min_size: int = 5000,
+                 nlist: int = 0, nprobe: int = 8, top_k: int = 32, projection_dim: int = 32,
+                 refresh_seconds: float = 5.0):
+        if mode not in ("exact", "ivf"):
+            raise ValueError(f"Unknown face index mode: {mode}")
+        self.mode = mode
+        self.index_path = index_path
+        self.ivf_min_size = ivf_min_size
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.top_k = top_k
+        self.projection_dim = projection_dim
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._loaded = False
+        # Replaced as a whole so readers always see consistent arrays
+        self._state = _empty_state()
+        self._signature = (0, 0)  # (row count, max face_id) of STUDENT_FACES the state reflects
+        self._next_check = 0.0
+        self._ivf_trained_size = 0
+        self._training: Optional[threading.Thread] = None
+
+    @property
+    def size(self) -> int:
+        return len(self._state.face_ids)
+
+    def _table_signature(self, db: Session) -> Tuple[int, int]:
+        return _table_signature(db)
+
+    @staticmethod
+    def _fetch_rows(db: Session, after_face_id: int = 0):
+        return db.query(
+            StudentFace.face_id, StudentFace.student_id,
+            StudentFace.encoding_vector, StudentFace.encoding
+        ).filter(
+            or_(StudentFace.encoding_vector.isnot(None), StudentFace.encoding.isnot(None)),
+            StudentFace.face_id > after_face_id
+        ).order_by(StudentFace.face_id).all()
+
+    @staticmethod
+    def _rows_to_arrays(rows):
+        """
+        Stack stored encodings into the gallery matrix. Binary rows are joined
+        into one buffer (a single copy of the blobs) and decoded with one
+        frombuffer call; rows not yet migrated fall back to the JSON column.
+        """
+        binary = [r for r in rows if r.encoding_vector]
+        legacy = [r for r in rows if not r.encoding_vector and r.encoding]
+
+        encodings = np.frombuffer(
+            b"".join(r.encoding_vector for r in binary), dtype=np.float32
+        ).reshape(-1, ENCODING_SIZE)
+        if legacy:
+            encodings = np.vstack([encodings, np.array([r.encoding for r in legacy], dtype=np.float32)])
+
+        ordered = binary + legacy
+        return (
+            encodings,
+            np.array([r.face_id for r in ordered], dtype=np.int64),
+            np.array([r.student_id for r in ordered], dtype=np.int64),
+        )
+
+    def load(self, db: Session):
+        """
+        (Re)build the index, reading only the encoding columns.
+        A persisted index whose table signature still matches is reused as is;
+        one that is merely behind is caught up with the rows added since.
+        """
+        signature = self._table_signature(db)
+        state, saved_signature = self._read_file()
+        changed = True
+
+        if state is not None and saved_signature == signature:
+            changed = False
+        elif state is not None and signature[1] > saved_signature[1]:
+            new_rows = db.query(func.count(StudentFace.face_id)).filter(
+                StudentFace.face_id > saved_signature[1]
+            ).scalar()
+            if saved_signature[0] + new_rows == signature[0]:
+                encodings, face_ids, student_ids = self._rows_to_arrays(self._fetch_rows(db, saved_signature[1]))
+                state = state._replace(
+                    encodings=np.vstack([state.encodings, encodings]),
+                    face_ids=np.concatenate([state.face_ids, face_ids]),
+                    student_ids=np.concatenate([state.student_ids, student_ids]),
+                    ivf=None
+                )
+            else:
+                state = None
+        else:
+            state = None
+
+        if state is None:
+            state = _IndexState(*self._rows_to_arrays(self._fetch_rows(db)), None)
+
+        with self._lock:
+            self._state = state
+            self._signature = signature
+            self._next_check = time.monotonic() + self.refresh_seconds
+            self._ivf_trained_size = len(state.face_ids) if state.ivf is not None else 0
+            self._loaded = True
+            training = self._maybe_train_ivf()
+
+        if changed and not training:
+            self.save()
+
+    def refresh(self, db: Session):
+        """
+        Catch up with faces registered by other workers. Costs one
+        count/max query at most every refresh_seconds; new rows are
+        appended, and anything else (deletions) triggers a full reload.
+        """
+        if not self._loaded:
+            self.load(db)
+            return
+        if time.monotonic() < self._next_check:
+            return
+
+        signature = self._table_signature(db)
+        known = self._signature
+        self._next_check = time.monotonic() + self.refresh_seconds
+        if signature == known:
+            return
+
+        new_rows = db.query(func.count(StudentFace.face_id)).filter(
+            StudentFace.face_id > known[1]
+        ).scalar() if signature[1] > known[1] else 0
+        if known[0] + new_rows != signature[0]:
+            self.load(db)
+            return
+
+        rows = self._fetch_rows(db, known[1])
+
+        encodings, face_ids, student_ids = self._rows_to_arrays(rows)
+        with self._lock:
+            if self._signature != known:
+                # A concurrent add() or refresh() got here first; check again next call
+                self._next_check = 0.0
+                return
+            self._append(encodings, face_ids, student_ids)
+            self._signature = signature
+
+    def _append(self, encodings: np.ndarray, face_ids: np.ndarray, student_ids: np.ndarray):
+        """Add rows to the current state. Caller holds the lock."""
+        state = self._state
+        ivf = state.ivf
+        for offset, vector in enumerate(encodings):
+            ivf = ivf.with_vector(vector, len(state.face_ids) + offset) if ivf is not None else None
+        self._state = _IndexState(
+            np.vstack([state.encodings, encodings]),
+            np.concatenate([state.face_ids, face_ids]),
+            np.concatenate([state.student_ids, student_ids]),
+            ivf
+        )
+        self._maybe_train_ivf()
+
+    def _maybe_train_ivf(self) -> bool:
+        """
+        Start (re)training the IVF structure in the background when it is
+        missing or the gallery has doubled. Caller holds the lock. Returns
+        True if training is running.
+        """
+        if self._training is not None:
+            return True
+        state = self._state
+        size = len(state.face_ids)
+        if self.mode != "ivf" or size < self.ivf_min_size:
+            return False
+        if state.ivf is not None and size < 2 * self._ivf_trained_size:
+            return False
+
+        self._training = threading.Thread(target=self._train_ivf, args=(state,), name="face-ivf-train", daemon=True)
+        self._training.start()
+        return True
+
+    def _train_ivf(self, snapshot: _IndexState):
+        """Train on a snapshot, then swap the result in, adding any rows appended meanwhile."""
+        size = len(snapshot.face_ids)
+        try:
+            ivf = IVFIndex.build(snapshot.encodings, self.nlist or int(np.sqrt(size)), self.projection_dim)
+        except Exception as e:
+            print(f"WARNING: Face IVF training failed: {e}")
+            with self._lock:
+                self._training = None
+            return
+
+        with self._lock:
+            self._training = None
+            state = self._state
+            if len(state.face_ids) < size or not np.array_equal(state.face_ids[:size], snapshot.face_ids):
+                # The index was reloaded while training; retrain on the new state
+                self._maybe_train_ivf()
+                return
+            for row in range(size, len(state.face_ids)):
+                ivf = ivf.with_vector(state.encodings[row], row)
+            self._state = state._replace(ivf=ivf)
+            self._ivf_trained_size = size
+            self._maybe_train_ivf()
+        self.save()
+
+    def wait_for_training(self, timeout: Optional[float] = None):
+        """Block until background IVF training (if any) has finished."""
+        while True:
+            thread = self._training
+            if thread is None:
+                return
+            thread.join(timeout)
+            if timeout is not None:
+                return
+
+    def _read_file(self) -> Tuple[Optional[_IndexState], Tuple[int, int]]:
+        if not self.index_path or not os.path.exists(self.index_path):
+            return None, (0, 0)
+        try:
+            with np.load(self.index_path) as data:
+                ivf = None
+                if self.mode == "ivf" and "ivf_centroids" in data.files:
+                    ivf = IVFIndex.from_arrays(data)
+                state = _IndexState(data["encodings"], data["face_ids"], data["student_ids"], ivf)
+                return state, (int(data["signature"][0]), int(data["signature"][1]))
+        except Exception as e:
+            print(f"WARNING: Ignoring unreadable face index file {self.index_path}: {e}")
+            return None, (0, 0)
+
+    def save(self):
+        """Persist the index atomically so concurrent workers never read a partial file."""
+        if not self.index_path:
+            return
+        state, signature = self._state, self._signature
+        arrays = {
+            "encodings": state.encodings,
+            "face_ids": state.face_ids,
+            "student_ids": state.student_ids,
+            "signature": np.array(signature, dtype=np.int64),
+        }
+        if state.ivf is not None:
+            arrays.update(state.ivf.to_arrays())
+
+        try:
+            directory = os.path.dirname(self.index_path) or "."
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".npz")
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, **arrays)
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            print(f"WARNING: Could not persist face index: {e}")
+
+    def ensure_loaded(self, db: Session):
+        """Load the index on first use and keep it current with other workers' registrations."""
+        self.refresh(db)
+
+    def add(self, face_id: int, student_id: int, encoding):
+        """Append a newly registered encoding without rescanning the table."""
+        vector = np.asarray(encoding, dtype=np.float32).reshape(1, ENCODING_SIZE)
+        with self._lock:
+            if not self._loaded:
+                # Will be picked up by the full load on first query
+                return
+            if face_id in self._state.face_ids:
+                # Already appended by a refresh
+                return
+            self._append(vector, np.array([face_id], dtype=np.int64), np.array([student_id], dtype=np.int64))
+            self._signature = (self._signature[0] + 1, max(self._signature[1], face_id))
+
+    def _search(self, state: _IndexState, probe: np.ndarray) -> Optional[Tuple[int, float]]:
+        """Return (row, distance) of the nearest gallery entry."""
+        if state.ivf is not None:
+            return state.ivf.search(state.encodings, probe, self.nprobe, self.top_k)
+
+        distances = np.linalg.norm(state.encodings - probe, axis=1)
+        best = int(np.argmin(distances))
+        return best, float(distances[best])
+
+    def match(self, encoding, tolerance: float = 0.6) -> Optional[Tuple[int, int, float]]:
+        """
+        Find the closest known face to the given encoding.
+        Returns (face_id, student_id, distance) or None if nothing is within tolerance.
+        """
+        state = self._state
+        if len(state.face_ids) == 0:
+            return None
+
+        found = self._search(state, np.asarray(encoding, dtype=np.float32))
+        if found is None or found[1] >= tolerance:
+            return None
+
+        row, distance = found
+        return int(state.face_ids[row]), int(state.student_ids[row]), distance
+
+    def match_many(self, encodings, tolerance: float = 0.6) -> List[Optional[Tuple[int, int, float]]]:
+        """
+        Match several probe encodings at once with a single (probes x gallery)
+        distance matrix. Returns one match-or-None per probe, in order.
+        """
+        state = self._state
+        probes = np.asarray(encodings, dtype=np.float32).reshape(-1, ENCODING_SIZE)
+        if len(state.face_ids) == 0 or len(probes) == 0:
+            return [None] * len(probes)
+
+        if state.ivf is not None:
+            return [self.match(probe, tolerance) for probe in probes]
+
+        # ||p - k||^2 = ||p||^2 + ||k||^2 - 2 p.k, clipped against rounding below zero
+        known = state.encodings
+        sq = (probes ** 2).sum(axis=1)[:, None] + (known ** 2).sum(axis=1)[None, :] - 2 * probes @ known.T
+        distances = np.sqrt(np.maximum(sq, 0))
+        best = distances.argmin(axis=1)
+        best_dist = distances[np.arange(len(probes)), best]
+
+        return [
+            (int(state.face_ids[b]), int(state.student_ids[b]), float(d)) if d < tolerance else None
+            for b, d in zip(best, best_dist)
+        ]
+
+
+class HistogramIndex:
+    """
+    In-memory store of precomputed colour histograms for the OpenCV fallback.
+    Histograms are kept as a stacked float32 matrix of pre-centered rows,
+    so correlating a probe against every face is one matrix-vector product.
+    """
+
+    def __init__(self, refresh_seconds: float = 5.0):
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._signature = (0, 0)
+        self._next_check = 0.0
+        self._hists = np.empty((0, HISTOGRAM_SIZE), dtype=np.float32)
+        self._face_ids = np.empty(0, dtype=np.int64)
+        self._student_ids = np.empty(0, dtype=np.int64)
+
+    @property
+    def size(self) -> int:
+        return len(self._face_ids)
+
+    def load(self, db: Session):
+        """(Re)build the store from the persisted StudentFace.histogram column."""
+        signature = _table_signature(db)
+        rows = db.query(
+            StudentFace.face_id, StudentFace.student_id, StudentFace.histogram
+        ).filter(StudentFace.histogram.isnot(None)).all()
+
+        with self._lock:
+            if rows:
+                raw = np.frombuffer(b"".join(r.histogram for r in rows), dtype=np.float32)
+                self._hists = _center_rows(raw.reshape(len(rows), HISTOGRAM_SIZE))
+                self._face_ids = np.array([r.face_id for r in rows], dtype=np.int64)
+                self._student_ids = np.array([r.student_id for r in rows], dtype=np.int64)
+            else:
+                self._hists = np.empty((0, HISTOGRAM_SIZE), dtype=np.float32)
+                self._face_ids = np.empty(0, dtype=np.int64)
+                self._student_ids = np.empty(0, dtype=np.int64)
+            self._signature = signature
+            self._next_check = time.monotonic() + self.refresh_seconds
+            self._loaded = True
+
+    def ensure_loaded(self, db: Session):
+        """
+        Load the store on first use, and reload it when another worker has
+        registered or removed faces (checked at most every refresh_seconds).
+        """
+        if not self._loaded:
+            self.load(db)
+        elif time.monotonic() >= self._next_check:
+            self._next_check = time.monotonic() + self.refresh_seconds
+            if _table_signature(db) != self._signature:
+                self.load(db)
+
+    def add(self, face_id: int, student_id: int, hist: np.ndarray):
+        """Append a newly registered histogram."""
+        row = _center_rows(np.asarray(hist, dtype=np.float32).reshape(1, HISTOGRAM_SIZE))
+        with self._lock:
+            if not self._loaded:
+                return
+            self._hists = np.vstack([self._hists, row])
+            self._face_ids = np.append(self._face_ids, face_id)
+            self._student_ids = np.append(self._student_ids, student_id)
+            self._signature = (self._signature[0] + 1, max(self._signature[1], face_id))
+
+    def match(self, hist: np.ndarray, threshold: float = 0.6) -> Optional[Tuple[int, int, float]]:
+        """
+        Find the stored histogram with the highest correlation to the probe.
+        Returns (face_id, student_id, score) or None if no score exceeds threshold.
+        """
+        hists, face_ids, student_ids = self._hists, self._face_ids, self._student_ids
+        if len(face_ids) == 0:
+            return None
+
+        probe = _center_rows(np.asarray(hist, dtype=np.float32).reshape(1, HISTOGRAM_SIZE))[0]
+        scores = hists @ probe
+        best = int(np.argmax(scores))
+        if scores[best] <= threshold:
+            return None
+
+        return int(face_ids[best]), int(student_ids[best]), float(scores[best])
+
+
+face_index = FaceIndex(
+    mode=settings.FACE_INDEX_MODE,
+    index_path=settings.FACE_INDEX_PATH,
+    ivf_min_size=settings.FACE_IVF_MIN_SIZE,
+    nlist=settings.FACE_IVF_NLIST,
+    nprobe=settings.FACE_IVF_NPROBE,
+    top_k=settings.FACE_ANN_TOP_K,
+    projection_dim=settings.FACE_ANN_PROJECTION_DIM,
+    refresh_seconds=settings.FACE_INDEX_REFRESH_SECONDS
+)
+histogram_index = HistogramIndex(refresh_seconds=settings.FACE_INDEX_REFRESH_SECONDS)
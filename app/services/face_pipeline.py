@@ -0,0 +1,209 @@
+import asyncio
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+from app.config import get_settings
+from app.services.face_index import histogram_from_image
+
+try:
+    import cv2
+    HAS_CV2 = True
+except ImportError:
+    HAS_CV2 = False
+
+try:
+    import face_recognition
+    HAS_FACE_REC = True
+except ImportError:
+    HAS_FACE_REC = False
+
+settings = get_settings()
+
+
+class PipelineSaturated(Exception):
+    """Raised when too many face jobs are already in flight."""
+
+
+class PipelineTimeout(Exception):
+    """Raised when a face job does not finish within the configured timeout."""
+
+
+def _elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 2)
+
+
+def analyze_image(image_data: bytes) -> dict:
+    """
+    Decode an uploaded image and extract everything the matchers need.
+    Runs inside a worker process, so it must stay a top-level picklable function.
+    Returns face encodings, the fallback histogram and per-stage timings.
+    """
+    timings = {}
+    encodings = []
+    histogram = None
+
+    if HAS_CV2:
+        start = time.perf_counter()
+        img = cv2.imdecode(np.frombuffer(image_data, np.uint8), cv2.IMREAD_COLOR)
+        timings["decode_ms"] = _elapsed_ms(start)
+
+        if img is not None:
+            if HAS_FACE_REC:
+                start = time.perf_counter()
+                rgb_img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+                encodings = face_recognition.face_encodings(rgb_img)
+                timings["encode_ms"] = _elapsed_ms(start)
+
+            start = time.perf_counter()
+            histogram = histogram_from_image(img)
+            timings["histogram_ms"] = _elapsed_ms(start)
+
+    return {"encodings": encodings, "histogram": histogram, "timings": timings}
+
+
+class FacePipeline:
+    """
+    Runs CPU-bound face work off the event loop.
+    Decode/encode goes to a process pool; matching against the in-memory
+    indexes goes to the thread pool (NumPy releases the GIL). The number of
+    jobs in flight is bounded so a burst of uploads fails fast with
+    PipelineSaturated instead of queueing without limit.
+    """
+
+    def __init__(self, workers: int, max_pending: int, timeout: float):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def start(self):
+        """Create the worker pool. Workers are spawned so they don't inherit server threads."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def _acquire(self):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise PipelineSaturated()
+            self._pending += 1
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+
+    def _submit(self, images: List[bytes]) -> list:
+        """
+        Queue images on the pool under one in-flight slot. The slot is freed
+        when the last job really finishes, not when the caller stops waiting,
+        so a timed-out request still counts against max_pending while its
+        job occupies a worker.
+        """
+        self.start()
+        self._acquire()
+        futures = []
+        try:
+            for data in images:
+                futures.append(self._executor.submit(analyze_image, data))
+        except Exception:
+            for future in futures:
+                future.cancel()
+            self._release()
+            raise
+
+        remaining = [len(futures)]
+
+        def done(_):
+            with self._lock:
+                remaining[0] -= 1
+                finished = remaining[0] == 0
+            if finished:
+                self._release()
+
+        if not futures:
+            self._release()
+        for future in futures:
+            future.add_done_callback(done)
+        return futures
+
+    def _no_face(self, error: BaseException) -> dict:
+        # Undecodable or empty uploads are reported as "no face" rather than a server error
+        print(f"WARNING: Face analysis failed: {error!r}")
+        return {"encodings": [], "histogram": None, "timings": {}}
+
+    async def analyze(self, image_data: bytes) -> dict:
+        """Decode and encode an image in the process pool."""
+        start = time.perf_counter()
+        future, = self._submit([image_data])
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            raise PipelineTimeout()
+        except BrokenProcessPool:
+            # A worker died (e.g. dlib crash); recreate the pool on the next call
+            self.shutdown()
+            raise
+        except Exception as e:
+            result = self._no_face(e)
+        result["timings"]["analyze_total_ms"] = _elapsed_ms(start)
+        return result
+
+    async def analyze_many(self, images: List[bytes]) -> List[dict]:
+        """
+        Decode and encode a burst of images in parallel across the pool.
+        The whole batch occupies a single in-flight slot.
+        """
+        start = time.perf_counter()
+        futures = self._submit(images)
+        try:
+            outcomes = await asyncio.wait_for(
+                asyncio.gather(*(asyncio.wrap_future(f) for f in futures), return_exceptions=True),
+                timeout=self.timeout
+            )
+        except asyncio.TimeoutError:
+            raise PipelineTimeout()
+
+        if any(isinstance(outcome, BrokenProcessPool) for outcome in outcomes):
+            self.shutdown()
+            raise BrokenProcessPool("A face worker process died")
+
+        total_ms = _elapsed_ms(start)
+        results = [self._no_face(o) if isinstance(o, BaseException) else o for o in outcomes]
+        for result in results:
+            result["timings"]["analyze_total_ms"] = total_ms
+        return results
+
+    async def match(self, func, *args, timings: Optional[dict] = None, label: str = "match_ms"):
+        """Run a matching function in the thread pool, recording its duration."""
+        start = time.perf_counter()
+        result = await run_in_threadpool(func, *args)
+        if timings is not None:
+            timings[label] = _elapsed_ms(start)
+        return result
+
+
+face_pipeline = FacePipeline(
+    workers=settings.FACE_WORKERS,
+    max_pending=settings.FACE_MAX_PENDING,
+    timeout=settings.FACE_TASK_TIMEOUT_SECONDS
+)
@@ -0,0 +1,268 @@
+import threading
+import time
+from datetime import datetime, date, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.services.qr_service import cleanup_expired_tokens
+from app.config import get_settings
+
+settings = get_settings()
+
+QR_TABLE = "QR_TOKENS"
+MAX_PARTITION = "pmax"
+
+# =====================================================
+# DAILY PARTITIONS (MySQL)
+# =====================================================
+#
+# Once QR_TOKENS is partitioned by day of expires_at (see
+# partition_qr_tokens), pruning is an ALTER TABLE ... DROP PARTITION per
+# day, which frees the rows and their index entries without deleting row by
+# row. Partition pYYYYMMDD holds tokens expiring on that day; pmax catches
+# anything beyond the partitions created so far.
+
+
+def _is_mysql(db: Session) -> bool:
+    return db.get_bind().dialect.name == "mysql"
+
+
+def _expires_at_type(db: Session) -> str:
+    return db.execute(text(
+        "SELECT DATA_TYPE FROM information_schema.COLUMNS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND COLUMN_NAME = 'expires_at'"
+    ), {"table": QR_TABLE}).scalar()
+
+
+def _partition_names(db: Session) -> List[str]:
+    return [name for (name,) in db.execute(text(
+        "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND PARTITION_NAME IS NOT NULL "
+        "ORDER BY PARTITION_ORDINAL_POSITION"
+    ), {"table": QR_TABLE}).all()]
+
+
+def is_partitioned(db: Session) -> bool:
+    return _is_mysql(db) and bool(_partition_names(db))
+
+
+def _partition_name(day: date) -> str:
+    return f"p{day:%Y%m%d}"
+
+
+def _partition_day(name: str) -> Optional[date]:
+    try:
+        return datetime.strptime(name, "p%Y%m%d").date()
+    except ValueError:
+        return None
+
+
+def _partition_clause(day: date, column_type: str) -> str:
+    # TIMESTAMP columns can only be range-partitioned through UNIX_TIMESTAMP();
+    # DATETIME columns (as created by SQLAlchemy) use RANGE COLUMNS bounds.
+    bound = f"{day + timedelta(days=1):%Y-%m-%d} 00:00:00"
+    if column_type == "timestamp":
+        return f"PARTITION {_partition_name(day)} VALUES LESS THAN (UNIX_TIMESTAMP('{bound}'))"
+    return f"PARTITION {_partition_name(day)} VALUES LESS THAN ('{bound}')"
+
+
+def _add_partitions(db: Session, days: List[date], column_type: str):
+    if not days:
+        return
+    clauses = ", ".join(_partition_clause(day, column_type) for day in days)
+    db.execute(text(
+        f"ALTER TABLE {QR_TABLE} REORGANIZE PARTITION {MAX_PARTITION} INTO "
+        f"({clauses}, PARTITION {MAX_PARTITION} VALUES LESS THAN (MAXVALUE))"
+    ))
+
+
+def rotate_partitions(db: Session, cutoff: datetime, days_ahead: int) -> int:
+    """
+    Drop daily partitions whose tokens all expired before cutoff and make
+    sure partitions exist through today + days_ahead.
+    Returns the number of rows dropped.
+    """
+    names = _partition_names(db)
+    reclaimed = 0
+    for name in names:
+        day = _partition_day(name)
+        if day is not None and datetime.combine(day + timedelta(days=1), datetime.min.time()) <= cutoff:
+            reclaimed += db.execute(text(f"SELECT COUNT(*) FROM {QR_TABLE} PARTITION ({name})")).scalar()
+            db.execute(text(f"ALTER TABLE {QR_TABLE} DROP PARTITION {name}"))
+
+    existing = {_partition_day(name) for name in names}
+    today = datetime.utcnow().date()
+    missing = [
+        today + timedelta(days=offset) for offset in range(days_ahead + 1)
+        if today + timedelta(days=offset) not in existing
+    ]
+    last = max((d for d in existing if d is not None), default=None)
+    # REORGANIZE can only append after the last daily partition
+    _add_partitions(db, [d for d in missing if last is None or d > last], _expires_at_type(db))
+    return reclaimed
+
+
+def partition_qr_tokens(db: Session, days_ahead: int) -> int:
+    """
+    One-off migration of QR_TOKENS to daily RANGE partitions on expires_at.
+
+    MySQL requires the partitioning column in every unique key and does not
+    allow foreign keys on partitioned tables, so this drops the STUDENTS
+    foreign key and the insert trigger, widens the primary key to
+    (token_id, expires_at) and unique token indexes to (token_value,
+    expires_at). The ALTER rebuilds the table; run it in a quiet period,
+    ideally right after pruning. Returns the number of partitions created.
+    """
+    if not _is_mysql(db):
+        raise RuntimeError("QR_TOKENS partitioning requires MySQL")
+    if _partition_names(db):
+        return 0
+
+    db.execute(text("DROP TRIGGER IF EXISTS clean_expired_qr_tokens"))
+
+    for (constraint,) in db.execute(text(
+        "SELECT CONSTRAINT_NAME FROM information_schema.REFERENTIAL_CONSTRAINTS "
+        "WHERE CONSTRAINT_SCHEMA = DATABASE() AND TABLE_NAME = :table"
+    ), {"table": QR_TABLE}).all():
+        db.execute(text(f"ALTER TABLE {QR_TABLE} DROP FOREIGN KEY {constraint}"))
+
+    unique_indexes = [name for (name,) in db.execute(text(
+        "SELECT DISTINCT INDEX_NAME FROM information_schema.STATISTICS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND NON_UNIQUE = 0 AND INDEX_NAME <> 'PRIMARY'"
+    ), {"table": QR_TABLE}).all()]
+    alterations = ["DROP PRIMARY KEY", "ADD PRIMARY KEY (token_id, expires_at)"]
+    for name in unique_indexes:
+        alterations += [f"DROP INDEX {name}", f"ADD UNIQUE INDEX {name} (token_value, expires_at)"]
+    db.execute(text(f"ALTER TABLE {QR_TABLE} " + ", ".join(alterations)))
+
+    column_type = _expires_at_type(db)
+    oldest = db.execute(text(f"SELECT MIN(expires_at) FROM {QR_TABLE}")).scalar()
+    today = datetime.utcnow().date()
+    first = min(oldest.date(), today) if oldest else today
+    days = [first + timedelta(days=offset) for offset in range((today - first).days + days_ahead + 1)]
+
+    column = "(UNIX_TIMESTAMP(expires_at))" if column_type == "timestamp" else "COLUMNS(expires_at)"
+    clauses = ", ".join(_partition_clause(day, column_type) for day in days)
+    db.execute(text(
+        f"ALTER TABLE {QR_TABLE} PARTITION BY RANGE {column} "
+        f"({clauses}, PARTITION {MAX_PARTITION} VALUES LESS THAN (MAXVALUE))"
+    ))
+    return len(days) + 1
+
+
+# =====================================================
+# REAPER
+# =====================================================
+
+class QRTokenReaper:
+    """
+    Background thread that prunes expired QR tokens every interval_seconds.
+    Tokens are kept for grace_seconds after expiry. On a partitioned table
+    whole days are dropped; otherwise rows are deleted in bounded batches.
+    Each worker runs its own reaper; runs are idempotent, so overlapping
+    ones only find less to delete.
+    """
+
+    def __init__(self, interval_seconds: float, grace_seconds: float):
+        self.interval_seconds = interval_seconds
+        self.grace_seconds = grace_seconds
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._stats = {
+            "runs": 0,
+            "errors": 0,
+            "rows_reclaimed": 0,
+            "last_run_at": None,
+            "last_rows_reclaimed": 0,
+            "last_duration_ms": None,
+            "last_error": None,
+            "mode": None,
+        }
+
+    def start(self):
+        if self.interval_seconds <= 0:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="qr-token-reaper", daemon=True)
+                self._thread.start()
+
+    def shutdown(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            thread.join(timeout=5)
+
+    def _run(self):
+        while not self._stop.wait(self.interval_seconds):
+            self.run_once()
+
+    def run_once(self) -> int:
+        """Prune once and record metrics. Returns rows reclaimed."""
+        start = time.perf_counter()
+        cutoff = datetime.utcnow() - timedelta(seconds=self.grace_seconds)
+        db = SessionLocal()
+        reclaimed = 0
+        error = None
+        try:
+            if is_partitioned(db):
+                mode = "partition"
+                reclaimed = rotate_partitions(db, cutoff, settings.QR_PARTITION_DAYS_AHEAD)
+            else:
+                mode = "delete"
+                reclaimed = cleanup_expired_tokens(
+                    db,
+                    older_than=cutoff,
+                    batch_size=settings.QR_REAPER_BATCH_SIZE,
+                    max_batches=settings.QR_REAPER_MAX_BATCHES
+                )
+        except Exception as e:
+            db.rollback()
+            mode = self._stats["mode"]
+            error = str(e)
+            print(f"WARNING: QR token reaper failed: {e}")
+        finally:
+            db.close()
+
+        with self._lock:
+            stats = self._stats
+            stats["runs"] += 1
+            if error is not None:
+                stats["errors"] += 1
+            stats["rows_reclaimed"] += reclaimed
+            stats["last_run_at"] = datetime.utcnow()
+            stats["last_rows_reclaimed"] = reclaimed
+            stats["last_duration_ms"] = round((time.perf_counter() - start) * 1000, 2)
+            stats["last_error"] = error
+            stats["mode"] = mode
+        return reclaimed
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                **self._stats,
+                "enabled": self.interval_seconds > 0,
+                "interval_seconds": self.interval_seconds,
+                "grace_seconds": self.grace_seconds,
+            }
+
+
+def token_grace_seconds() -> float:
+    """
+    How long tokens are kept after expiry. Offline scanner uploads look
+    database tokens up at upload time, so with GATE_OFFLINE_UPLOADS on
+    tokens are kept as long as a queued scan can still be uploaded.
+    """
+    if settings.GATE_OFFLINE_UPLOADS:
+        return max(settings.QR_REAPER_GRACE_SECONDS, settings.GATE_BATCH_MAX_AGE_HOURS * 3600)
+    return settings.QR_REAPER_GRACE_SECONDS
+
+
+qr_reaper = QRTokenReaper(
+    interval_seconds=settings.QR_REAPER_INTERVAL_SECONDS,
+    grace_seconds=token_grace_seconds()
+)
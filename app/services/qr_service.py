@@ -1,21 +1,131 @@
 import secrets
 import base64
+import hashlib
+import hmac
+import threading
+import time
+from collections import OrderedDict
 from io import BytesIO
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Dict, List, Optional
 import qrcode
+from qrcode.exceptions import DataOverflowError
 from sqlalchemy.orm import Session
 from app.models import QRToken, Student
 from app.config import get_settings
+from app.services.analytics_cache import LRUCache
 
 settings = get_settings()
 
 
+SIGNED_TOKEN_PREFIX = "s1"
+
+
+def _signing_key() -> bytes:
+    if settings.QR_TOKEN_SECRET:
+        return settings.QR_TOKEN_SECRET.encode()
+    # Derived, so a leaked QR key can't be used to forge JWTs and vice versa
+    return hmac.new(settings.JWT_SECRET_KEY.encode(), b"qr-token", hashlib.sha256).digest()
+
+
+_SIGNING_KEY = _signing_key()
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def _sign(message: str) -> str:
+    return _b64(hmac.new(_SIGNING_KEY, message.encode(), hashlib.sha256).digest()[:16])
+
+
+class ReplayGuard:
+    """
+    Nonces of signed tokens scanned in the last window_seconds.
+    Entries are kept in scan order and evicted from the front once their
+    window has passed, so memory is bounded by the scan rate. The guard is
+    per process: with several workers it stops rapid re-scans at a gate, not
+    a replay sent to a different worker.
+    """
+
+    def __init__(self, window_seconds: float):
+        self.window_seconds = window_seconds
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check(self, nonce: str) -> bool:
+        """Record nonce; False if it was already seen within the window."""
+        now = time.monotonic()
+        with self._lock:
+            while self._seen:
+                oldest, expires_at = next(iter(self._seen.items()))
+                if expires_at > now:
+                    break
+                del self._seen[oldest]
+
+            if nonce in self._seen:
+                return False
+            self._seen[nonce] = now + self.window_seconds
+            return True
+
+
+replay_guard = ReplayGuard(settings.QR_REPLAY_WINDOW_SECONDS)
+
+
+def generate_signed_token(student_id: int) -> tuple[str, datetime]:
+    """
+    Build a stateless token "s1.<student_id>.<expiry>.<nonce>.<signature>".
+    Nothing is written to the database; the HMAC signature is what makes it valid.
+    """
+    expires_at = datetime.utcnow().replace(microsecond=0) + timedelta(minutes=settings.QR_CODE_EXPIRY_MINUTES)
+    expiry = int((expires_at - datetime(1970, 1, 1)).total_seconds())
+    message = f"{SIGNED_TOKEN_PREFIX}.{student_id}.{expiry}.{_b64(secrets.token_bytes(8))}"
+    return f"{message}.{_sign(message)}", expires_at
+
+
+def _signed_token_claims(token_value: str) -> Optional[tuple[int, int, str]]:
+    """(student_id, expiry as epoch seconds, nonce) of a correctly signed token, else None."""
+    parts = token_value.split(".")
+    if len(parts) != 5 or parts[0] != SIGNED_TOKEN_PREFIX:
+        return None
+
+    message, signature = token_value.rsplit(".", 1)
+    if not hmac.compare_digest(signature.encode(), _sign(message).encode()):
+        return None
+
+    _, student_id, expiry, nonce = parts[:4]
+    if not (student_id.isdigit() and expiry.isdigit()):
+        return None
+    return int(student_id), int(expiry), nonce
+
+
+def verify_signed_token(token_value: str) -> Optional[int]:
+    """
+    Check a signed token's signature, expiry and replay window.
+    Returns the student ID, or None if the token is not valid.
+    """
+    claims = _signed_token_claims(token_value)
+    if claims is None:
+        return None
+
+    student_id, expiry, nonce = claims
+    if time.time() > expiry or not replay_guard.check(nonce):
+        return None
+    return student_id
+
+
+def is_signed_token(token_value: str) -> bool:
+    return token_value.startswith(SIGNED_TOKEN_PREFIX + ".")
+
+
 def generate_qr_token(db: Session, student_id: int) -> tuple[str, datetime]:
     """
     Generate a time-limited QR token for a student.
     Returns (token_value, expires_at)
     """
+    if settings.QR_TOKEN_MODE == "signed":
+        return generate_signed_token(student_id)
+    
     # Generate secure random token
     token_value = secrets.token_urlsafe(32)
     
@@ -34,20 +144,35 @@ def generate_qr_token(db: Session, student_id: int) -> tuple[str, datetime]:
     return token_value, expires_at
 
 
-def generate_qr_image(data: str) -> str:
+def _build_qr(data: str, border: int) -> qrcode.QRCode:
     """
-    Generate QR code image from data.
-    Returns base64 encoded PNG image.
+    Encode data at the configured fixed version and mask pattern.
+    Letting qrcode pick the version and score all eight masks costs most of
+    the render time; tokens have a fixed length, so both can be chosen once.
+    Data too long for the fixed version falls back to a best-fit version.
     """
     qr = qrcode.QRCode(
-        version=1,
+        version=settings.QR_CODE_VERSION,
         error_correction=qrcode.constants.ERROR_CORRECT_L,
         box_size=settings.QR_CODE_SIZE,
-        border=4,
+        border=border,
+        mask_pattern=settings.QR_CODE_MASK_PATTERN,
     )
     qr.add_data(data)
-    qr.make(fit=True)
-    
+    try:
+        qr.make(fit=False)
+    except DataOverflowError:
+        qr.version = None
+        qr.make(fit=True)
+    return qr
+
+
+def generate_qr_image(data: str) -> str:
+    """
+    Generate QR code image from data.
+    Returns base64 encoded PNG image.
+    """
+    qr = _build_qr(data, border=4)
     img = qr.make_image(fill_color="black", back_color="white")
     
     # Convert to base64
@@ -58,11 +183,91 @@ def generate_qr_image(data: str) -> str:
     return img_str
 
 
+def generate_qr_matrix(data: str) -> List[str]:
+    """
+    Generate the QR module matrix, without the quiet zone.
+    One hex string per row, most significant bit first, 1 = dark module;
+    rows are padded with zero bits to a multiple of four.
+    """
+    rows = []
+    for row in _build_qr(data, border=0).get_matrix():
+        bits = "".join("1" if dark else "0" for dark in row)
+        bits += "0" * (-len(bits) % 4)
+        rows.append(f"{int(bits, 2):0{len(bits) // 4}x}")
+    return rows
+
+
+def generate_qr_svg(data: str, border: int = 4) -> str:
+    """
+    Generate a compact SVG: one path, one subpath per horizontal run of dark
+    modules, in module units (the client scales it).
+    """
+    matrix = _build_qr(data, border=0).get_matrix()
+    size = len(matrix) + 2 * border
+    runs = []
+    for y, row in enumerate(matrix):
+        x = 0
+        while x < len(row):
+            if row[x]:
+                start = x
+                while x < len(row) and row[x]:
+                    x += 1
+                runs.append(f"M{start + border} {y + border}h{x - start}v1h-{x - start}z")
+            else:
+                x += 1
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {size} {size}" shape-rendering="crispEdges">'
+        f'<rect width="{size}" height="{size}" fill="#fff"/><path d="{"".join(runs)}"/></svg>'
+    )
+
+
+def render_qr(data: str, fmt: str) -> dict:
+    """QRGenerateResponse fields for the requested format; "none" leaves rendering to the client."""
+    if fmt == "png":
+        return {"qr_image_base64": generate_qr_image(data)}
+    if fmt == "svg":
+        return {"qr_svg": generate_qr_svg(data)}
+    if fmt == "matrix":
+        return {"qr_matrix": generate_qr_matrix(data)}
+    return {}
+
+
+# Rendered QR codes per student, reused while more than half the token's
+# lifetime is left, so students reopening or auto-refreshing the QR page
+# don't each cost a new token (and QR_TOKENS row) plus a render.
+_issued = LRUCache(settings.QR_CACHE_MAX_ENTRIES)
+
+
+def issue_qr_code(db: Session, student_id: int, fmt: str = "png", refresh: bool = False) -> dict:
+    """
+    Token, expiry and rendered QR code for a student, from the cache unless
+    refresh is set. Returns QRGenerateResponse fields.
+    """
+    entry = None if refresh else _issued.get(student_id)
+    if entry is None:
+        token, expires_at = generate_qr_token(db, student_id)
+        reuse_until = expires_at - timedelta(minutes=settings.QR_CODE_EXPIRY_MINUTES / 2)
+        entry = {"token": token, "expires_at": expires_at, "reuse_until": reuse_until}
+
+    if fmt not in entry:
+        # Cached entries are shared between requests; add renders to a copy
+        entry = {**entry, fmt: render_qr(entry["token"], fmt)}
+        _issued.set(student_id, entry, (entry["reuse_until"] - datetime.utcnow()).total_seconds())
+
+    return {"token": entry["token"], "expires_at": entry["expires_at"], **entry[fmt]}
+
+
 def validate_qr_token(db: Session, token_value: str) -> Optional[Student]:
     """
     Validate a QR token and return the associated student.
     Returns None if token is invalid, expired, or already used.
+    Signed tokens are recognised by their prefix and checked without a
+    QR_TOKENS lookup, so tokens issued before a mode switch keep working.
     """
+    if is_signed_token(token_value):
+        student_id = verify_signed_token(token_value)
+        return db.get(Student, student_id) if student_id is not None else None
+    
     qr_token = db.query(QRToken).filter(QRToken.token_value == token_value).first()
     
     if not qr_token:
@@ -83,7 +288,91 @@ def validate_qr_token(db: Session, token_value: str) -> Optional[Student]:
     return qr_token.student
 
 
-def cleanup_expired_tokens(db: Session):
-    """Delete expired QR tokens from database."""
-    db.query(QRToken).filter(QRToken.expires_at < datetime.utcnow()).delete()
-    db.commit()
+def resolve_qr_tokens(db: Session, token_values: List[str]) -> List[Optional[int]]:
+    """
+    Read-only variant of validate_qr_token for the scan fast path: the
+    student ID for each valid, unexpired token, or None, in order. Signed
+    tokens are verified in memory, each occurrence against the replay
+    window; database tokens cost one IN query for the whole list and are
+    not marked as used.
+    """
+    stored = [token_value for token_value in token_values if not is_signed_token(token_value)]
+    found = {}
+    if stored:
+        found = {
+            row.token_value: row.student_id
+            for row in db.query(QRToken.token_value, QRToken.student_id).filter(
+                QRToken.token_value.in_(set(stored)),
+                QRToken.expires_at >= datetime.utcnow()
+            ).all()
+        }
+    return [
+        verify_signed_token(token_value) if is_signed_token(token_value) else found.get(token_value)
+        for token_value in token_values
+    ]
+
+
+def resolve_offline_tokens(db: Session, token_values: List[str]) -> Dict[str, tuple[int, datetime, datetime]]:
+    """
+    {token: (student_id, issued_at UTC, expires_at UTC)} for every genuine
+    token among token_values, without checking expiry against the current
+    time: scans uploaded by an offline gate terminal are checked against
+    the time they were scanned instead. Signed tokens are verified in
+    memory; database tokens cost one IN query. The reaper keeps database
+    tokens for GATE_BATCH_MAX_AGE_HOURS when offline uploads are enabled.
+
+    The issue time is expiry minus QR_CODE_EXPIRY_MINUTES for both kinds:
+    signed tokens carry only their expiry, and QR_TOKENS.created_at comes
+    from the database clock rather than UTC like expires_at.
+    """
+    lifetime = timedelta(minutes=settings.QR_CODE_EXPIRY_MINUTES)
+    resolved = {}
+    lookup = []
+    for token_value in set(token_values):
+        if is_signed_token(token_value):
+            claims = _signed_token_claims(token_value)
+            if claims is not None:
+                student_id, expiry, _ = claims
+                expires_at = datetime(1970, 1, 1) + timedelta(seconds=expiry)
+                resolved[token_value] = (student_id, expires_at - lifetime, expires_at)
+        else:
+            lookup.append(token_value)
+
+    if lookup:
+        resolved.update(
+            (row.token_value, (row.student_id, row.expires_at - lifetime, row.expires_at))
+            for row in db.query(QRToken.token_value, QRToken.student_id, QRToken.expires_at).filter(
+                QRToken.token_value.in_(lookup)
+            ).all()
+        )
+    return resolved
+
+
+def cleanup_expired_tokens(
+    db: Session,
+    older_than: Optional[datetime] = None,
+    batch_size: int = 1000,
+    max_batches: Optional[int] = None
+) -> int:
+    """
+    Delete QR tokens that expired before older_than (default: now).
+    Works in batches of batch_size primary keys, committing after each, so
+    no single DELETE holds locks on QR_TOKENS for long. Stops after
+    max_batches if given. Returns the number of rows removed.
+    """
+    cutoff = older_than or datetime.utcnow()
+    removed = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        ids = [token_id for (token_id,) in db.query(QRToken.token_id).filter(
+            QRToken.expires_at < cutoff
+        ).order_by(QRToken.expires_at).limit(batch_size).all()]
+        if not ids:
+            break
+
+        removed += db.query(QRToken).filter(QRToken.token_id.in_(ids)).delete(synchronize_session=False)
+        db.commit()
+        batches += 1
+        if len(ids) < batch_size:
+            break
+    return removed
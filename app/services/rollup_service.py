@@ -0,0 +1,162 @@
+from collections import defaultdict
+from datetime import datetime, date, timedelta
+from typing import List, Dict, Optional
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.models import Attendance, AttendanceType, AttendanceHourly, AttendanceDailyStudent
+from app.database import upsert
+from app.services.date_range import start_of_day
+from app.config import get_settings
+
+settings = get_settings()
+
+REBUILD_WINDOW_DAYS = 31
+
+
+def hour_bucket(timestamp: datetime) -> datetime:
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+def _counts(attendance_type: AttendanceType) -> tuple:
+    return (1, 0) if attendance_type == AttendanceType.IN else (0, 1)
+
+
+def is_late_out(attendance_type: AttendanceType, timestamp: datetime) -> bool:
+    """An OUT at or after the curfew hour."""
+    return attendance_type == AttendanceType.OUT and timestamp.hour >= int(settings.CURFEW_TIME.split(":")[0])
+
+
+def _aggregate(records) -> tuple:
+    """
+    Fold (student_id, type, timestamp) records into hourly [in, out] and
+    per-student-day [in, out, late outs, last late out] counters.
+    """
+    hourly = defaultdict(lambda: [0, 0])
+    daily = defaultdict(lambda: [0, 0, 0, None])
+    for student_id, attendance_type, timestamp in records:
+        in_count, out_count = _counts(attendance_type)
+        bucket = hourly[hour_bucket(timestamp)]
+        bucket[0] += in_count
+        bucket[1] += out_count
+        day = daily[(timestamp.date(), student_id)]
+        day[0] += in_count
+        day[1] += out_count
+        if is_late_out(attendance_type, timestamp):
+            day[2] += 1
+            day[3] = timestamp if day[3] is None else max(day[3], timestamp)
+    return hourly, daily
+
+
+def _daily_rows(daily) -> List[dict]:
+    return [
+        {"day": d, "student_id": s, "in_count": c[0], "out_count": c[1], "late_out_count": c[2], "last_late_out": c[3]}
+        for (d, s), c in daily.items()
+    ]
+
+
+def record_rollups(db: Session, records: List[Attendance]):
+    """
+    Add newly written attendance records to the hourly and daily rollups.
+    Does not commit, so the counters move in the same transaction as the records.
+    """
+    hourly, daily = _aggregate((r.student_id, r.type, r.timestamp) for r in records)
+
+    upsert(
+        db,
+        AttendanceHourly,
+        [{"bucket": b, "in_count": c[0], "out_count": c[1]} for b, c in hourly.items()],
+        increment_columns=("in_count", "out_count")
+    )
+    upsert(
+        db,
+        AttendanceDailyStudent,
+        _daily_rows(daily),
+        increment_columns=("in_count", "out_count", "late_out_count"),
+        max_columns=("last_late_out",)
+    )
+
+
+def _clear_rollups(db: Session, start: Optional[datetime] = None, end: Optional[datetime] = None):
+    """Delete rollup rows in [start, end) (either bound may be open)."""
+    hourly = db.query(AttendanceHourly)
+    daily = db.query(AttendanceDailyStudent)
+    if start is not None:
+        hourly = hourly.filter(AttendanceHourly.bucket >= start)
+        daily = daily.filter(AttendanceDailyStudent.day >= start.date())
+    if end is not None:
+        hourly = hourly.filter(AttendanceHourly.bucket < end)
+        daily = daily.filter(AttendanceDailyStudent.day < end.date())
+    hourly.delete(synchronize_session=False)
+    daily.delete(synchronize_session=False)
+
+
+def rebuild_rollups(db: Session, window_days: int = REBUILD_WINDOW_DAYS) -> int:
+    """
+    Recompute both rollup tables from raw attendance, one date window per
+    transaction so memory stays bounded and readers only ever see complete
+    rollups: each window's rows are deleted and re-inserted in the same
+    commit.
+
+    Each window starts with a locking read of its attendance rows. That
+    waits for scans still being written into the window and blocks new
+    ones until the window commits, so their record_rollups() increments
+    are neither counted twice nor wiped (MySQL/InnoDB; SQLite serializes
+    writers instead). Returns the number of records processed.
+    """
+    first, last = db.query(func.min(Attendance.timestamp), func.max(Attendance.timestamp)).one()
+    if first is None:
+        _clear_rollups(db)
+        db.commit()
+        return 0
+
+    # Rollup rows outside the attendance history have nothing to rebuild from
+    start = start_of_day(first.date())
+    _clear_rollups(db, end=start)
+    db.commit()
+
+    processed = 0
+    while start <= last:
+        end = start + timedelta(days=window_days)
+        rows = db.query(Attendance.student_id, Attendance.type, Attendance.timestamp).filter(
+            Attendance.timestamp >= start,
+            Attendance.timestamp < end
+        ).with_for_update(read=True).yield_per(5000)
+
+        hourly, daily = _aggregate(rows)
+        _clear_rollups(db, start, end)
+        db.bulk_insert_mappings(AttendanceHourly, [
+            {"bucket": b, "in_count": c[0], "out_count": c[1]} for b, c in hourly.items()
+        ])
+        db.bulk_insert_mappings(AttendanceDailyStudent, _daily_rows(daily))
+        db.commit()
+
+        processed += sum(c[0] + c[1] for c in hourly.values())
+        start = end
+        # Scans recorded during the rebuild may have moved the end of history
+        last = max(last, db.query(func.max(Attendance.timestamp)).scalar() or last)
+
+    _clear_rollups(db, start=start)
+    db.commit()
+    return processed
+
+
+def get_hourly_counts(db: Session, start: datetime, end: Optional[datetime] = None) -> List[AttendanceHourly]:
+    """Hourly rollup rows with start <= bucket < end."""
+    query = db.query(AttendanceHourly).filter(AttendanceHourly.bucket >= hour_bucket(start))
+    if end is not None:
+        query = query.filter(AttendanceHourly.bucket < end)
+    return query.order_by(AttendanceHourly.bucket).all()
+
+
+def get_daily_student_counts(db: Session, start_day: date, end_day: date, in_only: bool = False) -> Dict[date, int]:
+    """Distinct students with attendance (or with an IN, if in_only) per day in [start_day, end_day)."""
+    query = db.query(
+        AttendanceDailyStudent.day,
+        func.count(AttendanceDailyStudent.student_id)
+    ).filter(
+        AttendanceDailyStudent.day >= start_day,
+        AttendanceDailyStudent.day < end_day
+    )
+    if in_only:
+        query = query.filter(AttendanceDailyStudent.in_count > 0)
+    return dict(query.group_by(AttendanceDailyStudent.day).all())
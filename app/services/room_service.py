@@ -0,0 +1,299 @@
+import threading
+import time
+from collections import Counter
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import func, and_
+from sqlalchemy.orm import Session
+from app.models import Room, RoomAssignment, RoomType, Student
+from app.schemas import AvailableRoom
+from app.config import get_settings
+
+settings = get_settings()
+
+
+class RoomNotFound(Exception):
+    """Raised when an allocation names a room that does not exist."""
+
+
+class RoomFull(Exception):
+    """Raised when the requested room has no free bed."""
+
+    def __init__(self, room: Room):
+        super().__init__(f"Room {room.room_no} is at full capacity ({room.capacity})")
+        self.capacity = room.capacity
+
+
+class StudentsNotFound(Exception):
+    """Raised when a bulk allotment names students that do not exist."""
+
+    def __init__(self, student_ids: List[int]):
+        super().__init__(f"Students not found: {student_ids}")
+        self.student_ids = student_ids
+
+
+class InsufficientCapacity(Exception):
+    """Raised when the selected rooms cannot hold every student in a bulk allotment."""
+
+    def __init__(self, needed: int, free: int):
+        super().__init__(f"Need {needed} beds but only {free} are free")
+        self.needed = needed
+        self.free = free
+
+
+def _occupancy_query(db: Session):
+    """Every room with its count of active assignments, as one grouped outer join."""
+    occupied = func.count(RoomAssignment.assignment_id)
+    return db.query(
+        Room.room_no,
+        Room.block,
+        Room.floor,
+        Room.room_type,
+        Room.capacity,
+        occupied.label("occupied")
+    ).outerjoin(
+        RoomAssignment,
+        and_(RoomAssignment.room_no == Room.room_no, RoomAssignment.is_active == True)
+    ).group_by(
+        Room.room_no, Room.block, Room.floor, Room.room_type, Room.capacity
+    )
+
+
+def _to_available_room(row) -> AvailableRoom:
+    return AvailableRoom(
+        room_no=row.room_no,
+        block=row.block,
+        floor=row.floor,
+        room_type=row.room_type.value,
+        capacity=row.capacity,
+        occupied=row.occupied,
+        available=row.capacity - row.occupied
+    )
+
+
+def compute_available_rooms(db: Session, block: Optional[str] = None) -> List[AvailableRoom]:
+    """Rooms with vacancy, filtered on capacity in SQL."""
+    query = _occupancy_query(db)
+    if block:
+        query = query.filter(Room.block == block)
+    rows = query.having(
+        func.count(RoomAssignment.assignment_id) < Room.capacity
+    ).order_by(Room.room_no).all()
+    return [_to_available_room(r) for r in rows]
+
+
+class RoomOccupancyMap:
+    """
+    In-memory room_no -> occupancy snapshot for the room picker.
+    Loaded with one grouped query and then kept current by adjust() from
+    the assignment routes, so the picker doesn't hit the database on every
+    open. The TTL bounds staleness from writes made by other workers or
+    scripts; room assignment itself always re-checks capacity in the
+    database.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._rooms: Optional[Dict[str, AvailableRoom]] = None
+        self._expires_at = 0.0
+        self._version = 0
+
+    def _fresh(self) -> bool:
+        return self._rooms is not None and time.monotonic() < self._expires_at
+
+    def _load(self, db: Session) -> Dict[str, AvailableRoom]:
+        with self._lock:
+            if self._fresh():
+                return self._rooms
+
+            version = self._version
+            rooms = {r.room_no: _to_available_room(r) for r in _occupancy_query(db).all()}
+            if version == self._version:
+                self._rooms = rooms
+                self._expires_at = time.monotonic() + self.ttl_seconds
+            return rooms
+
+    def available(self, db: Session, block: Optional[str] = None) -> List[AvailableRoom]:
+        rooms = self._rooms if self._fresh() else self._load(db)
+        return [
+            room for room_no, room in sorted(rooms.items())
+            if room.available > 0 and (not block or room.block == block)
+        ]
+
+    def adjust(self, room_no: str, delta: int):
+        """Apply a committed change of delta occupants to room_no."""
+        with self._lock:
+            self._version += 1
+            room = self._rooms.get(room_no) if self._rooms is not None else None
+            if room is None:
+                # Unknown room: reload on next read
+                self._rooms = None
+                return
+            occupied = room.occupied + delta
+            self._rooms[room_no] = room.model_copy(update={
+                "occupied": occupied,
+                "available": room.capacity - occupied
+            })
+
+    def invalidate(self):
+        with self._lock:
+            self._version += 1
+            self._rooms = None
+
+
+room_occupancy = RoomOccupancyMap(ttl_seconds=settings.ROOM_OCCUPANCY_CACHE_TTL_SECONDS)
+
+
+def get_available_rooms(db: Session, block: Optional[str] = None) -> List[AvailableRoom]:
+    """Rooms with vacancy, from the occupancy map unless it is disabled (TTL 0)."""
+    if room_occupancy.ttl_seconds <= 0:
+        return compute_available_rooms(db, block)
+    return room_occupancy.available(db, block)
+
+
+def record_room_change(added_to: Optional[str] = None, removed_from: Optional[List[str]] = None):
+    """Update the occupancy map after a committed assignment change."""
+    for room_no in removed_from or []:
+        room_occupancy.adjust(room_no, -1)
+    if added_to:
+        room_occupancy.adjust(added_to, 1)
+
+
+# =====================================================
+# ALLOCATION
+# =====================================================
+#
+# Allocation locks the ROOMS rows it fills (SELECT ... FOR UPDATE, always in
+# room_no order so concurrent batches cannot deadlock) and then counts
+# occupants with a locking read, which sees assignments committed after the
+# transaction's snapshot. Two admins filling the same room therefore run one
+# after the other instead of both passing the capacity check. The STUDENTS
+# rows being housed are locked first (before any room, in student_id order),
+# so a single move and a bulk allotment of the same student can't both see
+# them without a room. None of these functions commit; the caller commits
+# once the whole change is written.
+
+def _locked_occupancy(db: Session, room_nos: List[str]) -> Dict[str, int]:
+    """Active occupants per room, for rooms already locked by this transaction."""
+    rows = db.query(RoomAssignment.room_no).filter(
+        RoomAssignment.room_no.in_(room_nos),
+        RoomAssignment.is_active == True
+    ).with_for_update().all()
+    return Counter(room_no for (room_no,) in rows)
+
+
+def _vacate(db: Session, student_id: int) -> List[str]:
+    """Deactivate a student's current assignment; returns the rooms vacated."""
+    previous = db.query(RoomAssignment).filter(
+        RoomAssignment.student_id == student_id,
+        RoomAssignment.is_active == True
+    )
+    rooms = [room_no for (room_no,) in previous.with_entities(RoomAssignment.room_no).all()]
+    if rooms:
+        previous.update({"is_active": False, "vacated_date": date.today()})
+    return rooms
+
+
+def allocate_room(db: Session, student_id: int, room_no: str, assigned_date: date) -> Tuple[RoomAssignment, List[str]]:
+    """
+    Move a student into room_no, vacating any current room.
+    Returns the new assignment and the rooms vacated. Raises RoomNotFound
+    or RoomFull.
+    """
+    db.query(Student.student_id).filter(Student.student_id == student_id).with_for_update().first()
+    room = db.query(Room).filter(Room.room_no == room_no).with_for_update().first()
+    if room is None:
+        raise RoomNotFound(room_no)
+    if _locked_occupancy(db, [room_no])[room_no] >= room.capacity:
+        raise RoomFull(room)
+
+    previous_rooms = _vacate(db, student_id)
+    assignment = RoomAssignment(
+        student_id=student_id,
+        room_no=room_no,
+        assigned_date=assigned_date,
+        is_active=True
+    )
+    db.add(assignment)
+    db.flush()
+    return assignment, previous_rooms
+
+
+def _packing_order(room: Room, occupied: int) -> tuple:
+    # Stay on one block/floor/type as long as possible; on each floor top up
+    # partly filled rooms (fewest free beds first) before opening empty ones.
+    return (room.block, room.floor, room.room_type.value, occupied == 0, room.capacity - occupied, room.room_no)
+
+
+def plan_allotment(students: List[Student], rooms: List[Room], occupancy: Dict[str, int]) -> List[Tuple[int, str]]:
+    """
+    Capacity-aware packing of students into free beds.
+    Students are taken in (department, year, roll number) order and rooms
+    are filled one at a time in _packing_order, so classmates share rooms
+    and a batch occupies as few floors and part-empty rooms as possible.
+    Returns (student_id, room_no) pairs.
+    """
+    beds = []
+    for room in sorted(rooms, key=lambda r: _packing_order(r, occupancy.get(r.room_no, 0))):
+        beds.extend([room.room_no] * max(room.capacity - occupancy.get(room.room_no, 0), 0))
+
+    ordered = sorted(students, key=lambda s: (s.department or "", s.year or 0, s.roll_number))
+    return [(student.student_id, room_no) for student, room_no in zip(ordered, beds)]
+
+
+def allot_rooms(
+    db: Session,
+    student_ids: List[int],
+    assigned_date: date,
+    block: Optional[str] = None,
+    floor: Optional[int] = None,
+    room_type: Optional[RoomType] = None
+) -> Tuple[List[Tuple[int, str]], List[int]]:
+    """
+    Assign rooms to many students in one transaction.
+    Students who already have an active room are skipped rather than moved.
+    The students and the candidate rooms (optionally limited to a block,
+    floor and room type) are locked for the duration, and either every
+    remaining student is placed or nothing is written. Returns (allotments, skipped student IDs).
+    Raises StudentsNotFound or InsufficientCapacity.
+    """
+    requested = list(dict.fromkeys(student_ids))
+    students = db.query(Student).filter(
+        Student.student_id.in_(requested)
+    ).order_by(Student.student_id).with_for_update().all()
+    missing = sorted(set(requested) - {s.student_id for s in students})
+    if missing:
+        raise StudentsNotFound(missing)
+
+    housed = {
+        student_id for (student_id,) in db.query(RoomAssignment.student_id).filter(
+            RoomAssignment.student_id.in_(requested),
+            RoomAssignment.is_active == True
+        ).with_for_update().all()
+    }
+    pending = [s for s in students if s.student_id not in housed]
+    skipped = [sid for sid in requested if sid in housed]
+    if not pending:
+        return [], skipped
+
+    query = db.query(Room)
+    if block:
+        query = query.filter(Room.block == block)
+    if floor is not None:
+        query = query.filter(Room.floor == floor)
+    if room_type:
+        query = query.filter(Room.room_type == room_type)
+    rooms = query.order_by(Room.room_no).with_for_update().all()
+
+    occupancy = _locked_occupancy(db, [r.room_no for r in rooms]) if rooms else {}
+    free = sum(max(r.capacity - occupancy.get(r.room_no, 0), 0) for r in rooms)
+    if free < len(pending):
+        raise InsufficientCapacity(len(pending), free)
+
+    allotments = plan_allotment(pending, rooms, occupancy)
+    db.bulk_insert_mappings(RoomAssignment, [
+        {"student_id": student_id, "room_no": room_no, "assigned_date": assigned_date, "is_active": True}
+        for student_id, room_no in allotments
+    ])
+    return allotments, skipped
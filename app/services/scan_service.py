@@ -0,0 +1,493 @@
+import hashlib
+import queue
+import threading
+from collections import defaultdict
+from concurrent.futures import Future
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+from sqlalchemy import select, insert, func, and_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models import Attendance, AttendanceType, AttendanceStatus, Student
+from app.schemas import AttendanceRecord, OfflineScan, ScanBatchResult, ScanBatchResponse
+from app.services.qr_service import resolve_qr_tokens, resolve_offline_tokens
+from app.services.attendance_service import (
+    next_attendance_type, update_current_status,
+    curfew_violation, attendance_event, violation_event
+)
+from app.services.rollup_service import record_rollups
+from app.services.dashboard_service import invalidate_dashboard
+from app.services.event_hub import event_hub
+from app.config import get_settings
+
+settings = get_settings()
+
+
+class ScanRejected(Exception):
+    """Raised when a scanned QR token is invalid, expired or replayed."""
+
+
+class ScanBatchConflict(Exception):
+    """Raised when another upload recorded some of the same scans while this batch was being written."""
+
+
+class _PendingScan:
+    """A gate scan waiting for the writer thread."""
+
+    def __init__(self, token: str, requested_type: Optional[AttendanceType], location: str, remarks: str):
+        self.token = token
+        self.resolved = False
+        self.student_id: Optional[int] = None
+        self.requested_type = requested_type
+        self.location = location
+        self.remarks = remarks
+        # Scan time, not commit time
+        self.timestamp = datetime.now().replace(microsecond=0)
+        self.future: Future = Future()
+
+
+def _latest_types(db: Session, student_ids: List[int], before: Optional[datetime] = None) -> Dict[int, AttendanceType]:
+    """Each student's most recent attendance type (before the given time, if any), in one query."""
+    latest = db.query(
+        Attendance.student_id,
+        func.max(Attendance.timestamp).label("latest")
+    ).filter(Attendance.student_id.in_(student_ids))
+    if before is not None:
+        latest = latest.filter(Attendance.timestamp < before)
+    latest = latest.group_by(Attendance.student_id).subquery()
+    return dict(
+        db.query(Attendance.student_id, Attendance.type).join(
+            latest,
+            and_(Attendance.student_id == latest.c.student_id, Attendance.timestamp == latest.c.latest)
+        ).order_by(Attendance.attendance_id).all()
+    )
+
+
+def _record_scans(db: Session, scans: List[_PendingScan]) -> tuple:
+    """
+    Write a group of live scans in the caller's transaction, in arrival
+    order. Returns (an AttendanceRecord or ScanRejected per scan, events
+    to publish after commit).
+    """
+    # Once per scan: a retry must not run a signed token past the replay guard again
+    unresolved = [scan for scan in scans if not scan.resolved]
+    for scan, student_id in zip(unresolved, resolve_qr_tokens(db, [scan.token for scan in unresolved])):
+        scan.student_id = student_id
+        scan.resolved = True
+    student_ids = sorted({scan.student_id for scan in scans if scan.student_id is not None})
+    known = {
+        student_id for (student_id,) in db.query(Student.student_id).filter(
+            Student.student_id.in_(student_ids)
+        ).all()
+    }
+    # Locked in student_id order, so writers in other processes can't deadlock with this one
+    current = dict(db.execute(
+        select(AttendanceStatus.student_id, AttendanceStatus.status).where(
+            AttendanceStatus.student_id.in_(student_ids)
+        ).order_by(AttendanceStatus.student_id).with_for_update()
+    ).all())
+    missing = [student_id for student_id in known if student_id not in current]
+    if missing:
+        current.update(_latest_types(db, missing))
+
+    records = []
+    previous_types = []
+    for scan in scans:
+        if scan.student_id not in known:
+            # Invalid token, or a signed token for a student that has since been deleted
+            records.append(None)
+            continue
+        previous_types.append(current.get(scan.student_id))
+        record = Attendance(
+            student_id=scan.student_id,
+            type=scan.requested_type or next_attendance_type(current.get(scan.student_id)),
+            timestamp=scan.timestamp,
+            location=scan.location,
+            remarks=scan.remarks
+        )
+        current[scan.student_id] = record.type
+        records.append(record)
+    recorded = [record for record in records if record is not None]
+    violations = [v for v in map(curfew_violation, recorded) if v is not None]
+    # One flush for the whole group; dialects that return ids in order
+    # send the inserts as one multi-row INSERT
+    db.add_all(recorded)
+    db.add_all(violations)
+    db.flush()
+
+    # Build the results and events before commit expires the objects
+    outcomes = [
+        ScanRejected() if record is None else AttendanceRecord(
+            attendance_id=record.attendance_id,
+            student_id=record.student_id,
+            timestamp=record.timestamp,
+            type=record.type.value,
+            remarks=record.remarks,
+            location=record.location
+        )
+        for record in records
+    ]
+    events = [
+        ("attendance", attendance_event(record, previous_type))
+        for record, previous_type in zip(recorded, previous_types)
+    ]
+    events.extend(("violation", violation_event(v)) for v in violations)
+
+    update_current_status(db, recorded)
+    record_rollups(db, recorded)
+    return outcomes, events
+
+
+class ScanCommitter:
+    """
+    Group commit for live gate scans.
+
+    Request threads hand their scan to one writer thread and wait. The
+    writer takes every scan that queued up while the previous commit was in
+    flight (up to max_batch) and records them in a single transaction: one
+    token lookup, one locking read of the students' statuses, the
+    attendance rows in arrival order, then status, rollups and curfew
+    violations, and one commit. Under load the commit cost is shared by the
+    whole group; a lone scan is written straight away.
+
+    Each worker process runs its own writer. The status rows are locked for
+    the transaction, so IN/OUT stays consistent across processes. If a
+    group fails to commit, its scans are retried one at a time so a single
+    bad scan can't fail the others.
+    """
+
+    def __init__(self, session_factory, max_batch: int, timeout: float):
+        self.session_factory = session_factory
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self._queue: "queue.Queue[Optional[_PendingScan]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="scan-committer", daemon=True)
+                self._thread.start()
+
+    def shutdown(self):
+        """Write everything already queued, then stop the writer."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(timeout=self.timeout)
+
+    def submit(
+        self,
+        token: str,
+        requested_type: Optional[AttendanceType],
+        location: str,
+        remarks: str
+    ) -> AttendanceRecord:
+        """Record one scan and wait for its commit. Raises ScanRejected if the token is not valid."""
+        self.start()
+        scan = _PendingScan(token, requested_type, location, remarks)
+        self._queue.put(scan)
+        outcome = scan.future.result(timeout=self.timeout)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    def _run(self):
+        while True:
+            scan = self._queue.get()
+            if scan is None:
+                return
+            group = [scan]
+            stop = False
+            while len(group) < self.max_batch:
+                try:
+                    scan = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if scan is None:
+                    stop = True
+                    break
+                group.append(scan)
+            self._write(group)
+            if stop:
+                return
+
+    def _write(self, group: List[_PendingScan]):
+        db = self.session_factory()
+        try:
+            outcomes, events = _record_scans(db, group)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            if len(group) > 1:
+                for scan in group:
+                    self._write([scan])
+            else:
+                print(f"WARNING: Could not record gate scan: {e}")
+                group[0].future.set_exception(e)
+            return
+        finally:
+            db.close()
+
+        for scan, outcome in zip(group, outcomes):
+            scan.future.set_result(outcome)
+        if events:
+            invalidate_dashboard()
+        for event, data in events:
+            event_hub.publish(event, data)
+
+
+scan_committer = ScanCommitter(
+    SessionLocal,
+    max_batch=settings.SCAN_GROUP_COMMIT_MAX,
+    timeout=settings.SCAN_COMMIT_TIMEOUT_SECONDS
+)
+
+
+def process_scan(
+    token: str,
+    requested_type: Optional[AttendanceType] = None,
+    location: str = "Main Gate",
+    remarks: str = "QR Code Scan",
+    committer: Optional[ScanCommitter] = None
+) -> AttendanceRecord:
+    """
+    Gate scan fast path: record the scan through the group committer
+    (scan_committer unless one is given) and wait for its commit.
+
+    - The token check is read-only (in memory for signed tokens, one IN
+      query per group for database tokens).
+    - IN/OUT comes from the student's ATTENDANCE_STATUS row, read with
+      FOR UPDATE by the writer, so two scans of the same student can't
+      both toggle from the same status.
+    - The attendance row, status, rollups and any curfew violation are
+      written together, in one commit shared with other scans arriving
+      at the same time; the timestamp is the time of the scan.
+
+    Raises ScanRejected if the token is not valid.
+    """
+    return (committer or scan_committer).submit(token, requested_type, location, remarks)
+
+
+# =====================================================
+# OFFLINE TERMINAL BATCHES
+# =====================================================
+#
+# A gate terminal that loses its connection keeps scanning and queues
+# (token, scanned_at) locally, then uploads the queue in one batch. Each
+# scan is stored with scan_key = sha256(token, scan time), which is unique,
+# so a batch uploaded twice (retry after a timeout, two tabs flushing the
+# same queue) records every scan once.
+
+OFFLINE_REMARKS = "QR Code Scan (offline)"
+
+
+def _utc(timestamp: datetime) -> datetime:
+    # Naive timestamps are taken as server local time, like ATTENDANCE.timestamp
+    return timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _local(timestamp: datetime) -> datetime:
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone().replace(tzinfo=None)
+    return timestamp.replace(microsecond=0)
+
+
+def scan_key(token: str, scanned_at_utc: datetime) -> str:
+    return hashlib.sha256(f"{token}|{scanned_at_utc.isoformat()}".encode()).hexdigest()
+
+
+def _history(db: Session, student_ids: List[int], since: datetime):
+    """
+    Each student's attendance type just before since, and their records
+    from since onwards, in two queries.
+    """
+    previous = _latest_types(db, student_ids, before=since)
+
+    later = defaultdict(list)
+    for student_id, attendance_type, timestamp in db.query(
+        Attendance.student_id, Attendance.type, Attendance.timestamp
+    ).filter(
+        Attendance.student_id.in_(student_ids),
+        Attendance.timestamp >= since
+    ).order_by(Attendance.timestamp, Attendance.attendance_id).all():
+        later[student_id].append((timestamp, attendance_type))
+    return previous, later
+
+
+def process_scan_batch(db: Session, terminal_id: str, scans: List[OfflineScan]) -> ScanBatchResponse:
+    """
+    Record a batch of scans captured by an offline gate terminal, each at
+    its original scan time.
+
+    - Tokens are checked against the time they were scanned, not the
+      upload time: a scan must fall within the token's lifetime, so a
+      fresh code can't be used to backdate scans.
+    - Scans already recorded (same token and scan time), or repeated
+      within the replay window of an accepted scan of the same token, are
+      reported as duplicates.
+    - IN/OUT for each batch scan follows the student's record just before
+      it, batch or existing. Existing records are never re-typed: a late
+      scan that falls between two online scans can leave two INs or two
+      OUTs in a row. Online scans have already been reported to the gate
+      and dashboards, may carry an explicit type, and their curfew
+      violations aren't linked back to them, so rewriting them here
+      would be unsafe.
+    - Attendance rows go in with one bulk insert; status, rollups and
+      curfew violations are written in the same transaction.
+
+    Raises ScanBatchConflict if a concurrent upload recorded the same scans first.
+    """
+    results: List[Optional[ScanBatchResult]] = [None] * len(scans)
+    now = datetime.utcnow()
+    skew = timedelta(seconds=settings.GATE_CLOCK_SKEW_SECONDS)
+    oldest = now - timedelta(hours=settings.GATE_BATCH_MAX_AGE_HOURS)
+
+    def reject(index: int, reason: str, student_id: Optional[int] = None):
+        results[index] = ScanBatchResult(index=index, status="rejected", student_id=student_id, reason=reason)
+
+    def duplicate(index: int, student_id: int):
+        results[index] = ScanBatchResult(index=index, status="duplicate", student_id=student_id)
+
+    tokens = resolve_offline_tokens(db, [scan.token for scan in scans])
+    keys: Dict[str, int] = {}
+    candidates = []
+    for index, scan in enumerate(scans):
+        scanned_at = _utc(scan.scanned_at)
+        resolved = tokens.get(scan.token)
+        if resolved is None:
+            reject(index, "Invalid QR code")
+        elif scanned_at > now + skew:
+            reject(index, "Scan time is in the future", resolved[0])
+        elif scanned_at < oldest:
+            reject(index, "Scan is too old to upload", resolved[0])
+        elif scanned_at < resolved[1] - skew:
+            reject(index, "QR code had not been issued yet when scanned", resolved[0])
+        elif scanned_at > resolved[2] + skew:
+            reject(index, "QR code had expired when scanned", resolved[0])
+        else:
+            key = scan_key(scan.token, scanned_at)
+            if key in keys:
+                duplicate(index, resolved[0])
+            else:
+                keys[key] = index
+                candidates.append((scan.token, scanned_at, index, key))
+
+    # A code held in front of the camera reads many times a second
+    window = timedelta(seconds=settings.QR_REPLAY_WINDOW_SECONDS)
+    last_read: Dict[str, datetime] = {}
+    pending = []
+    for token, scanned_at, index, key in sorted(candidates):
+        if token in last_read and scanned_at - last_read[token] < window:
+            duplicate(index, tokens[token][0])
+            continue
+        last_read[token] = scanned_at
+        pending.append((index, key))
+
+    if pending:
+        recorded_keys = {
+            key for (key,) in db.query(Attendance.scan_key).filter(
+                Attendance.scan_key.in_([key for _, key in pending])
+            ).all()
+        }
+        student_ids = {tokens[scans[index].token][0] for index, _ in pending}
+        known = {
+            student_id for (student_id,) in db.query(Student.student_id).filter(
+                Student.student_id.in_(student_ids)
+            ).all()
+        }
+        remaining = []
+        for index, key in pending:
+            student_id = tokens[scans[index].token][0]
+            if key in recorded_keys:
+                duplicate(index, student_id)
+            elif student_id not in known:
+                reject(index, "Student not found", student_id)
+            else:
+                remaining.append((index, key))
+        pending = remaining
+
+    records = []
+    if pending:
+        by_student = defaultdict(list)
+        for index, key in pending:
+            scan = scans[index]
+            by_student[tokens[scan.token][0]].append((_local(scan.scanned_at), index, key))
+        student_ids = sorted(by_student)
+
+        # Same row locks, in the same order, as the live scan writer, so a
+        # live scan of one of these students waits for this batch rather
+        # than toggling in between
+        statuses = dict(db.execute(
+            select(AttendanceStatus.student_id, AttendanceStatus.last_timestamp).where(
+                AttendanceStatus.student_id.in_(student_ids)
+            ).order_by(AttendanceStatus.student_id).with_for_update()
+        ).all())
+        previous, later = _history(db, student_ids, min(ts for batch in by_student.values() for ts, _, _ in batch))
+
+        latest = []
+        for student_id in student_ids:
+            # Existing records sort before batch scans at the same second
+            timeline = sorted(
+                [(ts, 0, attendance_type, None) for ts, attendance_type in later[student_id]] +
+                [(ts, 1, index, key) for ts, index, key in by_student[student_id]],
+                key=lambda event: event[:2]
+            )
+            current = previous.get(student_id)
+            record = None
+            for timestamp, is_scan, value, key in timeline:
+                if not is_scan:
+                    current, record = value, None
+                    continue
+                record = Attendance(
+                    student_id=student_id,
+                    type=scans[value].type or next_attendance_type(current),
+                    timestamp=timestamp,
+                    location=terminal_id,
+                    remarks=OFFLINE_REMARKS,
+                    scan_key=key
+                )
+                records.append(record)
+                results[value] = ScanBatchResult(
+                    index=value, status="recorded", student_id=student_id, type=record.type.value
+                )
+                current = record.type
+            last_timestamp = statuses.get(student_id)
+            if record is not None and (last_timestamp is None or record.timestamp >= last_timestamp):
+                latest.append(record)
+
+        violations = [v for v in (curfew_violation(r) for r in records) if v is not None]
+        try:
+            db.execute(insert(Attendance), [
+                {
+                    "student_id": r.student_id,
+                    "type": r.type,
+                    "timestamp": r.timestamp,
+                    "location": r.location,
+                    "remarks": r.remarks,
+                    "scan_key": r.scan_key
+                }
+                for r in records
+            ])
+            db.add_all(violations)
+            update_current_status(db, latest)
+            record_rollups(db, records)
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            raise ScanBatchConflict()
+
+        invalidate_dashboard()
+        # One reload for the whole batch instead of an event per scan
+        event_hub.publish("resync", {})
+
+    statuses_seen = [r.status for r in results]
+    return ScanBatchResponse(
+        recorded=statuses_seen.count("recorded"),
+        duplicates=statuses_seen.count("duplicate"),
+        rejected=statuses_seen.count("rejected"),
+        results=results
+    )
@@ -0,0 +1,306 @@
+"""
+Gate Scan Benchmark
+Compares the /attendance/scan fast path with the previous multi-commit flow
+
+Seeds students into a SQLite file database, issues one QR token per scan
+and replays the same scan sequence through both pipelines from
+--concurrency threads, each scan with a fresh session as a request would
+get (the API serves scans from a thread pool):
+
+  baseline  the route body as it was before the fast path, vendored below
+            (token UPDATE + commit, attendance commit, curfew commit).
+            Database tokens only: signed tokens did not exist yet.
+  fast      scan_service.process_scan through a ScanCommitter, so
+            concurrent scans share one token lookup, status read and
+            commit, with database and signed tokens
+
+Reports throughput, latency percentiles and SQL statements/commits per
+scan, and the fast path's speedup over the baseline for each token mode.
+With --concurrency 1 every scan is committed on its own and the speedup
+is only the statements saved; the group commit pays off once scans
+overlap, as they do at a gate at rush hour. Absolute numbers depend on the
+database and disk; statements and commits per scan carry over to MySQL.
+
+Usage:
+    python benchmarks/scan_benchmark.py --students 500 --scans 2000 --concurrency 32 --output scan_bench.json
+"""
+
+import sys
+import os
+import argparse
+import json
+import secrets
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from sqlalchemy import create_engine, event, desc
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.config import get_settings
+from app.models import (
+    Student, Attendance, AttendanceType, AttendanceStatus, AttendanceHourly, AttendanceDailyStudent,
+    QRToken, Violation, ViolationType, ViolationSeverity
+)
+from app.schemas import AttendanceRecord
+from app.services import qr_service
+from app.services.qr_service import generate_signed_token
+from app.services.scan_service import process_scan, ScanCommitter
+
+settings = get_settings()
+
+
+def percentile(values, pct):
+    return round(float(np.percentile(values, pct)), 3) if values else None
+
+
+# Baseline scan path, copied from the code before the fast path so the
+# comparison is not skewed by later changes to the shared services (the
+# status and rollup upserts now done by mark_attendance, signed tokens).
+
+def baseline_validate_qr_token(db, token_value: str):
+    qr_token = db.query(QRToken).filter(QRToken.token_value == token_value).first()
+    if not qr_token:
+        return None
+    if datetime.utcnow() > qr_token.expires_at:
+        return None
+    qr_token.is_used = True
+    db.commit()
+    return qr_token.student
+
+
+def baseline_auto_detect_attendance_type(db, student_id: int) -> AttendanceType:
+    last_attendance = db.query(Attendance).filter(
+        Attendance.student_id == student_id
+    ).order_by(desc(Attendance.timestamp)).first()
+    if not last_attendance:
+        return AttendanceType.IN
+    return AttendanceType.OUT if last_attendance.type == AttendanceType.IN else AttendanceType.IN
+
+
+def baseline_check_curfew_violation(db, attendance: Attendance):
+    if attendance.type != AttendanceType.IN:
+        return
+    curfew_hour = int(settings.CURFEW_TIME.split(":")[0])
+    curfew_minute = int(settings.CURFEW_TIME.split(":")[1])
+    if attendance.timestamp.hour > curfew_hour or \
+       (attendance.timestamp.hour == curfew_hour and attendance.timestamp.minute >= curfew_minute):
+        db.add(Violation(
+            student_id=attendance.student_id,
+            violation_type=ViolationType.CURFEW,
+            violation_date=attendance.timestamp.date(),
+            description=f"Returned after curfew at {attendance.timestamp.strftime('%H:%M')}",
+            severity=ViolationSeverity.HIGH
+        ))
+        db.commit()
+
+
+def baseline_mark_attendance(db, student_id: int, attendance_type: AttendanceType, location: str, remarks: str) -> Attendance:
+    attendance = Attendance(student_id=student_id, type=attendance_type, location=location, remarks=remarks)
+    db.add(attendance)
+    db.commit()
+    db.refresh(attendance)
+    baseline_check_curfew_violation(db, attendance)
+    return attendance
+
+
+def baseline_scan(db, token: str, committer=None) -> AttendanceRecord:
+    """The /attendance/scan route body before the fast path."""
+    student = baseline_validate_qr_token(db, token)
+    attendance_type = baseline_auto_detect_attendance_type(db, student.student_id)
+    attendance = baseline_mark_attendance(
+        db,
+        student_id=student.student_id,
+        attendance_type=attendance_type,
+        location="Main Gate",
+        remarks="QR Code Scan"
+    )
+    return AttendanceRecord(
+        attendance_id=attendance.attendance_id,
+        student_id=attendance.student_id,
+        timestamp=attendance.timestamp,
+        type=attendance.type.value,
+        remarks=attendance.remarks,
+        location=attendance.location
+    )
+
+
+def fast_scan(db, token: str, committer=None) -> AttendanceRecord:
+    return process_scan(token, committer=committer)
+
+
+PIPELINES = {"baseline": baseline_scan, "fast": fast_scan}
+
+
+class StatementCounter:
+    def __init__(self, engine):
+        self.statements = 0
+        self.commits = 0
+        self._lock = threading.Lock()
+        event.listen(engine, "before_cursor_execute", self._statement)
+        event.listen(engine, "commit", self._commit)
+
+    def _statement(self, *args):
+        with self._lock:
+            self.statements += 1
+
+    def _commit(self, *args):
+        with self._lock:
+            self.commits += 1
+
+
+def reset_state(session_factory):
+    """Clear attendance and tokens so every case starts from the same data."""
+    db = session_factory()
+    try:
+        for model in (Attendance, AttendanceStatus, AttendanceHourly, AttendanceDailyStudent, QRToken, Violation):
+            db.query(model).delete()
+        db.commit()
+    finally:
+        db.close()
+
+
+def issue_tokens(session_factory, student_ids, token_mode: str):
+    """One token per scan, issued up front so issuing isn't part of the timing."""
+    if token_mode == "signed":
+        qr_service.replay_guard = qr_service.ReplayGuard(qr_service.settings.QR_REPLAY_WINDOW_SECONDS)
+        return [generate_signed_token(sid)[0] for sid in student_ids]
+
+    db = session_factory()
+    try:
+        tokens = [secrets.token_urlsafe(32) for _ in student_ids]
+        expires_at = datetime.utcnow() + timedelta(minutes=30)
+        db.bulk_insert_mappings(QRToken, [
+            {"token_value": token, "student_id": sid, "expires_at": expires_at}
+            for token, sid in zip(tokens, student_ids)
+        ])
+        db.commit()
+        return tokens
+    finally:
+        db.close()
+
+
+def run_case(engine, session_factory, pipeline: str, token_mode: str, student_ids, concurrency: int) -> dict:
+    reset_state(session_factory)
+    tokens = issue_tokens(session_factory, student_ids, token_mode)
+    scan = PIPELINES[pipeline]
+    committer = ScanCommitter(
+        session_factory,
+        max_batch=settings.SCAN_GROUP_COMMIT_MAX,
+        timeout=settings.SCAN_COMMIT_TIMEOUT_SECONDS
+    ) if pipeline == "fast" else None
+
+    def timed_scan(token):
+        db = session_factory()
+        began = time.perf_counter()
+        try:
+            scan(db, token, committer)
+        finally:
+            db.close()
+        return (time.perf_counter() - began) * 1000
+
+    counter = StatementCounter(engine)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(timed_scan, tokens))
+    if committer is not None:
+        committer.shutdown()
+    elapsed = time.perf_counter() - start
+    event.remove(engine, "before_cursor_execute", counter._statement)
+    event.remove(engine, "commit", counter._commit)
+
+    scans = len(tokens)
+    return {
+        "pipeline": pipeline,
+        "token_mode": token_mode,
+        "concurrency": concurrency,
+        "scans": scans,
+        "scans_per_second": round(scans / elapsed, 1),
+        "latency_ms": {
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "mean": round(float(np.mean(latencies)), 3),
+        },
+        "statements_per_scan": round(counter.statements / scans, 2),
+        "commits_per_scan": round(counter.commits / scans, 2),
+    }
+
+
+def run_benchmark(students: int, scans: int, token_modes, concurrency: int, seed: int) -> dict:
+    rng = np.random.default_rng(seed)
+    workdir = tempfile.mkdtemp(prefix="scan_bench_")
+    engine = create_engine(
+        f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        connect_args={"check_same_thread": False, "timeout": 60},
+        pool_size=concurrency + 1,
+        max_overflow=0
+    )
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    print(f"🏗️  Seeding {students} students...", file=sys.stderr)
+    db = session_factory()
+    db.bulk_insert_mappings(Student, [
+        {
+            "student_id": i + 1,
+            "first_name": f"Bench{i}",
+            "last_name": "Student",
+            "email": f"bench{i}@student.smarthostel.com",
+            "password_hash": "x",
+            "roll_number": f"BENCH{i:06d}",
+        }
+        for i in range(students)
+    ])
+    db.commit()
+    db.close()
+
+    student_ids = [int(sid) for sid in rng.integers(1, students + 1, scans)]
+    cases = [("baseline", "database")] + [("fast", token_mode) for token_mode in token_modes]
+    results = []
+    for pipeline, token_mode in cases:
+        print(f"   ⏱️  {pipeline}/{token_mode}", file=sys.stderr)
+        results.append(run_case(engine, session_factory, pipeline, token_mode, student_ids, concurrency))
+
+    baseline = results[0]
+    speedups = {
+        r["token_mode"]: round(r["scans_per_second"] / baseline["scans_per_second"], 2)
+        for r in results[1:]
+    }
+
+    engine.dispose()
+    return {
+        "benchmark": "gate_scan",
+        "seed": seed,
+        "students": students,
+        "concurrency": concurrency,
+        "results": results,
+        "speedup": speedups,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark /attendance/scan pipelines")
+    parser.add_argument("--students", type=int, default=500)
+    parser.add_argument("--scans", type=int, default=2000)
+    parser.add_argument("--token-modes", nargs="+", default=["database", "signed"], choices=["database", "signed"])
+    parser.add_argument("--concurrency", type=int, default=32, help="Threads issuing scans at the same time")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.students, args.scans, args.token_modes, args.concurrency, args.seed)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Results written to {args.output}", file=sys.stderr)
+    else:
+        print(json.dumps(report, indent=2))
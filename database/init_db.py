@@ -18,6 +18,8 @@ from app.models import (
     MealTime, AttendanceType, RoomType
 )
 from app.auth import get_password_hash
+from app.services.attendance_service import rebuild_attendance_status
+from app.services.rollup_service import rebuild_rollups
 
 
 def init_database():
@@ -199,6 +201,12 @@ def create_sample_data():
         db.commit()
         print(f"✅ Created {attendance_count} attendance records")
         
+        rebuild_attendance_status(db)
+        print(f"✅ Computed current IN/OUT status")
+        
+        rebuild_rollups(db)
+        print(f"✅ Built hourly/daily attendance rollups")
+        
         # Create menu pools
         print("Creating menu pools...")
         days = list(DayOfWeek)
@@ -0,0 +1,254 @@
+"""
+Database Maintenance Commands
+One-off migrations and backfills for existing SmartHostel deployments
+
+Usage:
+    python database/maintenance.py backfill-histograms
+    python database/maintenance.py migrate-encodings
+    python database/maintenance.py rebuild-status
+    python database/maintenance.py purge-analytics-cache
+    python database/maintenance.py rebuild-rollups
+    python database/maintenance.py reap-qr-tokens
+    python database/maintenance.py partition-qr-tokens
+    python database/maintenance.py add-scan-keys
+    python database/maintenance.py add-attendance-indexes
+"""
+
+import sys
+import os
+import argparse
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import inspect, text, null
+from sqlalchemy.orm import undefer
+from app.database import engine, SessionLocal
+from app.models import StudentFace, AttendanceStatus, AttendanceHourly, AttendanceDailyStudent
+from app.services.attendance_service import rebuild_attendance_status
+from app.services.analytics_cache import purge_expired
+from app.services.rollup_service import rebuild_rollups as rebuild_attendance_rollups
+from app.services.qr_reaper import qr_reaper, partition_qr_tokens as partition_qr_table
+from app.services.face_index import HAS_CV2, compute_histogram, histogram_to_bytes, encoding_to_bytes
+
+
+def ensure_column(table: str, column: str, ddl: str):
+    """Add a column to an existing table if it isn't there yet."""
+    columns = [c["name"] for c in inspect(engine).get_columns(table)]
+    if column in columns:
+        return
+
+    print(f"Adding column {table}.{column}...")
+    with engine.begin() as conn:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+def backfill_histograms(batch_size: int = 100):
+    """Compute and persist the fallback-matcher histogram for faces that lack one."""
+    # The model maps this column, so add it even when the backfill can't run here
+    ensure_column("STUDENT_FACES", "histogram", "BLOB NULL")
+
+    if not HAS_CV2:
+        print("❌ opencv-python is required to compute histograms")
+        return
+
+    db = SessionLocal()
+    updated = 0
+    skipped = 0
+    last_id = 0
+
+    try:
+        while True:
+            faces = db.query(StudentFace).options(undefer(StudentFace.image_data)).filter(
+                StudentFace.histogram.is_(None),
+                StudentFace.face_id > last_id
+            ).order_by(StudentFace.face_id).limit(batch_size).all()
+
+            if not faces:
+                break
+
+            for face in faces:
+                last_id = face.face_id
+                hist = compute_histogram(face.image_data)
+                if hist is None:
+                    skipped += 1
+                    continue
+                face.histogram = histogram_to_bytes(hist)
+                updated += 1
+
+            db.commit()
+            # Release the image blobs of this batch before loading the next one
+            db.expunge_all()
+            print(f"   ... {updated} histograms computed")
+
+        print(f"✅ Backfilled {updated} histograms ({skipped} undecodable images skipped)")
+    finally:
+        db.close()
+
+
+def migrate_encodings(batch_size: int = 1000):
+    """Convert legacy JSON face encodings into the compact float32 encoding_vector column."""
+    ensure_column("STUDENT_FACES", "encoding_vector", "BLOB NULL")
+
+    db = SessionLocal()
+    migrated = 0
+    last_id = 0
+
+    try:
+        while True:
+            faces = db.query(StudentFace).filter(
+                StudentFace.encoding_vector.is_(None),
+                StudentFace.encoding.isnot(None),
+                StudentFace.face_id > last_id
+            ).order_by(StudentFace.face_id).limit(batch_size).all()
+
+            if not faces:
+                break
+
+            for face in faces:
+                last_id = face.face_id
+                if face.encoding:
+                    face.encoding_vector = encoding_to_bytes(face.encoding)
+                    migrated += 1
+                # Store SQL NULL rather than a JSON 'null' literal
+                face.encoding = null()
+
+            db.commit()
+            db.expunge_all()
+            print(f"   ... {migrated} encodings migrated")
+
+        print(f"✅ Migrated {migrated} encodings to binary storage")
+    finally:
+        db.close()
+
+
+def rebuild_status():
+    """Create (if needed) and repopulate the ATTENDANCE_STATUS table from attendance history."""
+    AttendanceStatus.__table__.create(bind=engine, checkfirst=True)
+
+    db = SessionLocal()
+    try:
+        count = rebuild_attendance_status(db)
+        print(f"✅ Rebuilt current status for {count} students")
+    finally:
+        db.close()
+
+
+def purge_analytics_cache():
+    """Remove expired ANALYTICS_CACHE rows."""
+    db = SessionLocal()
+    try:
+        removed = purge_expired(db)
+        print(f"✅ Removed {removed} expired analytics cache entries")
+    finally:
+        db.close()
+
+
+def rebuild_rollups():
+    """Create (if needed) and backfill the hourly/daily attendance rollup tables."""
+    AttendanceHourly.__table__.create(bind=engine, checkfirst=True)
+    AttendanceDailyStudent.__table__.create(bind=engine, checkfirst=True)
+    # Tables created before late OUTs were rolled up
+    ensure_column("ATTENDANCE_DAILY_STUDENTS", "late_out_count", "INT NOT NULL DEFAULT 0")
+    ensure_column("ATTENDANCE_DAILY_STUDENTS", "last_late_out", "DATETIME NULL")
+
+    db = SessionLocal()
+    try:
+        count = rebuild_attendance_rollups(db)
+        print(f"✅ Rolled up {count} attendance records")
+    finally:
+        db.close()
+
+
+def reap_qr_tokens():
+    """Prune expired QR tokens once, the same way the API's background reaper does."""
+    removed = qr_reaper.run_once()
+    stats = qr_reaper.stats()
+    if stats["last_error"]:
+        print(f"❌ QR token pruning failed: {stats['last_error']}")
+    else:
+        print(f"✅ Reclaimed {removed} expired QR tokens ({stats['mode']}, {stats['last_duration_ms']} ms)")
+
+
+def partition_qr_tokens(days_ahead: int):
+    """Convert QR_TOKENS to daily partitions on expires_at (MySQL only)."""
+    reap_qr_tokens()
+
+    db = SessionLocal()
+    try:
+        created = partition_qr_table(db, days_ahead)
+        if created:
+            print(f"✅ QR_TOKENS now has {created} partitions; expired days are dropped by the reaper")
+        else:
+            print("QR_TOKENS is already partitioned")
+    finally:
+        db.close()
+
+
+def add_scan_keys():
+    """Add ATTENDANCE.scan_key and its unique index, used by offline gate terminal uploads."""
+    ensure_column("ATTENDANCE", "scan_key", "VARCHAR(64) NULL")
+
+    indexes = [i["name"] for i in inspect(engine).get_indexes("ATTENDANCE")]
+    if "idx_attendance_scan_key" not in indexes:
+        print("Adding unique index ATTENDANCE.idx_attendance_scan_key...")
+        with engine.begin() as conn:
+            conn.execute(text("CREATE UNIQUE INDEX idx_attendance_scan_key ON ATTENDANCE (scan_key)"))
+    print("✅ ATTENDANCE is ready for offline scan uploads")
+
+
+def add_attendance_indexes():
+    """Add the composite ATTENDANCE indexes declared in schema.sql to older databases."""
+    indexes = [i["name"] for i in inspect(engine).get_indexes("ATTENDANCE")]
+    for name, columns in (
+        ("idx_attendance_student_time", "student_id, timestamp"),
+        ("idx_attendance_type_time", "type, timestamp"),
+    ):
+        if name not in indexes:
+            print(f"Adding index ATTENDANCE.{name}...")
+            with engine.begin() as conn:
+                conn.execute(text(f"CREATE INDEX {name} ON ATTENDANCE ({columns})"))
+    print("✅ ATTENDANCE indexes are up to date")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SmartHostel database maintenance")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    histograms = subparsers.add_parser("backfill-histograms", help="Precompute face histograms for existing rows")
+    histograms.add_argument("--batch-size", type=int, default=100)
+
+    encodings = subparsers.add_parser("migrate-encodings", help="Convert JSON face encodings to binary float32")
+    encodings.add_argument("--batch-size", type=int, default=1000)
+
+    subparsers.add_parser("rebuild-status", help="Recompute current IN/OUT status per student")
+    subparsers.add_parser("purge-analytics-cache", help="Delete expired analytics cache rows")
+    subparsers.add_parser("rebuild-rollups", help="Backfill hourly/daily attendance rollups")
+    subparsers.add_parser("reap-qr-tokens", help="Delete expired QR tokens")
+
+    partitions = subparsers.add_parser("partition-qr-tokens", help="Partition QR_TOKENS by day so pruning drops partitions")
+    partitions.add_argument("--days-ahead", type=int, default=3)
+
+    subparsers.add_parser("add-scan-keys", help="Add the column that makes offline scan uploads idempotent")
+    subparsers.add_parser("add-attendance-indexes", help="Add composite indexes for attendance range queries")
+
+    args = parser.parse_args()
+
+    if args.command == "backfill-histograms":
+        backfill_histograms(args.batch_size)
+    elif args.command == "migrate-encodings":
+        migrate_encodings(args.batch_size)
+    elif args.command == "rebuild-status":
+        rebuild_status()
+    elif args.command == "purge-analytics-cache":
+        purge_analytics_cache()
+    elif args.command == "rebuild-rollups":
+        rebuild_rollups()
+    elif args.command == "reap-qr-tokens":
+        reap_qr_tokens()
+    elif args.command == "partition-qr-tokens":
+        partition_qr_tokens(args.days_ahead)
+    elif args.command == "add-scan-keys":
+        add_scan_keys()
+    elif args.command == "add-attendance-indexes":
+        add_attendance_indexes()
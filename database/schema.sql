@@ -91,12 +91,43 @@ CREATE TABLE ATTENDANCE (
     remarks VARCHAR(255),
     location VARCHAR(50) DEFAULT 'Main Gate',
     verified_by VARCHAR(11),
+    scan_key VARCHAR(64) NULL,  -- set for offline gate scans; makes batch uploads idempotent
     FOREIGN KEY (student_id) REFERENCES STUDENTS(student_id) ON DELETE CASCADE,
     FOREIGN KEY (verified_by) REFERENCES EMPLOYEES(ssn) ON DELETE SET NULL,
     INDEX idx_attendance_student (student_id),
     INDEX idx_attendance_timestamp (timestamp),
     INDEX idx_attendance_type (type),
-    INDEX idx_attendance_student_time (student_id, timestamp)
+    INDEX idx_attendance_student_time (student_id, timestamp),
+    INDEX idx_attendance_type_time (type, timestamp),
+    UNIQUE INDEX idx_attendance_scan_key (scan_key)
+) ENGINE=InnoDB;
+
+-- ATTENDANCE_STATUS TABLE (Current IN/OUT status per student, maintained by the app)
+CREATE TABLE ATTENDANCE_STATUS (
+    student_id INT PRIMARY KEY,
+    status ENUM('IN', 'OUT') NOT NULL,
+    last_timestamp DATETIME NOT NULL,
+    FOREIGN KEY (student_id) REFERENCES STUDENTS(student_id) ON DELETE CASCADE,
+    INDEX idx_status_status (status)
+) ENGINE=InnoDB;
+
+-- ATTENDANCE_HOURLY TABLE (IN/OUT counts per hour, maintained by the app)
+CREATE TABLE ATTENDANCE_HOURLY (
+    bucket DATETIME PRIMARY KEY,
+    in_count INT NOT NULL DEFAULT 0,
+    out_count INT NOT NULL DEFAULT 0
+) ENGINE=InnoDB;
+
+-- ATTENDANCE_DAILY_STUDENTS TABLE (Per-student IN/OUT counts per day, maintained by the app)
+CREATE TABLE ATTENDANCE_DAILY_STUDENTS (
+    day DATE NOT NULL,
+    student_id INT NOT NULL,
+    in_count INT NOT NULL DEFAULT 0,
+    out_count INT NOT NULL DEFAULT 0,
+    late_out_count INT NOT NULL DEFAULT 0,  -- OUTs at or after the curfew hour
+    last_late_out DATETIME NULL,
+    PRIMARY KEY (day, student_id),
+    FOREIGN KEY (student_id) REFERENCES STUDENTS(student_id) ON DELETE CASCADE
 ) ENGINE=InnoDB;
 
 -- =====================================================
@@ -294,17 +325,9 @@ DELIMITER ;
 -- TRIGGERS
 -- =====================================================
 
-DELIMITER //
-
--- Trigger: Clean expired QR tokens
-CREATE TRIGGER clean_expired_qr_tokens
-BEFORE INSERT ON QR_TOKENS
-FOR EACH ROW
-BEGIN
-    DELETE FROM QR_TOKENS WHERE expires_at < NOW();
-END //
-
-DELIMITER ;
+-- Expired QR tokens are pruned by the API's background reaper in bounded
+-- batches (or by dropping daily partitions after
+-- `python database/maintenance.py partition-qr-tokens`), not by a trigger.
 
 -- =====================================================
 -- INITIAL DATA
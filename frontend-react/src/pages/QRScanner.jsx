@@ -1,10 +1,23 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { motion, AnimatePresence } from 'framer-motion';
 import { Scanner } from '@yudiel/react-qr-scanner';
-import { Camera, CheckCircle, XCircle, AlertCircle, Zap, ArrowRight, LogIn, LogOut as LogOutIcon, RotateCcw } from 'lucide-react';
+import { Camera, CheckCircle, XCircle, AlertCircle, Zap, ArrowRight, LogIn, LogOut as LogOutIcon, RotateCcw, CloudOff, RefreshCw } from 'lucide-react';
 import AdminLayout from '../layouts/AdminLayout';
-import { attendanceAPI } from '../utils/api';
+import { attendanceAPI, offlineScanningEnabled } from '../utils/api';
+
+// Scans that could not reach the server, kept across reloads until uploaded
+const QUEUE_STORAGE_KEY = 'gateScanQueue';
+// Queued scans the server rejected, kept until the operator has seen them
+const REJECTED_STORAGE_KEY = 'gateScanRejected';
+const TERMINAL_STORAGE_KEY = 'gateTerminalId';
+const UPLOAD_BATCH_SIZE = 500;
+const SYNC_INTERVAL_MS = 15000;
+
+const loadQueue = () => JSON.parse(localStorage.getItem(QUEUE_STORAGE_KEY) || '[]');
+const saveQueue = (queue) => localStorage.setItem(QUEUE_STORAGE_KEY, JSON.stringify(queue));
+const loadRejected = () => JSON.parse(localStorage.getItem(REJECTED_STORAGE_KEY) || '[]');
+const saveRejected = (rejected) => localStorage.setItem(REJECTED_STORAGE_KEY, JSON.stringify(rejected));
 
 export default function QRScanner({ onLogout }) {
     const navigate = useNavigate();
@@ -17,6 +30,83 @@ export default function QRScanner({ onLogout }) {
     // Scanner Mode: 'AUTO', 'IN', 'OUT'
     const [scanMode, setScanMode] = useState('AUTO');
 
+    // Offline queue: scans keep their original time and are uploaded in batches
+    const [pendingScans, setPendingScans] = useState(() => loadQueue().length);
+    const [syncing, setSyncing] = useState(false);
+    const [rejectedScans, setRejectedScans] = useState(loadRejected);
+    const syncingRef = useRef(false);
+
+    const queueScan = (payload) => {
+        const queue = [...loadQueue(), { ...payload, scanned_at: new Date().toISOString() }];
+        saveQueue(queue);
+        setPendingScans(queue.length);
+    };
+
+    const syncQueue = async () => {
+        if (syncingRef.current || loadQueue().length === 0) return;
+        syncingRef.current = true;
+        setSyncing(true);
+        try {
+            let queue = loadQueue();
+            while (queue.length > 0) {
+                const batch = queue.slice(0, UPLOAD_BATCH_SIZE);
+                const terminalId = localStorage.getItem(TERMINAL_STORAGE_KEY) || 'Main Gate';
+                const response = await attendanceAPI.uploadScanBatch(terminalId, batch);
+
+                // Keep rejected scans for the operator before they leave the queue
+                const rejectedNow = response.data.results
+                    .filter(r => r.status === 'rejected')
+                    .map(r => ({ ...batch[r.index], student_id: r.student_id, reason: r.reason }));
+                if (rejectedNow.length > 0) {
+                    const kept = [...loadRejected(), ...rejectedNow];
+                    saveRejected(kept);
+                    setRejectedScans(kept);
+                }
+
+                // Every scan in the batch has a result now; scans queued meanwhile were appended
+                queue = loadQueue().slice(batch.length);
+                saveQueue(queue);
+                setPendingScans(queue.length);
+
+                const { recorded, duplicates, rejected } = response.data;
+                setRecentScans(prev => [
+                    {
+                        student: `Offline batch: ${recorded} recorded`,
+                        type: 'SYNCED',
+                        time: new Date().toLocaleTimeString(),
+                        success: rejected === 0,
+                        error: rejected || duplicates
+                            ? `${duplicates} duplicate, ${rejected} rejected`
+                            : null
+                    },
+                    ...prev.slice(0, 9)
+                ]);
+            }
+        } catch (err) {
+            // Still offline, or the server refused the batch; keep the queue and retry later
+            console.error('Offline scan upload failed:', err);
+        } finally {
+            syncingRef.current = false;
+            setSyncing(false);
+        }
+    };
+
+    const dismissRejected = () => {
+        saveRejected([]);
+        setRejectedScans([]);
+    };
+
+    useEffect(() => {
+        if (!offlineScanningEnabled) return;
+        syncQueue();
+        window.addEventListener('online', syncQueue);
+        const timer = setInterval(syncQueue, SYNC_INTERVAL_MS);
+        return () => {
+            window.removeEventListener('online', syncQueue);
+            clearInterval(timer);
+        };
+    }, []);
+
     const handleScan = async (result) => {
         if (!result || processing) return;
 
@@ -62,6 +152,34 @@ export default function QRScanner({ onLogout }) {
             }, 3000);
 
         } catch (err) {
+            if (!err.response && offlineScanningEnabled) {
+                // No answer from the server: record the scan locally and upload it later
+                const payload = { token: qrData };
+                if (scanMode !== 'AUTO') {
+                    payload.type = scanMode;
+                }
+                queueScan(payload);
+
+                const time = new Date().toLocaleTimeString();
+                setResult({
+                    success: true,
+                    message: 'Saved offline, will sync when the connection is back',
+                    student: 'Pending upload',
+                    type: payload.type || 'QUEUED',
+                    timestamp: time
+                });
+                setRecentScans(prev => [
+                    { student: 'Pending upload', type: 'QUEUED', time, success: true },
+                    ...prev.slice(0, 9)
+                ]);
+
+                setTimeout(() => {
+                    setResult(null);
+                    setProcessing(false);
+                }, 3000);
+                return;
+            }
+
             const errorMsg = err.response?.data?.detail || 'Failed to process QR code';
             setError(errorMsg);
 
@@ -118,6 +236,18 @@ export default function QRScanner({ onLogout }) {
                                     Live Scanner
                                 </h2>
 
+                                {/* Offline queue */}
+                                {pendingScans > 0 && (
+                                    <button
+                                        onClick={syncQueue}
+                                        disabled={syncing}
+                                        className="px-3 py-2 rounded-lg text-sm font-medium flex items-center gap-2 bg-yellow-500/20 text-yellow-300 hover:bg-yellow-500/30 disabled:opacity-60"
+                                    >
+                                        {syncing ? <RefreshCw className="w-4 h-4 animate-spin" /> : <CloudOff className="w-4 h-4" />}
+                                        {pendingScans} pending
+                                    </button>
+                                )}
+
                                 {/* Mode Selector */}
                                 <div className="flex bg-white/10 p-1 rounded-lg">
                                     <button
@@ -234,7 +364,7 @@ export default function QRScanner({ onLogout }) {
                                                 <p className="text-white/80 mt-1">
                                                     <span className="font-semibold">{result.student}</span>
                                                     {' • '}
-                                                    <span className={`badge ${result.type === 'IN' ? 'badge-success' : 'badge-warning'}`}>
+                                                    <span className={`badge ${result.type === 'IN' ? 'badge-success' : result.type === 'QUEUED' ? 'badge-info' : 'badge-warning'}`}>
                                                         {result.type}
                                                     </span>
                                                     {' • '}
@@ -263,6 +393,35 @@ export default function QRScanner({ onLogout }) {
                                 )}
                             </AnimatePresence>
 
+                            {/* Offline scans the server rejected */}
+                            {rejectedScans.length > 0 && (
+                                <div className="mt-4 bg-red-500/10 border border-red-500/30 rounded-xl p-4">
+                                    <div className="flex items-center justify-between mb-2">
+                                        <h3 className="font-semibold text-red-300 flex items-center gap-2">
+                                            <XCircle className="w-4 h-4" />
+                                            {rejectedScans.length} offline scan{rejectedScans.length === 1 ? '' : 's'} not recorded
+                                        </h3>
+                                        <button
+                                            onClick={dismissRejected}
+                                            className="text-sm text-white/60 hover:text-white"
+                                        >
+                                            Dismiss
+                                        </button>
+                                    </div>
+                                    <ul className="space-y-1 text-sm text-white/70 max-h-40 overflow-y-auto">
+                                        {rejectedScans.map((scan, idx) => (
+                                            <li key={idx}>
+                                                {new Date(scan.scanned_at).toLocaleString()}
+                                                {' • '}
+                                                {scan.student_id ? `Student ID: ${scan.student_id}` : 'Unknown student'}
+                                                {' • '}
+                                                {scan.reason}
+                                            </li>
+                                        ))}
+                                    </ul>
+                                </div>
+                            )}
+
                             {/* Instructions */}
                             <div className="mt-6 bg-blue-500/10 border border-blue-500/30 rounded-xl p-4">
                                 <h3 className="font-semibold text-blue-300 mb-2 flex items-center gap-2">
@@ -318,7 +477,8 @@ export default function QRScanner({ onLogout }) {
                                             <div className="flex items-center justify-between text-xs text-white/60">
                                                 <span className={`badge ${scan.type === 'IN' ? 'badge-success' :
                                                     scan.type === 'OUT' ? 'badge-warning' :
-                                                        'badge-danger'
+                                                        scan.type === 'QUEUED' || scan.type === 'SYNCED' ? 'badge-info' :
+                                                            'badge-danger'
                                                     }`}>
                                                     {scan.type}
                                                 </span>
@@ -25,7 +25,7 @@ export default function StudentDashboard({ onLogout }) {
         try {
             const [profileRes, attendanceRes, messRes] = await Promise.all([
                 studentAPI.getProfile(),
-                studentAPI.getAttendance(),
+                studentAPI.getAttendance({ limit: 10 }),
                 studentAPI.getMessHistory(),
             ]);
 
@@ -2,26 +2,32 @@ import { useState, useEffect } from 'react';
 import { motion } from 'framer-motion';
 import { Calendar, Clock, MapPin, Search } from 'lucide-react';
 import AdminLayout from '../../layouts/AdminLayout';
-import { attendanceAPI } from '../../utils/api';
+import { attendanceAPI, nextCursor, subscribeLiveEvents } from '../../utils/api';
 
 export default function AdminAttendancePage({ onLogout }) {
     const [attendance, setAttendance] = useState([]);
     const [loading, setLoading] = useState(true);
     const [filterId, setFilterId] = useState('');
     const [selectedDate, setSelectedDate] = useState(new Date().toISOString().split('T')[0]);
+    const [cursor, setCursor] = useState(null);
 
     useEffect(() => {
         loadAttendance();
-        const interval = setInterval(loadAttendance, 5000);
-        return () => clearInterval(interval);
+        // Reload only when a scan lands on the selected day
+        return subscribeLiveEvents({
+            attendance: (event) => {
+                if (event.timestamp.startsWith(selectedDate)) loadAttendance();
+            },
+            resync: () => loadAttendance(),
+        });
     }, [selectedDate]);
 
-    const loadAttendance = async () => {
+    const loadAttendance = async (after = null) => {
         try {
-            const response = await attendanceAPI.getTodayAttendance(selectedDate);
-            // Ensure sorting by timestamp desc in case backend didn't
-            const sortedData = response.data.sort((a, b) => new Date(b.timestamp) - new Date(a.timestamp));
-            setAttendance(sortedData);
+            // Newest first; later pages are older records
+            const response = await attendanceAPI.getTodayAttendance(selectedDate, after && { cursor: after });
+            setAttendance(prev => after ? [...prev, ...response.data] : response.data);
+            setCursor(nextCursor(response));
             setLoading(false);
         } catch (error) {
             console.error('Error loading attendance:', error);
@@ -127,6 +133,13 @@ export default function AdminAttendancePage({ onLogout }) {
                             </tbody>
                         </table>
                     </div>
+                    {cursor && (
+                        <div className="p-4 text-center border-t border-white/10">
+                            <button onClick={() => loadAttendance(cursor)} className="btn-secondary">
+                                Load more
+                            </button>
+                        </div>
+                    )}
                 </div>
             </div>
         </AdminLayout>
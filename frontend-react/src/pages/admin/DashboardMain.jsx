@@ -3,7 +3,7 @@ import { motion } from 'framer-motion';
 import { Users, CheckCircle, XCircle, AlertTriangle } from 'lucide-react';
 import { PieChart, Pie, Cell, BarChart, Bar, XAxis, YAxis, CartesianGrid, Tooltip, Legend, ResponsiveContainer } from 'recharts';
 import AdminLayout from '../../layouts/AdminLayout';
-import { adminAPI } from '../../utils/api';
+import { adminAPI, subscribeLiveEvents } from '../../utils/api';
 
 export default function AdminDashboardMain({ onLogout }) {
     const [dashboard, setDashboard] = useState(null);
@@ -11,10 +11,41 @@ export default function AdminDashboardMain({ onLogout }) {
 
     useEffect(() => {
         loadDashboard();
-        const interval = setInterval(loadDashboard, 5000); // Auto-refresh every 5 seconds
-        return () => clearInterval(interval);
+        // Apply live IN/OUT and violation deltas; reload only when meal or room numbers change
+        return subscribeLiveEvents({
+            attendance: applyAttendance,
+            violation: applyViolation,
+            opt_out: loadDashboard,
+            student: loadDashboard,
+            room_assignment: loadDashboard,
+            resync: loadDashboard,
+        });
     }, []);
 
+    const applyAttendance = (event) => {
+        if (event.type === event.previous_type) return;
+        setDashboard((current) => {
+            if (!current) return current;
+            const delta = { present_students: 0, out_students: 0 };
+            if (event.type === 'IN') delta.present_students += 1;
+            if (event.type === 'OUT') delta.out_students += 1;
+            if (event.previous_type === 'IN') delta.present_students -= 1;
+            if (event.previous_type === 'OUT') delta.out_students -= 1;
+            return {
+                ...current,
+                present_students: current.present_students + delta.present_students,
+                out_students: current.out_students + delta.out_students,
+            };
+        });
+    };
+
+    const applyViolation = (event) => {
+        setDashboard((current) => current && {
+            ...current,
+            pending_violations: current.pending_violations + (event.resolved ? -1 : 1),
+        });
+    };
+
     const loadDashboard = async () => {
         try {
             const response = await adminAPI.getDashboard();
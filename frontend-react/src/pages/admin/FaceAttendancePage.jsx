@@ -3,7 +3,7 @@ import { motion } from 'framer-motion';
 import Webcam from 'react-webcam';
 import { ScanFace, UserPlus, Check, X, Camera, RefreshCw } from 'lucide-react';
 import AdminLayout from '../../layouts/AdminLayout';
-import { faceAPI, adminAPI } from '../../utils/api';
+import { faceAPI, adminAPI, fetchAllPages } from '../../utils/api';
 
 export default function FaceAttendancePage({ onLogout }) {
     const [mode, setMode] = useState('attendance'); // 'attendance' or 'register'
@@ -20,8 +20,9 @@ export default function FaceAttendancePage({ onLogout }) {
     // Fetch students list for registration
     const loadStudents = async () => {
         try {
-            const res = await adminAPI.getStudents({});
-            setStudents(res.data);
+            setStudents(await fetchAllPages(adminAPI.getStudents, {
+                fields: 'student_id,first_name,last_name,roll_number',
+            }));
         } catch (err) {
             console.error("Failed to load students", err);
         }
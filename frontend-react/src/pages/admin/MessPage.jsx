@@ -3,7 +3,7 @@ import { motion } from 'framer-motion';
 import { Utensils, TrendingUp } from 'lucide-react';
 import { BarChart, Bar, XAxis, YAxis, CartesianGrid, Tooltip, ResponsiveContainer } from 'recharts';
 import AdminLayout from '../../layouts/AdminLayout';
-import { messAPI, adminAPI } from '../../utils/api';
+import { messAPI, adminAPI, subscribeLiveEvents } from '../../utils/api';
 
 export default function AdminMessPage({ onLogout }) {
     const [loading, setLoading] = useState(true);
@@ -12,8 +12,11 @@ export default function AdminMessPage({ onLogout }) {
 
     useEffect(() => {
         loadMessStats();
-        const interval = setInterval(loadMessStats, 5000);
-        return () => clearInterval(interval);
+        return subscribeLiveEvents({
+            opt_out: loadMessStats,
+            student: loadMessStats,
+            resync: loadMessStats,
+        });
     }, []);
 
     const loadMessStats = async () => {
@@ -3,7 +3,7 @@ import { useNavigate } from 'react-router-dom';
 import { motion } from 'framer-motion';
 import { Users, Search, Filter } from 'lucide-react';
 import AdminLayout from '../../layouts/AdminLayout';
-import { adminAPI } from '../../utils/api';
+import { adminAPI, nextCursor, subscribeLiveEvents } from '../../utils/api';
 
 export default function AdminStudentsPage({ onLogout }) {
     const navigate = useNavigate();
@@ -11,17 +11,31 @@ export default function AdminStudentsPage({ onLogout }) {
     const [loading, setLoading] = useState(true);
     const [searchTerm, setSearchTerm] = useState('');
     const [filterDept, setFilterDept] = useState('');
+    const [cursor, setCursor] = useState(null);
 
     useEffect(() => {
-        loadStudents();
-        const interval = setInterval(loadStudents, 5000);
-        return () => clearInterval(interval);
-    }, []);
+        // Filtering happens on the server; wait for typing to pause
+        const timeout = setTimeout(() => loadStudents(), 300);
+        const unsubscribe = subscribeLiveEvents({
+            student: () => loadStudents(),
+            room_assignment: () => loadStudents(),
+            resync: () => loadStudents(),
+        });
+        return () => {
+            clearTimeout(timeout);
+            unsubscribe();
+        };
+    }, [searchTerm, filterDept]);
 
-    const loadStudents = async () => {
+    const loadStudents = async (after = null) => {
         try {
-            const response = await adminAPI.getStudents({});
-            setStudents(response.data);
+            const response = await adminAPI.getStudents({
+                search: searchTerm || undefined,
+                department: filterDept || undefined,
+                ...(after && { cursor: after }),
+            });
+            setStudents(prev => after ? [...prev, ...response.data] : response.data);
+            setCursor(nextCursor(response));
             setLoading(false);
         } catch (error) {
             console.error('Error loading students:', error);
@@ -29,17 +43,6 @@ export default function AdminStudentsPage({ onLogout }) {
         }
     };
 
-    const filteredStudents = students.filter(student => {
-        const matchesSearch =
-            student.first_name.toLowerCase().includes(searchTerm.toLowerCase()) ||
-            student.last_name.toLowerCase().includes(searchTerm.toLowerCase()) ||
-            student.roll_number.toLowerCase().includes(searchTerm.toLowerCase());
-
-        const matchesDept = filterDept ? student.department === filterDept : true;
-
-        return matchesSearch && matchesDept;
-    });
-
     return (
         <AdminLayout onLogout={onLogout}>
             <div className="max-w-6xl mx-auto">
@@ -112,14 +115,14 @@ export default function AdminStudentsPage({ onLogout }) {
                                             <div className="inline-block w-8 h-8 border-4 border-blue-500 border-t-transparent rounded-full animate-spin" />
                                         </td>
                                     </tr>
-                                ) : filteredStudents.length === 0 ? (
+                                ) : students.length === 0 ? (
                                     <tr>
                                         <td colSpan="4" className="px-6 py-12 text-center text-white/40">
                                             No students found matching criteria
                                         </td>
                                     </tr>
                                 ) : (
-                                    filteredStudents.map((student) => (
+                                    students.map((student) => (
                                         <tr key={student.student_id} className="hover:bg-white/5 transition-colors">
                                             <td className="px-6 py-4 whitespace-nowrap">
                                                 <div className="flex items-center">
@@ -160,6 +163,13 @@ export default function AdminStudentsPage({ onLogout }) {
                             </tbody>
                         </table>
                     </div>
+                    {cursor && (
+                        <div className="p-4 text-center border-t border-white/10">
+                            <button onClick={() => loadStudents(cursor)} className="btn-secondary">
+                                Load more
+                            </button>
+                        </div>
+                    )}
                 </div>
             </div>
         </AdminLayout>
@@ -2,7 +2,7 @@ import { useState, useEffect } from 'react';
 import { motion } from 'framer-motion';
 import { AlertTriangle, ShieldAlert, CheckCircle } from 'lucide-react';
 import AdminLayout from '../../layouts/AdminLayout';
-import { adminAPI } from '../../utils/api';
+import { adminAPI, subscribeLiveEvents } from '../../utils/api';
 
 export default function AdminViolationsPage({ onLogout }) {
     const [violations, setViolations] = useState([]);
@@ -10,8 +10,10 @@ export default function AdminViolationsPage({ onLogout }) {
 
     useEffect(() => {
         loadViolations();
-        const interval = setInterval(loadViolations, 5000);
-        return () => clearInterval(interval);
+        return subscribeLiveEvents({
+            violation: loadViolations,
+            resync: loadViolations,
+        });
     }, []);
 
     const loadViolations = async () => {
@@ -2,7 +2,7 @@ import { useState, useEffect } from 'react';
 import { motion } from 'framer-motion';
 import { Calendar, Clock, MapPin, Filter } from 'lucide-react';
 import StudentLayout from '../../layouts/StudentLayout';
-import { studentAPI } from '../../utils/api';
+import { studentAPI, fetchAllPages } from '../../utils/api';
 
 export default function StudentAttendancePage({ onLogout }) {
     const [attendance, setAttendance] = useState([]);
@@ -15,8 +15,7 @@ export default function StudentAttendancePage({ onLogout }) {
 
     const loadAttendance = async () => {
         try {
-            const response = await studentAPI.getAttendance();
-            setAttendance(response.data);
+            setAttendance(await fetchAllPages(studentAPI.getAttendance));
             setLoading(false);
         } catch (error) {
             console.error('Error loading attendance:', error);
@@ -6,7 +6,7 @@ import {
 } from 'lucide-react';
 import { PieChart, Pie, Cell, ResponsiveContainer, Tooltip } from 'recharts';
 import StudentLayout from '../../layouts/StudentLayout';
-import { studentAPI } from '../../utils/api';
+import { studentAPI, fetchAllPages } from '../../utils/api';
 
 export default function StudentDashboardMain({ onLogout }) {
     const navigate = useNavigate();
@@ -20,12 +20,12 @@ export default function StudentDashboardMain({ onLogout }) {
 
     const loadData = async () => {
         try {
-            const [profileRes, attendanceRes] = await Promise.all([
+            const [profileRes, attendanceRecords] = await Promise.all([
                 studentAPI.getProfile(),
-                studentAPI.getAttendance(),
+                fetchAllPages(studentAPI.getAttendance),
             ]);
             setProfile(profileRes.data);
-            setAttendance(attendanceRes.data);
+            setAttendance(attendanceRecords);
             setLoading(false);
         } catch (error) {
             console.error('Error loading data:', error);
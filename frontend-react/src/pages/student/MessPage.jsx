@@ -2,7 +2,7 @@ import { useState, useEffect } from 'react';
 import { motion } from 'framer-motion';
 import { Utensils, Calendar, AlertCircle, History, Clock } from 'lucide-react';
 import StudentLayout from '../../layouts/StudentLayout';
-import { messAPI } from '../../utils/api';
+import { messAPI, fetchAllPages } from '../../utils/api';
 
 export default function StudentMessPage({ onLogout }) {
     const [menu, setMenu] = useState(null);
@@ -21,12 +21,12 @@ export default function StudentMessPage({ onLogout }) {
     const loadData = async () => {
         setLoading(true);
         try {
-            const [menuRes, historyRes] = await Promise.all([
+            const [menuRes, historyRecords] = await Promise.all([
                 messAPI.getMenu(selectedDate).catch(() => ({ data: [] })),
-                messAPI.getHistory().catch(() => ({ data: [] }))
+                fetchAllPages(messAPI.getHistory).catch(() => [])
             ]);
             setMenu(menuRes.data);
-            setHistory(historyRes.data);
+            setHistory(historyRecords);
             setLoading(false);
         } catch (error) {
             console.error('Error loading mess data:', error);
@@ -4,15 +4,32 @@ import { QrCode as QrCodeIcon, Clock, RefreshCw } from 'lucide-react';
 import StudentLayout from '../../layouts/StudentLayout';
 import { attendanceAPI } from '../../utils/api';
 
+// Draws the module matrix from /attendance/generate-qr?format=matrix:
+// one hex string per row, most significant bit first, 1 = dark module.
+function QRMatrix({ rows, border = 4 }) {
+    const size = rows.length + 2 * border;
+    const path = rows.map((hex, y) => {
+        const bits = hex.split('').map(h => parseInt(h, 16).toString(2).padStart(4, '0')).join('').slice(0, rows.length);
+        return bits.split('').map((bit, x) => bit === '1' ? `M${x + border} ${y + border}h1v1h-1z` : '').join('');
+    }).join('');
+
+    return (
+        <svg viewBox={`0 0 ${size} ${size}`} shapeRendering="crispEdges" className="w-64 h-64" role="img" aria-label="QR Code">
+            <rect width={size} height={size} fill="#fff" />
+            <path d={path} fill="#000" />
+        </svg>
+    );
+}
+
 export default function StudentQRPage({ onLogout }) {
     const [qrCode, setQrCode] = useState(null);
     const [loading, setLoading] = useState(false);
     const [timeLeft, setTimeLeft] = useState(null);
 
-    const generateQR = async () => {
+    const generateQR = async (refresh = false) => {
         setLoading(true);
         try {
-            const response = await attendanceAPI.generateQR();
+            const response = await attendanceAPI.generateQR({ format: 'matrix', refresh });
             setQrCode(response.data);
             startCountdown(response.data.expires_at);
         } catch (error) {
@@ -61,11 +78,7 @@ export default function StudentQRPage({ onLogout }) {
                             animate={{ scale: 1 }}
                             className="bg-white p-6 rounded-2xl inline-block mb-6"
                         >
-                            <img
-                                src={`data:image/png;base64,${qrCode.qr_image_base64}`}
-                                alt="QR Code"
-                                className="w-64 h-64"
-                            />
+                            <QRMatrix rows={qrCode.qr_matrix} />
                         </motion.div>
                     )}
 
@@ -78,7 +91,7 @@ export default function StudentQRPage({ onLogout }) {
                     )}
 
                     <button
-                        onClick={generateQR}
+                        onClick={() => generateQR(true)}
                         disabled={loading}
                         className="btn-primary flex items-center gap-2 mx-auto"
                     >
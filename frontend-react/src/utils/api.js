@@ -2,6 +2,9 @@ import axios from 'axios';
 
 const API_BASE_URL = 'http://localhost:8000';
 
+// Offline queue for the scanner page; the server must have GATE_OFFLINE_UPLOADS enabled
+export const offlineScanningEnabled = import.meta.env.VITE_OFFLINE_SCANNING === 'true';
+
 const api = axios.create({
     baseURL: API_BASE_URL,
     headers: {
@@ -37,18 +40,20 @@ export const authAPI = {
 };
 
 export const attendanceAPI = {
-    generateQR: () => api.post('/attendance/generate-qr'),
+    generateQR: (params) => api.post('/attendance/generate-qr', null, { params }),
     scanQR: (data) => api.post('/attendance/scan', data),
     scan: (token) => api.post('/attendance/scan', { token }),
+    // scans: [{ token, scanned_at (ISO string), type? }] captured while offline
+    uploadScanBatch: (terminalId, scans) => api.post('/attendance/scan-batch', { terminal_id: terminalId, scans }),
     getHistory: (studentId, params) => api.get(`/attendance/student/${studentId}`, { params }),
     getStats: (studentId, year, month) => api.get(`/attendance/student/${studentId}/stats`, { params: { year, month } }),
-    getTodayAttendance: (date) => api.get(`/attendance/daily/${date}`),
+    getTodayAttendance: (date, params) => api.get(`/attendance/daily/${date}`, { params }),
 };
 
 export const studentAPI = {
     getProfile: () => api.get('/student/profile'),
     updateProfile: (data) => api.put('/student/profile', data),
-    getAttendance: () => api.get('/student/attendance'),
+    getAttendance: (params) => api.get('/student/attendance', { params }),
     getMessHistory: () => api.get('/student/mess/history'),
 };
 
@@ -58,19 +63,20 @@ export const messAPI = {
     getMenu: (date) => api.get(`/mess/menu/${date}`),
     updatePreference: (preference) => api.put('/mess/preference', { dietary_preference: preference }),
     getForecast: (targetDate, mealTime) => api.get('/mess/demand-forecast', { params: { target_date: targetDate, meal_time: mealTime } }),
-    getHistory: () => api.get('/mess/history'),
+    getHistory: (params) => api.get('/mess/history', { params }),
 };
 
 export const adminAPI = {
     getStudents: (params) => api.get('/admin/students', { params }),
     createStudent: (data) => api.post('/admin/students', data),
     assignRoom: (data) => api.post('/admin/rooms/assign', data),
-    getViolations: (resolved = false) => api.get('/admin/violations', { params: { resolved } }),
+    getViolations: (resolved = false, params) => api.get('/admin/violations', { params: { resolved, ...params } }),
     getFrequentAbsent: (days, threshold) => api.get('/admin/students/absent', { params: { days, threshold } }),
     getDashboard: () => api.get('/admin/dashboard'),
     resolveViolation: (violationId) => api.put(`/admin/violations/${violationId}/resolve`),
     checkCurfew: () => api.post('/admin/violations/check-curfew'),
     getAvailableRooms: (block) => api.get('/admin/rooms/available', { params: { block } }),
+    allotRooms: (data) => api.post('/admin/rooms/allot', data),
     registerStudent: (data) => api.post('/admin/register-student', data),
 };
 
@@ -92,6 +98,46 @@ export const faceAPI = {
     recognize: (formData) => api.post('/admin/face/recognize', formData, {
         headers: { 'Content-Type': 'multipart/form-data' }
     }),
+    recognizeBatch: (formData) => api.post('/admin/face/recognize-batch', formData, {
+        headers: { 'Content-Type': 'multipart/form-data' }
+    }),
+};
+
+// Listing endpoints are paginated: the next page's cursor comes back in the
+// X-Next-Cursor header (null on the last page).
+export const nextCursor = (response) => response.headers['x-next-cursor'] || null;
+
+// Follow cursors until a listing is exhausted. Meant for small lists such as
+// dropdowns or one student's own history; pass fields to keep each page light.
+export const fetchAllPages = async (request, params = {}) => {
+    const items = [];
+    let cursor = null;
+    do {
+        const response = await request({ ...params, limit: 500, ...(cursor && { cursor }) });
+        items.push(...response.data);
+        cursor = nextCursor(response);
+    } while (cursor);
+    return items;
+};
+
+// Live admin updates over server-sent events.
+// handlers maps event names (attendance, violation, opt_out, student, room_assignment, resync)
+// to callbacks. "resync" also fires after a reconnect, since events may have been missed.
+// Returns a function that closes the stream.
+export const subscribeLiveEvents = (handlers) => {
+    const token = localStorage.getItem('token');
+    const source = new EventSource(`${API_BASE_URL}/events?token=${encodeURIComponent(token)}`);
+    let connected = false;
+
+    source.onopen = () => {
+        if (connected) handlers.resync?.({});
+        connected = true;
+    };
+    Object.entries(handlers).forEach(([event, handler]) => {
+        source.addEventListener(event, (e) => handler(JSON.parse(e.data)));
+    });
+
+    return () => source.close();
 };
 
 export default api;
@@ -0,0 +1,24 @@
+import pytest
+from sqlalchemy import create_engine, pool
+from sqlalchemy.orm import sessionmaker
+from app.database import Base
+
+
+@pytest.fixture
+def engine():
+    """Fresh in-memory SQLite database with the ORM schema."""
+    engine = create_engine(
+        "sqlite:///:memory:",
+        poolclass=pool.StaticPool,
+        connect_args={"check_same_thread": False}
+    )
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    yield session
+    session.close()
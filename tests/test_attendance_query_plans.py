@@ -0,0 +1,88 @@
+from contextlib import contextmanager
+from datetime import date, datetime
+import pytest
+from fastapi import Response
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+from app.models import Employee, AttendanceType
+from app.pagination import PageParams
+from app.routes import analytics
+from app.routes.attendance import get_daily_attendance
+from app.services.attendance_service import calculate_attendance_stats
+
+RANGE = "timestamp>? AND timestamp<?"
+
+
+@contextmanager
+def captured_plans(db):
+    """
+    SQLite's EXPLAIN QUERY PLAN for every SELECT that reads ATTENDANCE
+    inside the block, so endpoints are checked through their real queries.
+    """
+    engine = db.get_bind()
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and "FROM \"ATTENDANCE\"" in statement:
+            statements.append((statement, parameters))
+
+    plans = []
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield plans
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    for statement, parameters in statements:
+        rows = db.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+        plans.append(" | ".join(row[-1] for row in rows))
+
+
+def assert_range_search(plan: str, index: str):
+    assert f"SEARCH ATTENDANCE USING INDEX {index} (" in plan
+    assert RANGE in plan
+    assert "SCAN ATTENDANCE" not in plan
+
+
+def test_monthly_stats_range_scan_student_index(db):
+    with captured_plans(db) as plans:
+        calculate_attendance_stats(db, 1, 2024, 2)
+
+    records, last = plans  # last: status fallback when there is no ATTENDANCE_STATUS row
+    assert_range_search(records, "idx_attendance_student_time")
+    assert "SEARCH ATTENDANCE USING INDEX idx_attendance_student_time (student_id=?)" in last
+
+
+@pytest.mark.parametrize("student_id, attendance_type, index", [
+    (None, None, "ix_ATTENDANCE_timestamp"),
+    (1, None, "idx_attendance_student_time"),
+    (None, AttendanceType.IN, "idx_attendance_type_time"),
+    (1, AttendanceType.OUT, None),
+])
+def test_daily_attendance_range_scans_with_filters(db, student_id, attendance_type, index):
+    with captured_plans(db) as plans:
+        get_daily_attendance(
+            date(2024, 2, 29), Response(), student_id=student_id, attendance_type=attendance_type,
+            page=PageParams(limit=50, cursor=None, fields=None), current_user=Employee(), db=db
+        )
+
+    (plan,) = plans
+    if index is None:
+        # Either composite index serves student + type; both keep the range
+        assert "SEARCH ATTENDANCE USING INDEX idx_attendance_" in plan and RANGE in plan
+    else:
+        assert_range_search(plan, index)
+    # joinedload(Attendance.student) is a primary key lookup per row
+    assert "SEARCH STUDENTS_1 USING INTEGER PRIMARY KEY" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+def test_csv_export_range_scans_timestamp_index(db, monkeypatch):
+    monkeypatch.setattr(analytics, "SessionLocal", sessionmaker(bind=db.get_bind()))
+
+    with captured_plans(db) as plans:
+        list(analytics._stream_attendance_csv(datetime(2024, 2, 1), datetime(2024, 3, 1)))
+
+    (plan,) = plans
+    assert_range_search(plan, "ix_ATTENDANCE_timestamp")
+    assert "SEARCH STUDENTS USING INTEGER PRIMARY KEY" in plan
+    assert "TEMP B-TREE" not in plan
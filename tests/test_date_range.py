@@ -0,0 +1,77 @@
+from datetime import date, datetime
+import pytest
+from sqlalchemy import func
+from app.models import Attendance
+from app.services.date_range import start_of_day, day_range, days_range, month_range, in_range
+from app.services.attendance_service import attendance_history_query
+
+
+def test_day_range_is_half_open():
+    assert day_range(date(2024, 3, 10)) == (datetime(2024, 3, 10), datetime(2024, 3, 11))
+
+
+def test_day_range_rolls_over_month_and_year():
+    assert day_range(date(2024, 2, 29)) == (datetime(2024, 2, 29), datetime(2024, 3, 1))
+    assert day_range(date(2023, 12, 31)) == (datetime(2023, 12, 31), datetime(2024, 1, 1))
+
+
+def test_days_range_includes_end_date():
+    assert days_range(date(2024, 1, 30), date(2024, 2, 1)) == (datetime(2024, 1, 30), datetime(2024, 2, 2))
+
+
+def test_days_range_open_bounds():
+    assert days_range(None, date(2024, 5, 1)) == (None, datetime(2024, 5, 2))
+    assert days_range(date(2024, 5, 1), None) == (datetime(2024, 5, 1), None)
+    assert days_range(None, None) == (None, None)
+
+
+@pytest.mark.parametrize("year, month, expected", [
+    (2024, 1, (datetime(2024, 1, 1), datetime(2024, 2, 1))),
+    (2024, 2, (datetime(2024, 2, 1), datetime(2024, 3, 1))),
+    (2023, 12, (datetime(2023, 12, 1), datetime(2024, 1, 1))),
+])
+def test_month_range(year, month, expected):
+    assert month_range(year, month) == expected
+
+
+def test_start_of_day():
+    assert start_of_day(date(2024, 7, 4)) == datetime(2024, 7, 4, 0, 0, 0)
+
+
+def test_in_range_bounds(db):
+    for ts in (datetime(2024, 1, 31, 23, 59, 59), datetime(2024, 2, 1), datetime(2024, 2, 29, 23, 59, 59), datetime(2024, 3, 1)):
+        db.add(Attendance(student_id=1, type="IN", timestamp=ts))
+    db.commit()
+
+    start, end = month_range(2024, 2)
+    found = [a.timestamp for a in db.query(Attendance).filter(in_range(Attendance.timestamp, start, end)).order_by(Attendance.timestamp)]
+    assert found == [datetime(2024, 2, 1), datetime(2024, 2, 29, 23, 59, 59)]
+
+    assert db.query(Attendance).filter(in_range(Attendance.timestamp, None, None)).count() == 4
+
+
+def _plan(db, query) -> str:
+    """SQLite's EXPLAIN QUERY PLAN for an ORM query, as one string."""
+    compiled = query.statement.compile(dialect=db.get_bind().dialect)
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    rows = db.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params).all()
+    return " | ".join(row[-1] for row in rows)
+
+
+def test_day_filter_range_scans_timestamp_index(db):
+    start, end = day_range(date(2024, 2, 29))
+    plan = _plan(db, db.query(Attendance).filter(in_range(Attendance.timestamp, start, end)))
+    assert "SEARCH ATTENDANCE USING INDEX" in plan
+    assert "timestamp>" in plan and "timestamp<" in plan
+
+
+def test_student_history_range_scans_composite_index(db):
+    plan = _plan(db, attendance_history_query(db, 1, date(2024, 2, 1), date(2024, 2, 29)))
+    assert "SEARCH ATTENDANCE USING INDEX idx_attendance_student_time" in plan
+    assert "timestamp>" in plan
+
+
+def test_date_function_filter_would_not_use_index(db):
+    # Guards the check itself: the pre-rewrite filter shape scans the table
+    plan = _plan(db, db.query(Attendance).filter(func.date(Attendance.timestamp) == "2024-02-29"))
+    assert "SEARCH ATTENDANCE USING INDEX" not in plan
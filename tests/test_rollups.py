@@ -0,0 +1,43 @@
+from datetime import datetime
+from app.models import Attendance, AttendanceType, AttendanceDailyStudent, Student
+from app.services.rollup_service import record_rollups, rebuild_rollups, is_late_out
+
+
+def daily_rows(db):
+    return {
+        (r.day, r.student_id): (r.in_count, r.out_count, r.late_out_count, r.last_late_out)
+        for r in db.query(AttendanceDailyStudent).all()
+    }
+
+
+def test_is_late_out_uses_curfew_hour():
+    assert is_late_out(AttendanceType.OUT, datetime(2024, 3, 1, 23, 5))
+    assert not is_late_out(AttendanceType.OUT, datetime(2024, 3, 1, 18, 0))
+    assert not is_late_out(AttendanceType.IN, datetime(2024, 3, 1, 23, 5))
+
+
+def test_late_outs_roll_up_incrementally_and_match_rebuild(db):
+    db.add(Student(student_id=1, first_name="Late", last_name="Out", email="late@example.com", password_hash="x", roll_number="L1"))
+    db.commit()
+
+    batches = [
+        # Written out of order, as offline uploads can be
+        [Attendance(student_id=1, type=AttendanceType.OUT, timestamp=datetime(2024, 3, 1, 23, 30))],
+        [
+            Attendance(student_id=1, type=AttendanceType.OUT, timestamp=datetime(2024, 3, 1, 22, 15)),
+            Attendance(student_id=1, type=AttendanceType.IN, timestamp=datetime(2024, 3, 1, 23, 0)),
+            Attendance(student_id=1, type=AttendanceType.OUT, timestamp=datetime(2024, 3, 2, 9, 0)),
+        ],
+    ]
+    for records in batches:
+        db.add_all(records)
+        db.flush()
+        record_rollups(db, records)
+        db.commit()
+
+    incremental = daily_rows(db)
+    assert incremental[(datetime(2024, 3, 1).date(), 1)] == (1, 2, 2, datetime(2024, 3, 1, 23, 30))
+    assert incremental[(datetime(2024, 3, 2).date(), 1)] == (0, 1, 0, None)
+
+    rebuild_rollups(db)
+    assert daily_rows(db) == incremental
@@ -0,0 +1,49 @@
+import secrets
+from datetime import datetime, timedelta, timezone
+from app.models import Student, QRToken
+from app.schemas import OfflineScan
+from app.services.qr_service import generate_signed_token
+from app.services.scan_service import process_scan_batch
+
+
+def seed_student(db):
+    db.add(Student(
+        student_id=1, first_name="Gate", last_name="Test", email="gate@example.com",
+        password_hash="x", roll_number="G00001"
+    ))
+    db.commit()
+
+
+def database_token(db, issued_ago: timedelta) -> str:
+    token = secrets.token_urlsafe(32)
+    db.add(QRToken(token_value=token, student_id=1, expires_at=datetime.utcnow() - issued_ago + timedelta(minutes=5)))
+    db.commit()
+    return token
+
+
+def test_fresh_tokens_cannot_backdate_scans(db):
+    seed_student(db)
+    now = datetime.now(timezone.utc)
+    signed, _ = generate_signed_token(1)
+    stored = database_token(db, timedelta(0))
+
+    response = process_scan_batch(db, "Main Gate", [
+        OfflineScan(token=signed, scanned_at=now - timedelta(hours=50)),
+        OfflineScan(token=stored, scanned_at=now - timedelta(hours=50)),
+    ])
+
+    assert response.rejected == 2
+    assert all(r.reason == "QR code had not been issued yet when scanned" for r in response.results)
+
+
+def test_scans_within_token_lifetime_are_recorded(db):
+    seed_student(db)
+    now = datetime.now(timezone.utc)
+    stored = database_token(db, timedelta(minutes=3))
+
+    response = process_scan_batch(db, "Main Gate", [
+        OfflineScan(token=stored, scanned_at=now - timedelta(minutes=2)),
+    ])
+
+    assert response.recorded == 1
+    assert response.results[0].type == "IN"
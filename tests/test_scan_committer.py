@@ -0,0 +1,58 @@
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+from app.models import Attendance, AttendanceStatus, Student
+from app.services.qr_service import generate_signed_token
+from app.services.scan_service import process_scan, ScanCommitter, ScanRejected
+
+
+@pytest.fixture
+def committer(engine):
+    committer = ScanCommitter(sessionmaker(autocommit=False, autoflush=False, bind=engine), max_batch=64, timeout=10)
+    yield committer
+    committer.shutdown()
+
+
+def seed_students(db, count):
+    db.add_all([
+        Student(
+            student_id=i, first_name=f"Gate{i}", last_name="Test", email=f"gate{i}@example.com",
+            password_hash="x", roll_number=f"G{i:05d}"
+        )
+        for i in range(1, count + 1)
+    ])
+    db.commit()
+
+
+def test_concurrent_scans_share_commits_and_alternate(engine, db, committer):
+    seed_students(db, 4)
+    tokens = [generate_signed_token(1 + i % 4)[0] for i in range(40)]
+    commits = []
+    event.listen(engine, "commit", lambda conn: commits.append(1))
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        results = list(pool.map(lambda token: process_scan(token, committer=committer), tokens))
+
+    assert len({r.attendance_id for r in results}) == 40
+    assert len(commits) < 40
+    for student_id in range(1, 5):
+        types = [
+            t for (t,) in db.query(Attendance.type).filter(
+                Attendance.student_id == student_id
+            ).order_by(Attendance.attendance_id).all()
+        ]
+        assert [t.value for t in types] == ["IN", "OUT"] * 5
+        assert db.get(AttendanceStatus, student_id).status == types[-1]
+
+
+def test_invalid_token_is_rejected_without_failing_the_group(db, committer):
+    seed_students(db, 1)
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        valid = pool.submit(process_scan, generate_signed_token(1)[0], committer=committer)
+        invalid = pool.submit(process_scan, "not-a-token", committer=committer)
+
+    assert valid.result().type == "IN"
+    with pytest.raises(ScanRejected):
+        invalid.result()
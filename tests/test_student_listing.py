@@ -0,0 +1,60 @@
+from contextlib import contextmanager
+from datetime import date
+import pytest
+from fastapi import Response
+from sqlalchemy import event
+from app.models import Student, PhoneNumber, Room, RoomAssignment
+from app.pagination import PageParams
+from app.routes.admin import get_all_students
+
+
+def seed_students(db, count):
+    """Students with an active room assignment, a vacated one and two phone numbers each."""
+    db.add_all([Room(room_no="A-101", block="A", floor=1), Room(room_no="B-201", block="B", floor=2)])
+    for i in range(count):
+        student = Student(
+            first_name=f"Student{i}", last_name="Test", email=f"student{i}@example.com",
+            password_hash="x", roll_number=f"R{i:05d}", department="CSE", year=2
+        )
+        student.phone_numbers = [PhoneNumber(phone_number=f"90000{i:05d}"), PhoneNumber(phone_number=f"80000{i:05d}")]
+        student.room_assignments = [
+            RoomAssignment(room_no="B-201", assigned_date=date(2023, 7, 1), vacated_date=date(2024, 1, 1), is_active=False),
+            RoomAssignment(room_no="A-101", assigned_date=date(2024, 1, 1), is_active=True),
+        ]
+        db.add(student)
+    db.commit()
+    db.expunge_all()
+
+
+@contextmanager
+def count_statements(engine):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def list_students(db):
+    return get_all_students(
+        Response(), department=None, year=None, search=None,
+        page=PageParams(limit=500, cursor=None, fields=None), current_admin=None, db=db
+    )
+
+
+@pytest.mark.parametrize("count", [5, 50])
+def test_listing_uses_constant_number_of_queries(engine, db, count):
+    seed_students(db, count)
+
+    with count_statements(engine) as statements:
+        students = list_students(db)
+
+    assert len(students) == count
+    assert len(statements) == 3
+    assert all(s.room_no == "A-101" and s.block == "A" for s in students)
+    assert all(len(s.phone_numbers) == 2 for s in students)